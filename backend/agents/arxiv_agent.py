@@ -1,8 +1,13 @@
+import asyncio
+import os
+import threading
+
 import arxiv
 from typing import List, Dict, Any
 
 from backend.agents.gemini_llm import gemini_chat
 from backend.utils.logging import get_logger
+from backend.utils.resilience import Resilience
 
 LOGGER = get_logger()
 
@@ -11,15 +16,34 @@ class ArXivAgent:
     def __init__(self):
         self._client = arxiv.Client(
             page_size=5,
-            delay_seconds=3,
-            num_retries=3
+            delay_seconds=float(os.environ.get("ARXIV_DELAY_SECONDS", "3")),
+            # retries happen in _resilience, with backoff and within the request deadline
+            num_retries=0
         )
+        # never hedged: requests go out one at a time through the client lock anyway
+        self._resilience = Resilience.from_env("arxiv", hedge=False,
+                                               retry_on=(arxiv.UnexpectedEmptyPageError,))
+        # arxiv.Client spaces its requests by delay_seconds but is not thread-safe
+        self._client_lock = threading.Lock()
+        api_url = os.environ.get("ARXIV_API_URL")
+        if api_url:
+            self._client.query_url_format = api_url + "?{}"
+
+    async def search_and_summarize(self, query: str, max_results: int = 3,
+                                   summarize: bool = True) -> List[Dict[str, Any]]:
+        # the arxiv client and the summaries are blocking calls
+        return await asyncio.to_thread(self._search_and_summarize, query, max_results, summarize)
+
+    def _fetch(self, search: "arxiv.Search") -> List["arxiv.Result"]:
+        with self._client_lock:
+            return list(self._client.results(search))
 
-    async def search_and_summarize(self, query: str, max_results: int = 3) -> List[Dict[str, Any]]:
+    def _search_and_summarize(self, query: str, max_results: int, summarize: bool) -> List[Dict[str, Any]]:
         results = []
         try:
             search = arxiv.Search(query=query, max_results=max_results, sort_by=arxiv.SortCriterion.SubmittedDate)
-            for res in self._client.results(search):
+            papers = self._resilience.call(lambda timeout: self._fetch(search))
+            for res in papers:
                 entry = {
                     "title": res.title,
                     "authors": [a.name for a in res.authors],
@@ -27,6 +51,11 @@ class ArXivAgent:
                     "published": res.published.isoformat() if res.published else None,
                     "url": res.entry_id,
                 }
+                if not summarize:
+                    # one LLM call per paper is the expensive part; under load the abstract has to do
+                    entry["llm_summary"] = res.summary[:600]
+                    results.append(entry)
+                    continue
                 # Summarize abstract via LLM
                 prompt = f"Summarize the following paper abstract in 3-4 bullet points:\n\nTitle: {res.title}\n\nAbstract: {res.summary}"
                 summary = gemini_chat([
@@ -0,0 +1,220 @@
+import os
+import re
+import statistics
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+from backend.agents.evidence import estimate_tokens
+
+DEFAULT_CHUNK_TOKENS = int(os.environ.get("CHUNK_TOKENS", "240"))
+DEFAULT_CHUNK_OVERLAP = int(os.environ.get("CHUNK_OVERLAP_TOKENS", "24"))
+HEADING_SCALE = 1.15  # font size relative to the body text that marks a heading line
+HEADING_MAX_CHARS = 200
+MIN_SECTION_FRACTION = 0.25  # a heading only starts a new chunk once the current one is this full
+_BOLD = 1 << 4  # PyMuPDF span flag
+
+# sentence end: terminal punctuation, optional closing quote/bracket, then whitespace
+_SENT_END_RE = re.compile(r"[.!?][\"')\]]*(?=\s)")
+_WORD_RE = re.compile(r"\S+")
+
+TokenCounter = Callable[[List[str]], List[int]]
+
+
+def estimate_counter(texts: List[str]) -> List[int]:
+    return [estimate_tokens(t) for t in texts]
+
+
+def tokenizer_counter(model: Any) -> Optional[TokenCounter]:
+    """Count with the embedding model's own tokenizer, when it exposes one (SentenceTransformer does)."""
+    tok = getattr(model, "tokenizer", None)
+    if tok is None:
+        return None
+
+    def count(texts: List[str]) -> List[int]:
+        if not texts:
+            return []
+        return [len(ids) for ids in tok(texts, add_special_tokens=False)["input_ids"]]
+    return count
+
+
+@dataclass
+class Block:
+    text: str  # lines joined with spaces
+    page: int  # 1-based
+    start: int  # char offset in the page text
+    heading: bool = False
+
+
+@dataclass
+class Unit:
+    """A sentence, or a piece of an overlong one: the smallest thing a chunk boundary falls between."""
+    text: str
+    page: int
+    start: int
+    end: int
+    tokens: int = 0
+    heading: bool = False
+    block_start: bool = False
+
+
+@dataclass
+class Chunk:
+    text: str
+    page_start: int
+    page_end: int
+    char_start: int  # offset in the text of page_start
+    char_end: int  # offset in the text of page_end
+    tokens: int
+
+    def metadata(self) -> Dict[str, Any]:
+        return {"page": self.page_start, "page_start": self.page_start, "page_end": self.page_end,
+                "char_start": self.char_start, "char_end": self.char_end, "tokens": self.tokens}
+
+
+def extract_blocks(doc: "fitz.Document") -> Tuple[List[Block], List[str]]:
+    """Text blocks in reading order plus each page's text (blocks separated by blank lines).
+
+    Chunk char offsets index into these page texts.
+    """
+    raw: List[Tuple[int, str, float, bool]] = []
+    sizes: List[float] = []
+    for page_no, page in enumerate(doc, start=1):
+        for b in page.get_text("dict", sort=True)["blocks"]:
+            if b.get("type") != 0:
+                continue
+            lines, max_size, bold = [], 0.0, True
+            for line in b["lines"]:
+                spans = [s for s in line["spans"] if s["text"].strip()]
+                if not spans:
+                    continue
+                lines.append("".join(s["text"] for s in line["spans"]).strip())
+                for s in spans:
+                    max_size = max(max_size, s["size"])
+                    bold = bold and bool(s["flags"] & _BOLD)
+                    sizes.extend([s["size"]] * len(s["text"]))
+            text = " ".join(lines)
+            if text:
+                raw.append((page_no, text, max_size, bold))
+    body = statistics.median(sizes) if sizes else 0.0
+
+    blocks: List[Block] = []
+    page_texts: List[str] = [""] * len(doc)
+    for page_no, text, size, bold in raw:
+        prev = page_texts[page_no - 1]
+        start = len(prev) + 2 if prev else 0
+        page_texts[page_no - 1] = f"{prev}\n\n{text}" if prev else text
+        heading = len(text) <= HEADING_MAX_CHARS and (size >= body * HEADING_SCALE or (bold and not text.endswith(".")))
+        blocks.append(Block(text=text, page=page_no, start=start, heading=heading))
+    return blocks, page_texts
+
+
+def _sentence_spans(text: str) -> Iterator[Tuple[int, int]]:
+    start = 0
+    for m in _SENT_END_RE.finditer(text):
+        yield start, m.end()
+        start = m.end()
+        while start < len(text) and text[start].isspace():
+            start += 1
+    if start < len(text):
+        yield start, len(text)
+
+
+class Chunker:
+    """Packs sentences of PDF text blocks into chunks of at most `max_tokens` model tokens.
+
+    Chunks break between sentences, prefer to start at headings, carry up to `overlap`
+    tokens of trailing sentences into the next chunk, and may span pages (recorded as a
+    page range).
+    """
+
+    def __init__(self, max_tokens: int = DEFAULT_CHUNK_TOKENS, overlap: int = DEFAULT_CHUNK_OVERLAP,
+                 count_tokens: Optional[TokenCounter] = None):
+        if max_tokens <= 0 or not 0 <= overlap < max_tokens:
+            raise ValueError("Need max_tokens > 0 and 0 <= overlap < max_tokens")
+        self.max_tokens = max_tokens
+        self.overlap = overlap
+        self.count_tokens = count_tokens or estimate_counter
+
+    def chunk_pdf(self, path: Path) -> List[Chunk]:
+        with fitz.open(str(path)) as doc:
+            blocks, _ = extract_blocks(doc)
+        return self.chunk_blocks(blocks)
+
+    def _units(self, blocks: List[Block]) -> List[Unit]:
+        units: List[Unit] = []
+        for b in blocks:
+            spans = [(b.start, b.start + len(b.text))] if b.heading else \
+                [(b.start + s, b.start + e) for s, e in _sentence_spans(b.text)]
+            for i, (s, e) in enumerate(spans):
+                units.append(Unit(text=b.text[s - b.start:e - b.start], page=b.page, start=s, end=e,
+                                  heading=b.heading, block_start=i == 0))
+        for u, n in zip(units, self.count_tokens([u.text for u in units])):
+            u.tokens = n
+        out: List[Unit] = []
+        for u in units:
+            out.extend(self._split_long(u) if u.tokens > self.max_tokens else [u])
+        return out
+
+    def _split_long(self, unit: Unit) -> List[Unit]:
+        # a sentence longer than a chunk: cut it into runs of words that fit
+        words = list(_WORD_RE.finditer(unit.text))
+        per_piece = max(1, int(len(words) * self.max_tokens / unit.tokens * 0.9))
+        pieces: List[Unit] = []
+        i = 0
+        while i < len(words):
+            n = per_piece
+            while True:
+                s, e = words[i].start(), words[min(i + n, len(words)) - 1].end()
+                text = unit.text[s:e]
+                tokens = self.count_tokens([text])[0]
+                if tokens <= self.max_tokens or n == 1:
+                    break
+                n = max(1, n * 3 // 4)
+            pieces.append(Unit(text=text, page=unit.page, start=unit.start + s, end=unit.start + e,
+                               tokens=tokens, block_start=unit.block_start and i == 0))
+            i += n
+        return pieces
+
+    def chunk_blocks(self, blocks: List[Block]) -> List[Chunk]:
+        chunks: List[Chunk] = []
+        cur: List[Unit] = []
+        used = 0
+
+        def emit(units: List[Unit]) -> None:
+            text = ""
+            for u in units:
+                text += u.text if not text else ("\n" if u.block_start else " ") + u.text
+            chunks.append(Chunk(text=text, page_start=units[0].page, page_end=units[-1].page,
+                                char_start=units[0].start, char_end=units[-1].end,
+                                tokens=sum(u.tokens for u in units)))
+
+        for u in self._units(blocks):
+            if u.heading and u.block_start and cur and used >= self.max_tokens * MIN_SECTION_FRACTION:
+                # new section: no overlap carried across it
+                emit(cur)
+                cur, used = [], 0
+            elif cur and used + u.tokens > self.max_tokens:
+                carry: List[Unit] = []
+                if cur[-1].heading:
+                    carry = [cur.pop()]  # keep a heading with the text that follows it
+                if cur:
+                    emit(cur)
+                    tail: List[Unit] = []
+                    n = 0
+                    for prev in reversed(cur[1:]):
+                        if prev.heading or n + prev.tokens > self.overlap:
+                            break
+                        tail.insert(0, prev)
+                        n += prev.tokens
+                    carry = tail + carry
+                while carry and sum(c.tokens for c in carry) + u.tokens > self.max_tokens:
+                    carry.pop(0)
+                cur, used = carry, sum(c.tokens for c in carry)
+            cur.append(u)
+            used += u.tokens
+        if cur:
+            emit(cur)
+        return chunks
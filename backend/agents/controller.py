@@ -1,24 +1,43 @@
+import asyncio
 import json
+import os
 import re
 import time
 from datetime import datetime
-from typing import List, Dict, Tuple, Optional
+from typing import Any, AsyncIterator, List, Dict, Tuple, Optional
+
+import numpy as np
 
 from backend.agents.gemini_llm import gemini_chat, gemini_last_error
 from backend.agents.web_search import WebSearchAgent
 from backend.agents.arxiv_agent import ArXivAgent
+from backend.agents.evidence import Evidence, pack_evidence
 from backend.agents.rag_pdf import PDFRAGAgent
-from backend.utils.logging import get_logger, Tracer
+from backend.utils.logging import get_logger, METRICS, Span, Tracer, span
+from backend.utils.profiler import RequestProfiler
+from backend.utils.resilience import deadline
+from backend.vectorstore.semantic_cache import CacheEntry, SemanticCache
 
 LOGGER = get_logger()
 
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "8"))
+# under overload, paraphrases this close may reuse an answer, even past its TTL
+DEGRADED_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_DEGRADED_THRESHOLD", "0.85"))
+# budget for one answer; outbound calls size their timeouts and retries to what is left of it
+REQUEST_TIMEOUT = float(os.environ.get("REQUEST_TIMEOUT_SECONDS", "30"))
+
 
 class ControllerAgent:
-    def __init__(self, pdf_agent: PDFRAGAgent, tracer: Tracer):
+    def __init__(self, pdf_agent: PDFRAGAgent, tracer: Tracer, profiler: Optional[RequestProfiler] = None):
         self.pdf_agent = pdf_agent
         self.web_agent = WebSearchAgent()
         self.arxiv_agent = ArXivAgent()
         self.tracer = tracer
+        self.profiler = profiler
+        self.cache: Optional[SemanticCache] = None
+        if os.environ.get("SEMANTIC_CACHE", "1") != "0":
+            threshold = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+            self.cache = SemanticCache(dim=pdf_agent.dim, threshold=threshold)
 
     def _rule_based(self, query: str) -> Tuple[List[str], str]:
         # quick keyword-based routing for common patterns
@@ -90,16 +109,34 @@ class ControllerAgent:
             # parsing failed, just return the raw text
             return [], content
 
-    async def handle_query(self, query: str, client_ip: str = "unknown") -> Tuple[str, List[str], str, str]:
-        t0 = time.time()
+    async def handle_query(self, query: str, client_ip: str = "unknown",
+                           collections: Optional[List[str]] = None,
+                           degraded: bool = False) -> Tuple[str, List[str], str, str]:
+        """Answer one query. `degraded` (set by admission control under load) takes the cheap
+        path: looser cache reuse, no LLM routing, no per-paper arXiv summaries."""
+        session = self.profiler.start() if self.profiler is not None else None
+        try:
+            with deadline(REQUEST_TIMEOUT), span("ask") as root:
+                if degraded:
+                    root.attrs["degraded"] = True
+                result = await self._handle_query(query, client_ip, collections, root, degraded)
+        finally:
+            if session is not None:
+                self.profiler.stop(session)
+        if session is not None and not root.attrs.get("cache_hit"):
+            # includes trace_write, so JSON serialization of the trace log shows up too
+            self.profiler.finish(session, result[3], root.duration_ms)
+        METRICS.inc("ask_requests_total", outcome="cache_hit" if root.attrs.get("cache_hit") else "answered",
+                    degraded=str(degraded).lower())
+        return result
+
+    def _route(self, query: str, allow_llm: bool = True) -> Tuple[List[str], str, List[Dict]]:
+        errors: List[Dict] = []
         rule_agents, rule_rationale = self._rule_based(query)
         llm_agents: List[str] = []
         llm_rationale = ""
-        errors: List[Dict] = []
-        called_llm_decide = False
-        if not rule_agents:
+        if not rule_agents and allow_llm:
             llm_agents, llm_rationale = self._llm_decide(query)
-            called_llm_decide = True
             err = gemini_last_error()
             if err:
                 errors.append({"stage": "decision", **err})
@@ -107,26 +144,36 @@ class ControllerAgent:
         # prefer rule-based when we have a match (faster)
         final_agents = rule_agents or llm_agents or ["PDF RAG"]
         rationale = rule_rationale or llm_rationale or f"Default routing to {', '.join(final_agents)} as no specific patterns were detected."
+        return final_agents, rationale, errors
 
+    @staticmethod
+    def _collect(pdf: List[Tuple[float, Any]], web: List[Dict], ax: List[Dict]) -> Tuple[List[Dict], List[Evidence]]:
         documents: List[Dict] = []
-        snippets: List[str] = []
+        evidence: List[Evidence] = []
+        for rank, (score, doc) in enumerate(pdf):
+            documents.append({"agent": "PDF RAG", "score": score, **doc.metadata})
+            m = doc.metadata
+            pages = m.get("page_start")
+            if pages is not None and m.get("page_end", pages) != pages:
+                pages = f"{pages}-{m['page_end']}"
+            evidence.append(Evidence(agent="PDF RAG", text=doc.text, rank=rank, score=score,
+                                     source=m.get("source"), chunk=m.get("chunk"),
+                                     meta={"pages": pages} if pages is not None else {}))
+        documents.extend({"agent": "Web Search", **item} for item in web)
+        for rank, item in enumerate(web):
+            evidence.append(Evidence(agent="Web Search", rank=rank,
+                                     text=f"{item.get('title')}: {item.get('snippet')} ({item.get('link')})"))
+        documents.extend({"agent": "ArXiv", **item} for item in ax)
+        for rank, item in enumerate(ax):
+            evidence.append(Evidence(agent="ArXiv", rank=rank,
+                                     text=f"{item.get('title')}: {item.get('llm_summary')}"))
+        return documents, evidence
 
-        # call the agents and collect results
-        if "PDF RAG" in final_agents:
-            results = await self.pdf_agent.retrieve(query)
-            for score, doc in results:
-                documents.append({"agent": "PDF RAG", "score": score, **doc.metadata})
-                snippets.append(doc.text)
-        if "Web Search" in final_agents:
-            web = await self.web_agent.search(query)
-            documents.extend({"agent": "Web Search", **item} for item in web)
-            for item in web:
-                snippets.append(f"{item.get('title')}: {item.get('snippet')} ({item.get('link')})")
-        if "ArXiv" in final_agents:
-            ax = await self.arxiv_agent.search_and_summarize(query)
-            documents.extend({"agent": "ArXiv", **item} for item in ax)
-            for item in ax:
-                snippets.append(f"{item.get('title')}: {item.get('llm_summary')}")
+    @staticmethod
+    def _synthesize(query: str, packed: List[Evidence]) -> Tuple[str, Optional[Dict]]:
+        # PDF chunks are labelled with file and page range so the answer can cite them
+        snippets = [f"[{e.source}, p. {e.meta['pages']}] {e.text}" if e.meta.get("pages") else e.text
+                    for e in packed]
 
         # now ask gemini to synthesize everything into one answer
         synthesis_prompt = (
@@ -134,13 +181,68 @@ class ControllerAgent:
             "write a concise, well-structured answer. Cite sources inline when possible.\n\n"
             f"Query: {query}\n\n"
             f"Evidence snippets (may include RAG passages, web results, arXiv summaries):\n- "
-            + "\n- ".join(snippets[:12])
+            + "\n- ".join(snippets)
         )
-        final_answer = gemini_chat([
+        answer = gemini_chat([
             {"role": "system", "content": "You answer succinctly and cite sources."},
             {"role": "user", "content": synthesis_prompt},
         ], temperature=0.3, max_tokens=400)
-        err2 = gemini_last_error()
+        return answer, gemini_last_error()
+
+    def _cacheable(self, answer: str, errors: List[Dict]) -> bool:
+        # mock/error answers are not worth serving to the next paraphrase
+        return self.cache is not None and not errors and not answer.startswith(("[MOCK", "[LLM ERROR"))
+
+    async def _handle_query(self, query: str, client_ip: str, collections: Optional[List[str]],
+                            root: Span, degraded: bool = False) -> Tuple[str, List[str], str, str]:
+        t0 = time.time()
+        q_emb = None
+        corpus_version = self.pdf_agent.corpus_version
+        scope = tuple(sorted(collections)) if collections else ()
+        if self.cache is not None:
+            # one embedding serves both the cache lookup and PDF retrieval
+            with span("embed"):
+                q_emb = self.pdf_agent.embed_query(query)
+            with span("cache_lookup"):
+                if degraded:
+                    hit = self.cache.lookup(q_emb, corpus_version, scope=scope,
+                                            threshold=min(self.cache.threshold, DEGRADED_CACHE_THRESHOLD),
+                                            allow_expired=True)
+                else:
+                    hit = self.cache.lookup(q_emb, corpus_version, scope=scope)
+            if hit is not None:
+                similarity, entry = hit
+                root.attrs["cache_hit"] = True
+                LOGGER.info("controller.cache_hit", id=entry.trace_id, similarity=round(similarity, 4),
+                            latency_ms=int((time.time() - t0) * 1000))
+                return entry.answer, entry.agents, entry.rationale, entry.trace_id
+
+        with span("routing"):
+            # only queries no keyword rule matches call the LLM, but that call blocks
+            final_agents, rationale, errors = await asyncio.to_thread(self._route, query, not degraded)
+
+        # call the agents and collect results
+        results: List[Tuple[float, Any]] = []
+        web: List[Dict] = []
+        ax: List[Dict] = []
+        if "PDF RAG" in final_agents:
+            with span("pdf_rag"):
+                results = await self.pdf_agent.retrieve(query, q_emb=q_emb, collections=collections,
+                                                         degraded=degraded)
+        if "Web Search" in final_agents:
+            with span("web_search"):
+                web = await self.web_agent.search(query)
+        if "ArXiv" in final_agents:
+            with span("arxiv"):
+                ax = await self.arxiv_agent.search_and_summarize(query, summarize=not degraded)
+        documents, evidence = self._collect(results, web, ax)
+
+        # best evidence first, overlapping chunks merged, trimmed to the prompt token budget
+        with span("evidence_pack"):
+            packed, evidence_stats = pack_evidence(evidence)
+
+        with span("synthesis"):
+            final_answer, err2 = await asyncio.to_thread(self._synthesize, query, packed)
         if err2:
             errors.append({"stage": "synthesis", **err2})
 
@@ -150,13 +252,207 @@ class ControllerAgent:
             "timestamp": datetime.utcnow().isoformat() + "Z",
             "client_ip": client_ip,
             "query": query,
+            "collections": collections,
             "decision": {"agents": final_agents, "rationale": rationale},
             "agents_called": final_agents,
             "documents": documents[:20],
+            "evidence": evidence_stats,
             "answer": final_answer,
             "latency_ms": int((time.time() - t0) * 1000),
+            "spans": [c.to_dict() for c in root.children],
+            "degraded": degraded,
             "errors": errors or None,
         }
-        self.tracer.add(trace_entry)
+        with span("trace_write"):
+            self.tracer.add(trace_entry)
         LOGGER.info("controller.trace_saved", id=trace_id, agents=final_agents)
+        # degraded answers skipped work; don't let them stand in for full ones
+        if not degraded and self._cacheable(final_answer, errors):
+            self.cache.put(q_emb, CacheEntry(query=query, answer=final_answer, agents=final_agents,
+                                             rationale=rationale, trace_id=trace_id,
+                                             corpus_version=corpus_version, scope=scope))
         return final_answer, final_agents, rationale, trace_id
+
+    # --- batch -------------------------------------------------------------
+
+    async def handle_batch(self, queries: List[str], client_ip: str = "unknown",
+                           collections: Optional[List[str]] = None,
+                           concurrency: Optional[int] = None,
+                           degraded: bool = False) -> AsyncIterator[Dict[str, Any]]:
+        """Answer many queries at once, yielding one result dict per query as it completes.
+
+        All queries are embedded in one encode call and searched with one multi-query FAISS
+        search per collection; identical web/arXiv queries are fetched once, and routing and
+        synthesis run at most `concurrency` at a time. Results carry their input `index`.
+        `degraded` (admission control under load) skips the cross-encoder re-rank.
+        """
+        concurrency = max(1, concurrency or BATCH_CONCURRENCY)
+        sem = asyncio.Semaphore(concurrency)
+        t0 = time.time()
+        stamp = datetime.utcnow().strftime("%Y%m%d%H%M%S") + ":" + str(int(t0 * 1000))
+        corpus_version = self.pdf_agent.corpus_version
+        scope = tuple(sorted(collections)) if collections else ()
+        traces: List[Dict[str, Any]] = []
+        counts = {"cache_hit": 0, "answered": 0, "error": 0}
+
+        # identical queries are answered once
+        first: Dict[str, int] = {}
+        dups: Dict[int, List[int]] = {}
+        for i, q in enumerate(queries):
+            if q in first:
+                dups.setdefault(first[q], []).append(i)
+            else:
+                first[q] = i
+        unique = list(first.values())
+
+        def fan_out(i: int, result: Dict[str, Any]) -> List[Dict[str, Any]]:
+            return [{**result, "index": j} for j in [i] + dups.get(i, [])]
+
+        # the batch runs in its own task and hands results over through a queue: spans and
+        # deadlines are context variables, which must not stay set across this generator's
+        # yields (the consumer would run inside them, and closing the generator from another
+        # task could not reset them)
+        results: asyncio.Queue = asyncio.Queue()
+        done = object()
+
+        async def produce() -> None:
+            tasks: List[asyncio.Task] = []
+            try:
+                with span("ask_batch", size=len(queries), unique=len(unique)) as root:
+                    try:
+                        with span("embed", queries=len(unique)):
+                            q_embs = await asyncio.to_thread(self.pdf_agent.embed_queries,
+                                                             [queries[i] for i in unique])
+                        emb_of = dict(zip(unique, q_embs))
+
+                        pending: List[int] = []
+                        if self.cache is not None:
+                            with span("cache_lookup"):
+                                for i in unique:
+                                    hit = self.cache.lookup(emb_of[i], corpus_version, scope=scope)
+                                    if hit is None:
+                                        pending.append(i)
+                                        continue
+                                    entry = hit[1]
+                                    counts["cache_hit"] += 1
+                                    for r in fan_out(i, {"query": queries[i], "answer": entry.answer,
+                                                         "agents_used": entry.agents, "rationale": entry.rationale,
+                                                         "trace_id": entry.trace_id, "cached": True}):
+                                        results.put_nowait(r)
+                        else:
+                            pending = unique
+
+                        # routing and fetching share one budget; each synthesis below gets its own
+                        with deadline(REQUEST_TIMEOUT):
+                            async def route(i: int) -> Tuple[List[str], str, List[Dict]]:
+                                async with sem:
+                                    # the keyword rules are instant; only unmatched queries call the LLM
+                                    return await asyncio.to_thread(self._route, queries[i])
+
+                            with span("routing"):
+                                routed = dict(zip(pending, await asyncio.gather(*(route(i) for i in pending))))
+
+                            pdf_idx = [i for i in pending if "PDF RAG" in routed[i][0]]
+                            web_qs = sorted({queries[i] for i in pending if "Web Search" in routed[i][0]})
+                            ax_qs = sorted({queries[i] for i in pending if "ArXiv" in routed[i][0]})
+
+                            async def web_one(q: str) -> List[Dict]:
+                                async with sem:
+                                    return await self.web_agent.search(q)
+
+                            async def pdf_all() -> List[List[Tuple[float, Any]]]:
+                                if not pdf_idx:
+                                    return []
+                                with span("pdf_rag", queries=len(pdf_idx)):
+                                    return await self.pdf_agent.retrieve_batch(
+                                        [queries[i] for i in pdf_idx], q_embs=np.stack([emb_of[i] for i in pdf_idx]),
+                                        collections=collections, degraded=degraded)
+
+                            async def web_all() -> List[List[Dict]]:
+                                with span("web_search", queries=len(web_qs)):
+                                    return await asyncio.gather(*(web_one(q) for q in web_qs))
+
+                            async def ax_all() -> List[List[Dict]]:
+                                # one at a time: arXiv asks clients to space their requests
+                                with span("arxiv", queries=len(ax_qs)):
+                                    return [await self.arxiv_agent.search_and_summarize(q) for q in ax_qs]
+
+                            pdf_res, web_res, ax_res = await asyncio.gather(pdf_all(), web_all(), ax_all())
+                            pdf_of = dict(zip(pdf_idx, pdf_res))
+                            web_of = dict(zip(web_qs, web_res))
+                            ax_of = dict(zip(ax_qs, ax_res))
+
+                        async def finish(i: int) -> Dict[str, Any]:
+                            q = queries[i]
+                            agents, rationale, errors = routed[i]
+                            try:
+                                async with sem:
+                                    with deadline(REQUEST_TIMEOUT), span("item", index=i) as item:
+                                        documents, evidence = self._collect(
+                                            pdf_of.get(i, []),
+                                            web_of.get(q, []) if "Web Search" in agents else [],
+                                            ax_of.get(q, []) if "ArXiv" in agents else [])
+                                        with span("evidence_pack"):
+                                            packed, evidence_stats = pack_evidence(evidence)
+                                        with span("synthesis"):
+                                            answer, err = await asyncio.to_thread(self._synthesize, q, packed)
+                            except Exception as e:
+                                LOGGER.error("controller.batch_item_error", index=i, error=str(e))
+                                return {"index": i, "query": q, "error": str(e)}
+                            errors = errors + ([{"stage": "synthesis", **err}] if err else [])
+                            trace_id = f"{stamp}-{i}"
+                            traces.append({
+                                "id": trace_id,
+                                "timestamp": datetime.utcnow().isoformat() + "Z",
+                                "client_ip": client_ip,
+                                "query": q,
+                                "collections": collections,
+                                "batch": {"id": stamp, "index": i, "size": len(queries)},
+                                "decision": {"agents": agents, "rationale": rationale},
+                                "agents_called": agents,
+                                "documents": documents[:20],
+                                "evidence": evidence_stats,
+                                "answer": answer,
+                                "latency_ms": int((time.time() - t0) * 1000),
+                                "spans": [c.to_dict() for c in item.children],
+                                "errors": errors or None,
+                            })
+                            if self._cacheable(answer, errors):
+                                self.cache.put(emb_of[i], CacheEntry(query=q, answer=answer, agents=agents,
+                                                                     rationale=rationale, trace_id=trace_id,
+                                                                     corpus_version=corpus_version, scope=scope))
+                            return {"index": i, "query": q, "answer": answer, "agents_used": agents,
+                                    "rationale": rationale, "trace_id": trace_id, "cached": False}
+
+                        tasks = [asyncio.create_task(finish(i)) for i in pending]
+                        for fut in asyncio.as_completed(tasks):
+                            result = await fut
+                            counts["error" if "error" in result else "answered"] += 1
+                            for r in fan_out(result["index"], result):
+                                results.put_nowait(r)
+                    finally:
+                        # the client may hang up mid-stream; don't leave syntheses running
+                        for t in tasks:
+                            t.cancel()
+                        if traces:
+                            # one write for the whole batch instead of one per query
+                            with span("trace_write"):
+                                self.tracer.add_many(traces)
+                        for outcome, n in counts.items():
+                            if n:
+                                METRICS.inc("ask_batch_queries_total", n, outcome=outcome)
+                        LOGGER.info("controller.batch_done", id=stamp, size=len(queries), unique=len(unique),
+                                    latency_ms=int(root.duration_ms), **counts)
+            finally:
+                results.put_nowait(done)
+
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                item = await results.get()
+                if item is done:
+                    break
+                yield item
+            await producer  # re-raises whatever ended the batch early
+        finally:
+            producer.cancel()
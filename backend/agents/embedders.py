@@ -0,0 +1,98 @@
+"""Embedding backends, selected by EMBED_BACKEND."""
+import os
+import platform
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Protocol
+
+import numpy as np
+
+DEFAULT_EMBED_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBED_THREADS = int(os.environ.get("EMBED_THREADS", "0"))  # 0: the library default (all cores)
+
+
+class Embedder(Protocol):
+    """What PDFRAGAgent needs from a model; SentenceTransformer satisfies it."""
+
+    def encode(self, texts: List[str], **kwargs: Any) -> np.ndarray: ...
+
+    def get_sentence_embedding_dimension(self) -> int: ...
+
+
+def _sentence_transformer(name: str, **kwargs: Any) -> Any:
+    # pulls in torch and transformers (seconds); only load_model() gets here
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(name, **kwargs)
+
+
+def _load_torch(name: str, threads: int, model_file: Optional[str]) -> Any:
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+    return _sentence_transformer(name)
+
+
+def _load_torch_int8(name: str, threads: int, model_file: Optional[str]) -> Any:
+    import torch
+    model = _load_torch(name, threads, model_file).to("cpu")
+    # Linear layers hold nearly all weights and FLOPs; activations are quantized on the fly
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def _ort_kwargs(threads: int, model_file: Optional[str]) -> Dict[str, Any]:
+    kwargs: Dict[str, Any] = {"file_name": model_file} if model_file else {}
+    if threads:
+        import onnxruntime as ort
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = threads
+        opts.inter_op_num_threads = 1
+        kwargs["session_options"] = opts
+    return kwargs
+
+
+def _load_onnx(name: str, threads: int, model_file: Optional[str]) -> Any:
+    # needs `pip install optimum[onnxruntime]`; models without an onnx/ export are converted on load
+    return _sentence_transformer(name, backend="onnx", model_kwargs=_ort_kwargs(threads, model_file))
+
+
+def quantized_file_name() -> str:
+    """The int8 file scripts/export_onnx.py writes for this CPU."""
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        arch = "arm64"
+    else:
+        try:
+            flags = Path("/proc/cpuinfo").read_text(encoding="utf-8").split()
+        except OSError:
+            flags = []
+        arch = "avx512_vnni" if "avx512_vnni" in flags else "avx512" if "avx512f" in flags else "avx2"
+    return f"onnx/model_qint8_{arch}.onnx"
+
+
+def _load_onnx_int8(name: str, threads: int, model_file: Optional[str]) -> Any:
+    model_file = model_file or quantized_file_name()
+    if Path(name).is_dir() and not (Path(name) / model_file).exists():
+        # sentence-transformers would quietly export an fp32 model instead
+        raise FileNotFoundError(f"No {model_file} in {name}; create it with scripts/export_onnx.py --quantize")
+    return _load_onnx(name, threads, model_file)
+
+
+def _load_openvino(name: str, threads: int, model_file: Optional[str]) -> Any:
+    return _sentence_transformer(name, backend="openvino",
+                                 model_kwargs={"file_name": model_file} if model_file else {})
+
+
+EMBED_BACKENDS: Dict[str, Callable[[str, int, Optional[str]], Any]] = {
+    "torch": _load_torch,
+    "torch-int8": _load_torch_int8,
+    "onnx": _load_onnx,
+    "onnx-int8": _load_onnx_int8,
+    "openvino": _load_openvino,
+}
+
+
+def load_embedder(backend: str, name: str = DEFAULT_EMBED_MODEL, threads: int = EMBED_THREADS,
+                  model_file: Optional[str] = None) -> Any:
+    loader = EMBED_BACKENDS.get(backend)
+    if loader is None:
+        raise ValueError(f"EMBED_BACKEND must be one of {', '.join(EMBED_BACKENDS)}")
+    return loader(name, threads, model_file)
+
@@ -0,0 +1,132 @@
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+# rough sub-word estimate: one token per word/punctuation, long words split every ~6 chars
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_WORD_RE = re.compile(r"\w+")
+
+DEFAULT_TOKEN_BUDGET = int(os.environ.get("EVIDENCE_TOKEN_BUDGET", "1500"))
+RRF_K = 60  # standard reciprocal rank fusion constant
+MIN_TRIM_TOKENS = 48  # don't bother adding a truncated snippet shorter than this
+MIN_OVERLAP_CHARS = 40
+NEAR_DUP_CONTAINMENT = 0.8
+
+
+@dataclass
+class Evidence:
+    agent: str
+    text: str
+    rank: int  # position within the agent's own result list (0 = best)
+    score: Optional[float] = None  # raw agent score, if the agent has one
+    source: Optional[str] = None
+    chunk: Optional[int] = None
+    fused: float = 0.0
+    tokens: int = 0
+    meta: Dict[str, Any] = field(default_factory=dict)
+
+
+def estimate_tokens(text: str) -> int:
+    # cheap local approximation of a BPE tokenizer, good to ~10-15% on English prose
+    n = 0
+    for piece in _TOKEN_RE.findall(text):
+        n += 1 + (len(piece) - 1) // 6
+    return n
+
+
+def _truncate_to_tokens(text: str, budget: int) -> str:
+    n = 0
+    for m in _TOKEN_RE.finditer(text):
+        n += 1 + (len(m.group(0)) - 1) // 6
+        if n > budget:
+            return text[:m.start()].rstrip() + " …"
+    return text
+
+
+def _shingles(text: str, size: int = 5) -> set:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _overlap_len(head: str, tail: str, max_overlap: int = 400) -> int:
+    # the PDF splitter repeats the tail of chunk i at the head of chunk i+1
+    limit = min(len(head), len(tail), max_overlap)
+    for size in range(limit, MIN_OVERLAP_CHARS - 1, -1):
+        if head.endswith(tail[:size]):
+            return size
+    return 0
+
+
+def fuse_scores(items: List[Evidence]) -> None:
+    """Reciprocal rank fusion across agents, with raw scores as a tie-breaker."""
+    for it in items:
+        it.fused = 1.0 / (RRF_K + it.rank + 1)
+        if it.score is not None:
+            it.fused += 1e-4 * it.score
+
+
+def dedupe(items: List[Evidence]) -> List[Evidence]:
+    kept: List[Evidence] = []
+    kept_shingles: List[set] = []
+    by_chunk: Dict[Tuple[str, int], Evidence] = {}
+    for it in items:
+        text = it.text
+        # trim the splitter overlap against neighbouring chunks of the same file we already kept
+        if it.source is not None and it.chunk is not None:
+            prev = by_chunk.get((it.source, it.chunk - 1))
+            if prev is not None:
+                text = text[_overlap_len(prev.text, text):].lstrip()
+            nxt = by_chunk.get((it.source, it.chunk + 1))
+            if nxt is not None:
+                cut = _overlap_len(text, nxt.text)
+                if cut:
+                    text = text[:-cut].rstrip()
+        if not text.strip():
+            continue
+        sh = _shingles(text)
+        if sh and any(len(sh & other) / len(sh) >= NEAR_DUP_CONTAINMENT for other in kept_shingles if other):
+            continue
+        it.text = text
+        kept.append(it)
+        kept_shingles.append(sh)
+        if it.source is not None and it.chunk is not None:
+            by_chunk[(it.source, it.chunk)] = it
+    return kept
+
+
+def pack_evidence(items: List[Evidence], budget: Optional[int] = None) -> Tuple[List[Evidence], Dict[str, Any]]:
+    """Order evidence by fused relevance, drop duplicates and fit it into a token budget."""
+    budget = DEFAULT_TOKEN_BUDGET if budget is None else budget
+    fuse_scores(items)
+    ordered = sorted(items, key=lambda e: e.fused, reverse=True)
+    unique = dedupe(ordered)
+
+    packed: List[Evidence] = []
+    used = 0
+    truncated = 0
+    for it in unique:
+        remaining = budget - used
+        if remaining <= 0:
+            break
+        it.tokens = estimate_tokens(it.text)
+        if it.tokens > remaining:
+            if remaining < MIN_TRIM_TOKENS:
+                continue
+            it.text = _truncate_to_tokens(it.text, remaining - 1)  # leave room for the ellipsis
+            it.tokens = estimate_tokens(it.text)
+            truncated += 1
+        packed.append(it)
+        used += it.tokens
+
+    stats = {
+        "candidates": len(items),
+        "deduped": len(items) - len(unique),
+        "packed": len(packed),
+        "truncated": truncated,
+        "tokens": used,
+        "budget": budget,
+    }
+    return packed, stats
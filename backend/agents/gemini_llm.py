@@ -1,12 +1,11 @@
 import os
+import threading
 from typing import Any, Dict, List, Optional
 
-try:
-    import google.generativeai as genai  # type: ignore
-except Exception:
-    genai = None  # type: ignore
+from backend.utils.resilience import Resilience
 
-_LAST_ERROR: Optional[Dict[str, Any]] = None
+# per thread, so concurrent calls from worker threads don't see each other's errors
+_STATE = threading.local()
 
 # model name aliases for convenience
 _MODEL_ALIASES = {
@@ -23,14 +22,34 @@ _MODEL_ALIASES = {
 }
 
 
+# the SDK's own retry on 5xx can spin for minutes and ignores the request deadline
+_RESILIENCE = Resilience.from_env("gemini")
+GEMINI_TIMEOUT = float(os.environ.get("GEMINI_TIMEOUT_SECONDS", "60"))
+
+_GENAI: Any = None
+_GENAI_LOADED = False
+
+
+def _load_genai() -> Any:
+    # google.generativeai pulls in grpc/protobuf (~1s); only pay for it on the first LLM call
+    global _GENAI, _GENAI_LOADED
+    if not _GENAI_LOADED:
+        try:
+            import google.generativeai as genai  # type: ignore
+            _GENAI = genai
+        except Exception:
+            _GENAI = None
+        _GENAI_LOADED = True
+    return _GENAI
+
+
 def gemini_last_error() -> Optional[Dict[str, Any]]:
-    return _LAST_ERROR
+    return getattr(_STATE, "last_error", None)
 
 
 def gemini_chat(messages: List[Dict[str, str]], temperature: float = 0.2, max_tokens: int = 512) -> str:
     # wrapper for gemini API - returns mock on error so app doesn't crash
-    global _LAST_ERROR
-    _LAST_ERROR = None
+    _STATE.last_error = None
 
     raw_key = os.environ.get("GOOGLE_API_KEY") or ""
     api_key = raw_key.strip().strip('"').strip("'")
@@ -39,19 +58,27 @@ def gemini_chat(messages: List[Dict[str, str]], temperature: float = 0.2, max_to
 
     user_content = next((m.get("content", "") for m in messages if m.get("role") == "user"), "")
 
+    genai = _load_genai() if api_key else None
     if not api_key or genai is None:
         tag = "NO_API_KEY" if not api_key else "LIB_IMPORT_ERROR"
         return f"[MOCK LLM RESPONSE - {tag}] {user_content[:200]}..."
 
     try:
-        genai.configure(api_key=api_key)
+        endpoint = os.environ.get("GEMINI_API_ENDPOINT")
+        if endpoint:
+            # e.g. a local stand-in for benchmarks (scripts/fake_services.py)
+            genai.configure(api_key=api_key, transport="rest", client_options={"api_endpoint": endpoint})
+        else:
+            genai.configure(api_key=api_key)
         system_prompts = [m.get("content", "") for m in messages if m.get("role") == "system"]
         user_parts = [m.get("content", "") for m in messages if m.get("role") != "system"]
         system_instruction = "\n".join(p for p in system_prompts if p) or None
         generation_config = {"temperature": float(temperature), "max_output_tokens": int(max_tokens)}
         model = genai.GenerativeModel(model_name, system_instruction=system_instruction)
         prompt_text = "\n\n".join(p for p in user_parts if p)
-        resp = model.generate_content(prompt_text, generation_config=generation_config, safety_settings=None)
+        resp = _RESILIENCE.call(lambda timeout: model.generate_content(
+            prompt_text, generation_config=generation_config, safety_settings=None,
+            request_options={"retry": None, "timeout": min(timeout or GEMINI_TIMEOUT, GEMINI_TIMEOUT)}))
         text = getattr(resp, "text", None)
         if not text:
             try:
@@ -63,8 +90,8 @@ def gemini_chat(messages: List[Dict[str, str]], temperature: float = 0.2, max_to
                 pass
         if text:
             return text.strip()
-        _LAST_ERROR = {"source": "gemini", "type": "BadResponse", "message": "No text in response"}
+        _STATE.last_error = {"source": "gemini", "type": "BadResponse", "message": "No text in response"}
         return "[LLM ERROR] Unexpected Gemini response"
     except Exception as e:
-        _LAST_ERROR = {"source": "gemini", "type": e.__class__.__name__, "message": str(e)}
+        _STATE.last_error = {"source": "gemini", "type": e.__class__.__name__, "message": str(e)}
         return f"[MOCK LLM RESPONSE - {e.__class__.__name__}] {user_content[:200]}..."
@@ -3,26 +3,95 @@ import fitz  # PyMuPDF
 import os
 import time
 from pathlib import Path
-from typing import List, Tuple, Dict, Any
+from typing import Callable, List, Tuple, Dict, Any, Optional
 
 import numpy as np
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from sentence_transformers import SentenceTransformer
 
+from backend.agents.chunking import Chunk, Chunker, DEFAULT_CHUNK_OVERLAP, DEFAULT_CHUNK_TOKENS, tokenizer_counter
+from backend.agents.embedders import DEFAULT_EMBED_MODEL, EMBED_THREADS, load_embedder
+from backend.agents.rerank import CrossEncoderStage, DUPLICATE_COSINE, MMR_LAMBDA, RERANK_POOL, boosts, mmr
+from backend.vectorstore.collections import Collection, CollectionManager, DEFAULT_COLLECTION
 from backend.vectorstore.faiss_store import FAISSStore, Document
-from backend.utils.logging import get_logger
+from backend.vectorstore.fingerprint import fingerprint
+from backend.vectorstore.snapshot import SnapshotDir
+from backend.utils.dirwatch import Changes, DirectoryWatcher, FileState, file_hash
+from backend.utils.logging import get_logger, METRICS, span
 
 
 LOGGER = get_logger()
 
 
+def corpus_key(directory: Path) -> str:
+    """The `corpus` tag of chunks from a watched directory: its resolved path, so same-named directories differ."""
+    return str(Path(directory).resolve())
+
+
 class PDFRAGAgent:
-    def __init__(self, sample_dir: Path):
+    def __init__(self, sample_dir: Path, index_dir: Optional[Path] = None, share_default: bool = False):
         self.sample_dir = Path(sample_dir)
-        self.embed_model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
-        self.dim = self.embed_model.get_sentence_embedding_dimension()
-        self.store = FAISSStore(dim=self.dim)
-        self.splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+        # model name or a local directory, e.g. one written by scripts/export_onnx.py
+        self.model_name = os.environ.get("EMBED_MODEL", DEFAULT_EMBED_MODEL)
+        self.embed_backend = os.environ.get("EMBED_BACKEND", "torch")
+        self.embed_file = os.environ.get("EMBED_MODEL_FILE")  # e.g. onnx/model_qint8_avx512_vnni.onnx
+        # heavy pieces are created by load_model(), off the startup path
+        self.embed_model = None
+        self.dim = None
+        self.fingerprint: Optional[Dict[str, Any]] = None
+        self.cross_encoder: Optional[CrossEncoderStage] = None  # RERANK_MODEL; loaded by load_model()
+        self.rerank_pool = RERANK_POOL
+        self.mmr_lambda = MMR_LAMBDA
+        self.duplicate_cosine = DUPLICATE_COSINE
+        self.collections: Optional[CollectionManager] = None
+        self.chunker: Optional[Chunker] = None
+        # bumped whenever the indexed corpus changes, so answer caches can tell they are stale
+        self.corpus_version = 0
+        # named collections persist under index_dir; share_default also shares the sample/default
+        # collection between workers (one writer ingests and publishes, the others map snapshots)
+        self.index_dir = Path(index_dir) if index_dir is not None else None
+        self.share_default = share_default
+        self._write_lock = asyncio.Lock()  # publish reads the store from a worker thread
+        if index_dir is not None and not SnapshotDir.supported():
+            LOGGER.warn("rag.shared_index_unsupported", msg="no fcntl on this platform, collections stay in memory")
+
+    @property
+    def store(self) -> Optional[FAISSStore]:
+        # the default collection: sample PDFs plus uploads that name no collection
+        coll = self.collections.get(DEFAULT_COLLECTION) if self.collections is not None else None
+        return coll.store if coll is not None else None
+
+    @property
+    def ready(self) -> bool:
+        return self.embed_model is not None
+
+    def load_model(self, model: Any = None) -> None:
+        """Load the embedding model (blocking, seconds; callers run it in a worker thread).
+
+        `model` may be any `embedders.Embedder` (SentenceTransformer's `encode` and
+        `get_sentence_embedding_dimension`), e.g. the hashing embedder used by benchmarks.
+        """
+        if self.embed_model is not None:
+            return
+        t0 = time.time()
+        name = self.model_name if model is None else type(model).__name__
+        if model is None:
+            model = load_embedder(self.embed_backend, self.model_name, EMBED_THREADS, self.embed_file)
+        self.dim = model.get_sentence_embedding_dimension()
+        # persisted collections built with a different model are refused rather than searched
+        self.fingerprint = fingerprint(model, name)
+        self.collections = CollectionManager(self.dim, root=self.index_dir, share_default=self.share_default,
+                                             fingerprint=self.fingerprint)
+        # size chunks in the model's own tokens; anything past max_seq_length would be silently cut off
+        max_tokens = DEFAULT_CHUNK_TOKENS
+        seq_len = getattr(model, "max_seq_length", None)
+        if seq_len:
+            max_tokens = min(max_tokens, seq_len - 2)  # [CLS] and [SEP]
+        self.chunker = Chunker(max_tokens=max_tokens, overlap=min(DEFAULT_CHUNK_OVERLAP, max_tokens // 2),
+                               count_tokens=tokenizer_counter(model))
+        if self.cross_encoder is None:
+            self.cross_encoder = CrossEncoderStage.from_env()  # None unless RERANK_MODEL is set
+        self.embed_model = model
+        LOGGER.info("rag.model_loaded", model=name, backend=self.embed_backend, threads=EMBED_THREADS or None,
+                    load_ms=int((time.time() - t0) * 1000))
 
     async def ensure_sample_pdfs(self) -> None:
         # TODO: maybe move this to a separate script?
@@ -109,86 +178,313 @@ class PDFRAGAgent:
             LOGGER.info("pdf.generated", file=str(path))
 
     async def build_or_load_index(self) -> None:
+        default = self.collections.create(DEFAULT_COLLECTION)
+        self.collections.discover()  # persisted tenant collections from earlier runs / other workers
+        if default.snapshots is None:
+            await self._build_sample_index(default)
+            self.corpus_version += 1
+            return
+        while not default.writable and default.snapshots.current_generation() == 0:
+            await asyncio.sleep(0.5)
+            # the writer may have died before its first publish; then a reader takes its place
+            if default.snapshots.try_acquire_writer():
+                LOGGER.info("rag.collection_promoted", collection=default.name, generation=0)
+        gen = default.snapshots.current_generation()
+        if gen == 0:
+            await self._build_sample_index(default)
+            default.publish()
+        elif default.writable and default.generation == gen:
+            # keep earlier uploads across writer restarts instead of re-embedding samples
+            LOGGER.info("rag.shared_index_resumed", generation=default.generation, chunks=len(default.store))
+        else:
+            # writable copy if this worker was just promoted
+            default.swap_in(gen, self.dim)
+        self.corpus_version += 1
+
+    async def _build_sample_index(self, coll: Collection) -> None:
         # just rebuild everything on startup (simpler than persistence)
         pdf_files = sorted(self.sample_dir.glob("*.pdf"))
         all_chunks: List[str] = []
         all_metas: List[Dict[str, Any]] = []
         for pdf in pdf_files:
-            texts = self._extract_pdf_text(pdf)
-            chunks = self.splitter.split_text(texts)
-            for i, chunk in enumerate(chunks):
-                all_chunks.append(chunk)
+            digest = file_hash(pdf)
+            for i, chunk in enumerate(self._chunk_pdf(pdf)):
+                all_chunks.append(chunk.text)
                 all_metas.append({
                     "source": pdf.name,
                     "chunk": i,
+                    **chunk.metadata(),
                     "timestamp": 0,  # sample files get low priority
                     "is_sample": True,
+                    # lets the corpus watcher match chunks to files (run_corpus_sync)
+                    "corpus": corpus_key(self.sample_dir),
+                    "file_hash": digest,
                 })
         if all_chunks:
-            emb = self._embed(all_chunks)
+            # encoding the corpus takes a while; keep the event loop free for /healthz etc.
+            emb = await asyncio.to_thread(self._embed, all_chunks)
             docs = [Document(text=t, metadata=m) for t, m in zip(all_chunks, all_metas)]
-            self.store.add(emb, docs)
+            coll.add(emb, docs)
             LOGGER.info("rag.index_built", num_chunks=len(all_chunks))
         else:
             LOGGER.warn("rag.no_pdfs_found")
 
-    def _extract_pdf_text(self, path: Path) -> str:
+    def _chunk_pdf(self, path: Path) -> List[Chunk]:
         try:
-            with fitz.open(str(path)) as doc:
-                texts = []
-                for page_num, page in enumerate(doc):
-                    t = page.get_text()
-                    texts.append(f"[Page {page_num+1} of {path.name}]\n{t}")
-                return "\n\n".join(texts)
+            return self.chunker.chunk_pdf(path)
         except Exception as e:
             LOGGER.error("pdf.extract_error", file=str(path), error=str(e))
-            return ""
+            return []
 
     def _embed(self, texts: List[str]) -> np.ndarray:
         vecs = self.embed_model.encode(texts, convert_to_numpy=True, normalize_embeddings=False)
         return vecs.astype(np.float32)
 
-    async def ingest_pdf(self, path: Path) -> None:
-        text = self._extract_pdf_text(path)
-        if not text.strip():
+    async def ingest_pdf(self, path: Path, collection: str = DEFAULT_COLLECTION,
+                         index_type: Optional[str] = None) -> str:
+        coll = self.collections.get(collection) or self.collections.create(collection, index_type)
+        if not coll.writable:
+            # only the collection's writer may touch its index; it picks the file up from the inbox
+            coll.snapshots.enqueue(Path(path))
+            LOGGER.info("rag.pdf_queued", file=str(path), collection=collection)
+            return "queued"
+        await self._ingest_local(path, coll)
+        return "ingested"
+
+    async def _ingest_local(self, path: Path, coll: Collection) -> None:
+        chunks = self._chunk_pdf(Path(path))
+        if not chunks:
             return
-        chunks = self.splitter.split_text(text)
-        embeddings = self._embed(chunks)
+        with span("ingest_embed", chunks=len(chunks)):
+            embeddings = self._embed([c.text for c in chunks])
         upload_time = time.time()
         docs = [
             Document(
-                text=c,
+                text=c.text,
                 metadata={
                     "source": Path(path).name,
                     "chunk": i,
+                    **c.metadata(),
                     "timestamp": upload_time,
                     "is_sample": False,
                 },
             )
             for i, c in enumerate(chunks)
         ]
-        self.store.add(embeddings, docs)
-        LOGGER.info("rag.pdf_ingested", file=str(path), chunks=len(chunks))
-
-    async def retrieve(self, query: str, k: int = 5) -> List[Tuple[float, Document]]:
-        q_emb = self._embed([query])[0]
-        # get 3x candidates so we can re-rank them
-        candidates = self.store.search(q_emb, k=k * 3)
-        # boost user uploads over sample files
-        reranked = []
-        for score, doc in candidates:
-            boost = 0.0
-            # user uploads get a big boost
-            if not doc.metadata.get("is_sample", False):
-                boost += 0.3
-            # newer uploads get higher score
-            ts = doc.metadata.get("timestamp", 0)
-            if ts > 0:
-                age_hours = (time.time() - ts) / 3600
-                recency_boost = max(0, 0.2 * (1.0 - age_hours / 168))  # decays over ~1 week
-                boost += recency_boost
-            adjusted_score = score + boost
-            reranked.append((adjusted_score, doc))
-        # sort and return top k
-        reranked.sort(key=lambda x: x[0], reverse=True)
-        return reranked[:k]
+        async with self._write_lock:
+            coll.add(embeddings, docs)
+        self.corpus_version += 1
+        LOGGER.info("rag.pdf_ingested", file=str(path), chunks=len(chunks), collection=coll.name)
+
+    # --- persisted / shared collections -----------------------------------
+
+    async def run_snapshot_sync(self, interval_s: float = 0.5) -> None:
+        """Background loop: writers drain inboxes and publish, readers hot-swap new generations."""
+        while True:
+            await asyncio.sleep(interval_s)
+            try:
+                await self.sync_collections()
+            except Exception as e:
+                LOGGER.error("rag.snapshot_sync_error", error=str(e))
+
+    async def sync_collections(self) -> None:
+        if self.collections.discover():
+            self.corpus_version += 1
+        for coll in self.collections:
+            snaps = coll.snapshots
+            if snaps is None:
+                continue
+            if not snaps.is_writer:
+                gen = snaps.current_generation()
+                if gen != coll.generation and coll.swap_in(gen, self.dim):
+                    self.corpus_version += 1
+                    LOGGER.info("rag.snapshot_loaded", collection=coll.name, generation=gen, chunks=len(coll.store))
+                if snaps.try_acquire_writer():
+                    # previous writer went away; take over with a writable copy
+                    coll.swap_in(coll.generation, self.dim)
+                    LOGGER.info("rag.collection_promoted", collection=coll.name, generation=coll.generation)
+                continue
+            for pdf in snaps.pending():
+                await self._ingest_local(pdf, coll)
+                pdf.unlink(missing_ok=True)
+            if coll.dirty:
+                # one publish per tick, however many files arrived
+                async with self._write_lock:
+                    await asyncio.to_thread(coll.publish)
+
+    # --- watched corpus directory ------------------------------------------
+
+    def _owned_by(self, directory: Path) -> Callable[[Dict[str, Any]], bool]:
+        """Whether a chunk's metadata says it came from `directory`."""
+        corpus = corpus_key(directory)
+        # sample chunks indexed before they carried a corpus tag belong to the sample directory
+        untagged = corpus if corpus == corpus_key(self.sample_dir) else None
+        return lambda m: m.get("corpus", untagged if m.get("is_sample") else None) == corpus
+
+    def corpus_states(self, coll: Collection, directory: Path) -> Dict[str, FileState]:
+        """What the collection holds from a watched directory, as a baseline for the first scan.
+
+        The stat is unknown, so every file is hashed once; files whose hash matches are not re-embedded.
+        """
+        owned = self._owned_by(directory)
+        return {m["source"]: FileState(-1, -1, m.get("file_hash"))
+                for m in coll.store.metadatas() if owned(m)}
+
+    def _chunk_corpus(self, directory: Path, files: Dict[str, FileState],
+                      sample: bool) -> Tuple[List[Document], set]:
+        docs: List[Document] = []
+        failed = set()
+        corpus = corpus_key(directory)
+        for name, state in sorted(files.items()):
+            chunks = self._chunk_pdf(directory / name)
+            if not chunks:
+                failed.add(name)
+                continue
+            for i, c in enumerate(chunks):
+                docs.append(Document(text=c.text, metadata={
+                    "source": name,
+                    "chunk": i,
+                    **c.metadata(),
+                    "timestamp": 0 if sample else state.mtime_ns / 1e9,
+                    "is_sample": sample,
+                    "corpus": corpus,
+                    "file_hash": state.sha256,
+                }))
+        return docs, failed
+
+    async def sync_corpus(self, watcher: DirectoryWatcher, known: Dict[str, FileState],
+                          collection: str = DEFAULT_COLLECTION) -> Changes:
+        """Apply one scan of the watched directory to `collection` and update `known` in place.
+
+        Added and changed files are chunked and embedded in one batch; the old chunks of changed
+        and removed files are dropped in the same store swap. Other chunks are left alone.
+        """
+        coll = self.collections.get(collection) or self.collections.create(collection)
+        changes = await asyncio.to_thread(watcher.scan, known)
+        known.update(changes.touched)
+        if not changes:
+            return changes
+        directory = watcher.directory
+        sample = directory.resolve() == self.sample_dir.resolve()
+        updates = {**changes.added, **changes.changed}
+        with span("corpus_sync", files=len(updates), removed=len(changes.removed)):
+            docs, failed = await asyncio.to_thread(self._chunk_corpus, directory, updates, sample)
+            embeddings = await asyncio.to_thread(self._embed, [d.text for d in docs]) if docs else None
+            # an unreadable file keeps the chunks it had; it is retried once it changes again
+            drop = (set(changes.changed) - failed) | set(changes.removed)
+            async with self._write_lock:
+                if drop:
+                    # the metadata scan runs off the loop; only the affected rows are touched
+                    owned = self._owned_by(directory)
+                    rows = await asyncio.to_thread(coll.store.find, lambda m: owned(m) and m.get("source") in drop)
+                    coll.delete(rows)
+                if docs:
+                    coll.add(embeddings, docs)
+                if coll.needs_compaction:
+                    # searches keep using the current store until the rebuilt one is swapped in
+                    await asyncio.to_thread(coll.compact)
+        for name in changes.removed:
+            known.pop(name, None)
+        known.update(updates)
+        self.corpus_version += 1
+        for change, n in (("added", len(changes.added)), ("changed", len(changes.changed)),
+                          ("removed", len(changes.removed))):
+            if n:
+                METRICS.inc("corpus_sync_files_total", n, change=change)
+        LOGGER.info("corpus.synced", dir=str(directory), collection=coll.name, added=len(changes.added),
+                    changed=len(changes.changed), removed=len(changes.removed), failed=len(failed),
+                    chunks=len(docs))
+        return changes
+
+    async def run_corpus_sync(self, watcher: DirectoryWatcher, collection: str = DEFAULT_COLLECTION) -> None:
+        """Background loop: keep `collection` in step with the PDFs in the watched directory."""
+        LOGGER.info("corpus.watch_started", dir=str(watcher.directory), collection=collection, mode=watcher.mode)
+        known: Optional[Dict[str, FileState]] = None
+        try:
+            while True:
+                try:
+                    coll = self.collections.get(collection) or self.collections.create(collection)
+                    if not coll.writable:
+                        known = None  # the collection's writer worker syncs it
+                    else:
+                        if known is None:
+                            # also catches files added, changed or removed while nobody was watching
+                            known = self.corpus_states(coll, watcher.directory)
+                        await self.sync_corpus(watcher, known, collection)
+                except Exception as e:
+                    LOGGER.error("corpus.sync_error", dir=str(watcher.directory), error=str(e))
+                await watcher.wait()
+        finally:
+            watcher.close()
+
+    def embed_query(self, query: str) -> np.ndarray:
+        return self._embed([query])[0]
+
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        # one encode call; the model batches internally
+        return self._embed(queries)
+
+    async def retrieve(self, query: str, k: int = 5, q_emb: Optional[np.ndarray] = None,
+                       collections: Optional[List[str]] = None,
+                       degraded: bool = False) -> List[Tuple[float, Document]]:
+        if q_emb is None:
+            with span("embed"):
+                q_emb = self.embed_query(query)
+        # fetch a larger pool to re-rank; only the requested shards are searched
+        with span("faiss_search"):
+            candidates = await self.collections.search(q_emb, collections or [DEFAULT_COLLECTION],
+                                                       k=max(k, self.rerank_pool), with_vectors=self._use_mmr)
+        relevance = await self._cross_encode([query], [candidates], degraded)
+        return self._rerank(candidates, k, relevance[0])
+
+    async def retrieve_batch(self, queries: List[str], k: int = 5, q_embs: Optional[np.ndarray] = None,
+                             collections: Optional[List[str]] = None,
+                             degraded: bool = False) -> List[List[Tuple[float, Document]]]:
+        if q_embs is None:
+            with span("embed", queries=len(queries)):
+                q_embs = await asyncio.to_thread(self.embed_queries, queries)
+        with span("faiss_search", queries=len(queries)):
+            per_query = await self.collections.search_batch(q_embs, collections or [DEFAULT_COLLECTION],
+                                                            k=max(k, self.rerank_pool), with_vectors=self._use_mmr)
+        relevance = await self._cross_encode(queries, per_query, degraded)
+        return [self._rerank(candidates, k, rel) for candidates, rel in zip(per_query, relevance)]
+
+    @property
+    def _use_mmr(self) -> bool:
+        return self.mmr_lambda < 1.0 or self.duplicate_cosine < 1.0
+
+    async def _cross_encode(self, queries: List[str], per_query: List[List[Tuple[float, Document]]],
+                            degraded: bool) -> List[Optional[np.ndarray]]:
+        """Cross-encoder relevance for every candidate of every query in one batch, or None per
+        query when the stage is off, the request is degraded, or it would blow the latency budget."""
+        pairs = [(q, doc.text) for q, candidates in zip(queries, per_query) for _, doc in candidates]
+        skipped: List[Optional[np.ndarray]] = [None] * len(queries)
+        if self.cross_encoder is None or not pairs:
+            return skipped
+        if degraded:
+            METRICS.inc("rerank_cross_encoder_total", outcome="degraded")
+            return skipped
+        if not self.cross_encoder.affordable(len(pairs)):
+            METRICS.inc("rerank_cross_encoder_total", outcome="over_budget")
+            return skipped
+        with span("cross_encode", pairs=len(pairs)):
+            scores = await asyncio.to_thread(self.cross_encoder.score, pairs)
+        METRICS.inc("rerank_cross_encoder_total", outcome="scored")
+        bounds = np.cumsum([0] + [len(c) for c in per_query])
+        return [scores[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+
+    def _rerank(self, candidates: List[Tuple[float, Document]], k: int,
+                relevance: Optional[np.ndarray] = None) -> List[Tuple[float, Document]]:
+        if not candidates:
+            return []
+        docs = [doc for _, doc in candidates]
+        if relevance is None:
+            relevance = np.asarray([score for score, _ in candidates], dtype=np.float32)
+        # boost user uploads and recent files over sample files
+        relevance = relevance + boosts([d.metadata for d in docs])
+        vectors = None
+        if self._use_mmr and all(d.vector is not None for d in docs):
+            vectors = np.stack([d.vector for d in docs])
+        # near-duplicate chunks (overlaps, repeated boilerplate) would otherwise fill the top k
+        return [(float(relevance[i]), docs[i])
+                for i in mmr(relevance, vectors, k, self.mmr_lambda, self.duplicate_cosine)]
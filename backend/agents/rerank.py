@@ -0,0 +1,116 @@
+"""Second-stage ranking of retrieved chunks: upload/recency boosts, an optional cross-encoder, then MMR."""
+import os
+import time
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backend.utils.logging import get_logger, METRICS
+from backend.utils.resilience import remaining
+
+LOGGER = get_logger()
+
+RERANK_POOL = int(os.environ.get("RERANK_POOL", "20"))  # candidates fetched per query (at least k)
+# MMR trade-off between relevance and novelty; 1.0 ranks by relevance alone
+MMR_LAMBDA = float(os.environ.get("RERANK_MMR_LAMBDA", "0.7"))
+# a candidate this similar to one already picked adds nothing and is dropped, so fewer than k may come back
+DUPLICATE_COSINE = float(os.environ.get("RERANK_DUPLICATE_COSINE", "0.95"))
+CROSS_ENCODER_MODEL = os.environ.get("RERANK_MODEL", "")  # e.g. cross-encoder/ms-marco-MiniLM-L-6-v2
+CROSS_ENCODER_BUDGET_MS = float(os.environ.get("RERANK_BUDGET_MS", "100"))
+
+METRICS.describe("rerank_cross_encoder_total", "Cross-encoder re-rank calls by outcome (scored, over_budget, degraded)")
+
+
+def boosts(metas: Sequence[dict], now: Optional[float] = None) -> np.ndarray:
+    """Upload and recency boosts added to each candidate's relevance."""
+    now = time.time() if now is None else now
+    out = np.zeros(len(metas), dtype=np.float32)
+    for i, meta in enumerate(metas):
+        # user uploads get a big boost over sample files
+        if not meta.get("is_sample", False):
+            out[i] += 0.3
+        # newer uploads get higher score
+        ts = meta.get("timestamp", 0)
+        if ts > 0:
+            age_hours = (now - ts) / 3600
+            out[i] += max(0, 0.2 * (1.0 - age_hours / 168))  # decays over ~1 week
+    return out
+
+
+def mmr(relevance: np.ndarray, vectors: Optional[np.ndarray], k: int, lam: float = MMR_LAMBDA,
+        duplicate: float = DUPLICATE_COSINE) -> List[int]:
+    """Indices picked by maximal marginal relevance, best first.
+
+    `vectors` are the candidates' unit vectors; without them, or with lam=1 and no duplicate
+    cut-off, this is a plain top-k by relevance.
+    """
+    order = np.argsort(-relevance, kind="stable")
+    if vectors is None or len(relevance) <= 1 or (lam >= 1.0 and duplicate >= 1.0):
+        return order[:k].tolist()
+    sims = vectors @ vectors.T  # one matrix product for the whole pool
+    picked = [int(order[0])]
+    # highest similarity of each candidate to anything picked so far
+    redundancy = sims[picked[0]].copy()
+    alive = np.ones(len(relevance), dtype=bool)
+    alive[picked[0]] = False
+    while len(picked) < k:
+        alive &= redundancy < duplicate
+        if not alive.any():
+            break
+        score = np.where(alive, lam * relevance - (1.0 - lam) * redundancy, -np.inf)
+        best = int(np.argmax(score))
+        picked.append(best)
+        alive[best] = False
+        np.maximum(redundancy, sims[best], out=redundancy)
+    return picked
+
+
+class CrossEncoderStage:
+    """Scores (query, chunk) pairs with a small cross-encoder, within a latency budget.
+
+    Cost is tracked as a moving average per pair. A call predicted to take longer than the
+    budget, or than half of the request's remaining deadline, is skipped and the candidates keep
+    their bi-encoder scores. Under CPU contention the measured cost rises, so the stage switches
+    itself off under load; skipped calls decay the estimate so it is tried again later.
+    """
+
+    def __init__(self, model: Any, budget_ms: float = CROSS_ENCODER_BUDGET_MS):
+        self.model = model
+        self.budget_ms = budget_ms
+        self.ms_per_pair: Optional[float] = None
+
+    @classmethod
+    def from_env(cls) -> Optional["CrossEncoderStage"]:
+        if not CROSS_ENCODER_MODEL:
+            return None
+        from sentence_transformers import CrossEncoder
+        t0 = time.time()
+        stage = cls(CrossEncoder(CROSS_ENCODER_MODEL))
+        stage.score([("warm up", "the first call pays for lazy initialization")] * 4)
+        stage.ms_per_pair = None
+        stage.score([("calibrate", "a short passage for timing")] * 8)
+        LOGGER.info("rerank.cross_encoder_loaded", model=CROSS_ENCODER_MODEL, load_ms=int((time.time() - t0) * 1000),
+                    ms_per_pair=round(stage.ms_per_pair, 3))
+        return stage
+
+    def affordable(self, pairs: int) -> bool:
+        if self.ms_per_pair is None:
+            return True
+        allowed = self.budget_ms
+        left = remaining()
+        if left is not None:
+            # leave the rest of the request's deadline to synthesis
+            allowed = min(allowed, left * 1000 / 2)
+        if self.ms_per_pair * pairs <= allowed:
+            return True
+        self.ms_per_pair *= 0.95
+        return False
+
+    def score(self, pairs: List[Tuple[str, str]]) -> np.ndarray:
+        """Relevance in (0, 1) per pair, all pairs in one batch (blocking)."""
+        t0 = time.perf_counter()
+        logits = np.asarray(self.model.predict(pairs, batch_size=max(1, len(pairs)),
+                                               show_progress_bar=False), dtype=np.float32).reshape(-1)
+        ms = (time.perf_counter() - t0) * 1000 / max(1, len(pairs))
+        self.ms_per_pair = ms if self.ms_per_pair is None else 0.8 * self.ms_per_pair + 0.2 * ms
+        return 1.0 / (1.0 + np.exp(-logits))
@@ -1,17 +1,34 @@
+import asyncio
 import json
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from urllib.parse import urlencode
 from urllib.request import urlopen, Request
 
 from backend.utils.logging import get_logger
+from backend.utils.resilience import Resilience
 
 LOGGER = get_logger()
 
+HTTP_TIMEOUT = 15.0
+
 
 class WebSearchAgent:
     def __init__(self):
         self.serpapi_key = os.environ.get("SERPAPI_API_KEY")
+        # overridable so benchmarks can point at local stand-ins
+        self.serpapi_url = os.environ.get("SERPAPI_URL", "https://serpapi.com/search.json")
+        self.duckduckgo_url = os.environ.get("DUCKDUCKGO_URL", "https://api.duckduckgo.com/")
+        self._serpapi = Resilience.from_env("serpapi")
+        self._duckduckgo = Resilience.from_env("duckduckgo")
+
+    @staticmethod
+    def _get_json(url: str, policy: Resilience) -> Dict[str, Any]:
+        def fetch(timeout: Optional[float]) -> Dict[str, Any]:
+            req = Request(url, headers={"User-Agent": "Mozilla/5.0"})
+            with urlopen(req, timeout=min(timeout or HTTP_TIMEOUT, HTTP_TIMEOUT)) as resp:
+                return json.loads(resp.read().decode("utf-8", errors="ignore"))
+        return policy.call(fetch)
 
     def _serpapi_search(self, query: str) -> List[Dict[str, Any]]:
         if not self.serpapi_key:
@@ -22,10 +39,7 @@ class WebSearchAgent:
             "api_key": self.serpapi_key,
             "num": 5,
         }
-        url = f"https://serpapi.com/search.json?{urlencode(params)}"
-        req = Request(url, headers={"User-Agent": "Mozilla/5.0"})
-        with urlopen(req, timeout=15) as resp:
-            data = json.loads(resp.read().decode("utf-8", errors="ignore"))
+        data = self._get_json(f"{self.serpapi_url}?{urlencode(params)}", self._serpapi)
         results = []
         for item in data.get("organic_results", [])[:5]:
             results.append({
@@ -37,10 +51,7 @@ class WebSearchAgent:
 
     def _duckduckgo_fallback(self, query: str) -> List[Dict[str, Any]]:
         params = {"q": query, "format": "json", "no_html": 1, "skip_disambig": 1}
-        url = f"https://api.duckduckgo.com/?{urlencode(params)}"
-        req = Request(url, headers={"User-Agent": "Mozilla/5.0"})
-        with urlopen(req, timeout=15) as resp:
-            data = json.loads(resp.read().decode("utf-8", errors="ignore"))
+        data = self._get_json(f"{self.duckduckgo_url}?{urlencode(params)}", self._duckduckgo)
         results = []
         # Use RelatedTopics as quick hits
         for item in data.get("RelatedTopics", [])[:5]:
@@ -53,6 +64,10 @@ class WebSearchAgent:
         return results[:5]
 
     async def search(self, query: str) -> List[Dict[str, Any]]:
+        # urllib blocks; keep the event loop free for concurrent requests
+        return await asyncio.to_thread(self._search, query)
+
+    def _search(self, query: str) -> List[Dict[str, Any]]:
         try:
             results = self._serpapi_search(query)
             LOGGER.info("web.serpapi_ok", count=len(results))
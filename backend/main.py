@@ -1,20 +1,29 @@
+import asyncio
+import math
 import os
 import json
 import uuid
 import time
+from contextlib import AsyncExitStack
 from pathlib import Path
 from typing import Optional
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, UploadFile, File, HTTPException, Request
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
 
-from backend.models import AskRequest, AskResponse
-from backend.agents.controller import ControllerAgent
+from backend.models import AskBatchRequest, AskRequest, AskResponse
+from backend.agents.controller import BATCH_CONCURRENCY, ControllerAgent
 from backend.agents.rag_pdf import PDFRAGAgent
-from backend.utils.logging import get_logger, Tracer
+from backend.utils.admission import (AdmissionController, Overloaded, RateLimited, RateLimiter,
+                                     client_key, request_priority)
+from backend.utils.dirwatch import DirectoryWatcher
+from backend.utils.logging import get_logger, METRICS, Tracer
+from backend.utils.profiler import RequestProfiler
+from backend.vectorstore.collections import DEFAULT_COLLECTION, validate_name
 
 
 def cleanup_old_uploads(uploads_dir: Path, max_age_hours: int = 24) -> None:
@@ -48,6 +57,13 @@ FRONTEND_DIR = APP_ROOT / "frontend"
 LOGS_DIR = APP_ROOT / "logs"
 UPLOADS_DIR = APP_ROOT / "uploads"
 SAMPLE_PDFS_DIR = APP_ROOT / "sample_pdfs"
+# named collections persist under INDEX_DIR; INDEX_MODE=shared also shares the default collection:
+# one worker ingests and publishes snapshots, the rest mmap them
+INDEX_MODE = os.environ.get("INDEX_MODE", "local")
+INDEX_DIR = Path(os.environ.get("INDEX_DIR", str(APP_ROOT / "index")))
+# PDFs in CORPUS_DIR are kept in sync with CORPUS_COLLECTION while the app runs (CORPUS_WATCH=off disables)
+CORPUS_DIR = Path(os.environ.get("CORPUS_DIR", str(SAMPLE_PDFS_DIR)))
+CORPUS_COLLECTION = os.environ.get("CORPUS_COLLECTION", DEFAULT_COLLECTION)
 
 app = FastAPI(title="Problem 2 — Multi-Agentic System")
 
@@ -58,26 +74,89 @@ SAMPLE_PDFS_DIR.mkdir(parents=True, exist_ok=True)
 
 logger = get_logger()
 tracer = Tracer(LOGS_DIR / "traces.json")
+# opt-in: PROFILE_SLOW_MS and/or PROFILE_SAMPLE_RATE
+profiler = RequestProfiler.from_env(LOGS_DIR / "profiles")
 
 # agents get initialized in startup event
 controller: Optional[ControllerAgent] = None
 pdf_rag: Optional[PDFRAGAgent] = None
+warmup_state = {"status": "starting", "error": None, "started": time.time(), "ready_ms": None}
+_warmup_task: Optional[asyncio.Task] = None
+_sync_task: Optional[asyncio.Task] = None
+_corpus_task: Optional[asyncio.Task] = None
+
+
+# admission control for /ask and /ask_batch
+rate_limiter = RateLimiter.from_env()  # None unless RATE_LIMIT_RPS is set
+admission = AdmissionController.from_env()
+TRUST_PROXY_HEADERS = os.environ.get("TRUST_PROXY_HEADERS", "0") == "1"
+HIGH_PRIORITY_CLIENTS = tuple(c.strip() for c in os.environ.get("HIGH_PRIORITY_CLIENTS", "").split(",") if c.strip())
+
+
+def _index_chunks():
+    if pdf_rag is None or pdf_rag.collections is None:
+        return {}
+    return {(("collection", c.name),): float(len(c.store)) for c in pdf_rag.collections}
+
+
+def _inbox_depth():
+    if pdf_rag is None or pdf_rag.collections is None:
+        return {}
+    return {(("collection", c.name),): float(len(c.snapshots.pending()))
+            for c in pdf_rag.collections if c.snapshots is not None}
+
+
+def _cache_stat(key: str):
+    return lambda: controller.cache.stats()[key] if controller is not None and controller.cache is not None else 0.0
+
+
+METRICS.register("index_chunks", "gauge", _index_chunks, "Chunks indexed per collection")
+METRICS.register("ingest_queue_depth", "gauge", _inbox_depth, "PDFs waiting in a collection inbox for the writer")
+METRICS.register("ask_inflight", "gauge", lambda: admission.inflight, "/ask and /ask_batch requests being processed")
+METRICS.register("ask_queue_depth", "gauge", lambda: admission.queued, "Requests waiting for an admission slot")
+METRICS.register("app_ready", "gauge", lambda: 1.0 if controller is not None else 0.0, "1 once /ask can be served")
+METRICS.register("semantic_cache_hits_total", "counter", _cache_stat("hits"), "Semantic cache hits")
+METRICS.register("semantic_cache_misses_total", "counter", _cache_stat("misses"), "Semantic cache misses")
+METRICS.register("semantic_cache_hit_ratio", "gauge", _cache_stat("hit_rate"), "Semantic cache hit ratio")
+METRICS.register("semantic_cache_entries", "gauge", _cache_stat("entries"), "Answers held in the semantic cache")
+
+
+async def warm_up() -> None:
+    # model load + index build run after the app is already serving /, /logs and /healthz
+    global controller, _sync_task, _corpus_task
+    try:
+        warmup_state["status"] = "loading_model"
+        await asyncio.to_thread(pdf_rag.load_model)
+        warmup_state["status"] = "building_index"
+        await pdf_rag.ensure_sample_pdfs()
+        await pdf_rag.build_or_load_index()
+        controller = ControllerAgent(pdf_agent=pdf_rag, tracer=tracer,
+                                     profiler=profiler if profiler.enabled else None)
+        _sync_task = asyncio.create_task(pdf_rag.run_snapshot_sync())
+        watcher = DirectoryWatcher.from_env(CORPUS_DIR) if CORPUS_DIR.is_dir() else None
+        if watcher is not None:
+            _corpus_task = asyncio.create_task(pdf_rag.run_corpus_sync(watcher, CORPUS_COLLECTION))
+        warmup_state["status"] = "ready"
+        warmup_state["ready_ms"] = int((time.time() - warmup_state["started"]) * 1000)
+        logger.info("app.ready", ready_ms=warmup_state["ready_ms"])
+    except Exception as e:
+        warmup_state["status"] = "failed"
+        warmup_state["error"] = str(e)
+        logger.error("app.warmup_failed", error=str(e))
 
 
 @app.on_event("startup")
 async def on_startup():
-    global controller, pdf_rag
-    
+    global pdf_rag, _warmup_task
+
     cleanup_old_uploads(UPLOADS_DIR)
-    
-    # setup RAG agent with sample PDFs
-    pdf_rag = PDFRAGAgent(sample_dir=SAMPLE_PDFS_DIR)
-    await pdf_rag.ensure_sample_pdfs()
-    await pdf_rag.build_or_load_index()
 
-    # setup controller
-    controller = ControllerAgent(pdf_agent=pdf_rag, tracer=tracer)
-    logger.info("app.startup", msg="Application started and agents initialized")
+    # setup RAG agent; the embedding model loads in the background
+    pdf_rag = PDFRAGAgent(sample_dir=SAMPLE_PDFS_DIR, index_dir=INDEX_DIR,
+                          share_default=INDEX_MODE == "shared")
+    warmup_state["started"] = time.time()
+    _warmup_task = asyncio.create_task(warm_up())
+    logger.info("app.startup", msg="Application started, agents warming up")
 
     # static files for the frontend
     app.mount("/static", StaticFiles(directory=str(FRONTEND_DIR / "static")), name="static")
@@ -91,23 +170,118 @@ async def index():
     return FileResponse(str(index_path))
 
 
+@app.get("/healthz")
+async def healthz():
+    # liveness: the process is up and the event loop responds
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    # readiness: model loaded and index built, /ask can be served
+    body = {"status": warmup_state["status"], "ready_ms": warmup_state["ready_ms"]}
+    if warmup_state["error"]:
+        body["error"] = warmup_state["error"]
+    return JSONResponse(body, status_code=200 if controller is not None else 503)
+
+
+def _check_collections(collections: Optional[list]) -> None:
+    try:
+        for c in collections or []:
+            validate_name(c)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    missing = [c for c in collections or [] if pdf_rag.collections.get(c) is None]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Unknown collection(s): {', '.join(missing)}")
+
+
+def _admit(request: Request, default_priority: str, cost: float = 1.0):
+    """Identify the client, apply its rate limit (`cost` tokens) and pick its priority class."""
+    client = client_key(request.client.host if request.client else None,
+                        request.headers.get("x-forwarded-for"), TRUST_PROXY_HEADERS)
+    if rate_limiter is not None:
+        try:
+            rate_limiter.check(client, cost)
+        except RateLimited as e:
+            METRICS.inc("ask_rejected_total", reason="rate_limited")
+            raise HTTPException(status_code=429, detail="Too many requests",
+                                headers={"Retry-After": str(math.ceil(e.retry_after))})
+    return client, request_priority(request.headers.get("x-priority"), client, HIGH_PRIORITY_CLIENTS, default_priority)
+
+
+def _overloaded(e: Overloaded) -> HTTPException:
+    METRICS.inc("ask_rejected_total", reason=e.reason)
+    logger.warn("ask.overloaded", reason=e.reason, inflight=admission.inflight, queued=admission.queued)
+    return HTTPException(status_code=503, detail="Server overloaded, retry later",
+                         headers={"Retry-After": str(math.ceil(e.retry_after))})
+
+
 @app.post("/ask", response_model=AskResponse)
 async def ask(req: AskRequest, request: Request):
     if controller is None:
         raise HTTPException(status_code=503, detail="Controller not ready")
+    collections = req.target_collections()
+    _check_collections(collections)
+    client, priority = _admit(request, "normal")
     try:
-        answer, agents_used, rationale, trace_id = await controller.handle_query(req.query, client_ip=request.client.host if request.client else "unknown")
-        return AskResponse(answer=answer, agents_used=agents_used, rationale=rationale, trace_id=trace_id)
-    except Exception as e:
-        logger.error("ask.error", error=str(e))
-        raise HTTPException(status_code=500, detail="Internal error")
+        async with admission.slot(priority) as ticket:
+            try:
+                answer, agents_used, rationale, trace_id = await controller.handle_query(
+                    req.query, client_ip=client, collections=collections, degraded=ticket.degraded)
+            except Exception as e:
+                logger.error("ask.error", error=str(e))
+                METRICS.inc("ask_errors_total")
+                raise HTTPException(status_code=500, detail="Internal error")
+    except Overloaded as e:
+        raise _overloaded(e)
+    return AskResponse(answer=answer, agents_used=agents_used, rationale=rationale, trace_id=trace_id,
+                       degraded=ticket.degraded)
+
+
+BATCH_MAX_QUERIES = int(os.environ.get("BATCH_MAX_QUERIES", "1000"))
+
+
+@app.post("/ask_batch")
+async def ask_batch(req: AskBatchRequest, request: Request):
+    """Answer many queries in one request; results stream back as NDJSON, one line per query."""
+    if controller is None:
+        raise HTTPException(status_code=503, detail="Controller not ready")
+    if len(req.queries) > BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_QUERIES} queries per batch")
+    collections = req.target_collections()
+    _check_collections(collections)
+    # bulk work yields to interactive /ask traffic; each query spends a token (capped at the burst)
+    client, priority = _admit(request, "low", cost=len(req.queries))
+    # the slot is held until the stream ends, so it can't be an `async with` here
+    slot = AsyncExitStack()
+    try:
+        ticket = await slot.enter_async_context(admission.slot(priority))
+    except Overloaded as e:
+        raise _overloaded(e)
+    # one slot, but up to `concurrency` syntheses: don't run more than the slots nobody else holds
+    concurrency = 1 if ticket.degraded else min(req.concurrency or BATCH_CONCURRENCY, 1 + admission.headroom)
+
+    async def lines():
+        try:
+            # completion order; each line carries the query's input index
+            async for result in controller.handle_batch(
+                    req.queries, client_ip=client, collections=collections,
+                    concurrency=concurrency, degraded=ticket.degraded):
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+        finally:
+            await slot.aclose()
+
+    # the background task also frees the slot if the client went away before streaming began
+    return StreamingResponse(lines(), media_type="application/x-ndjson", background=BackgroundTask(slot.aclose))
 
 
 MAX_UPLOAD = 10 * 1024 * 1024  # 10MB
 
 
 @app.post("/upload_pdf")
-async def upload_pdf(file: UploadFile = File(...)):
+async def upload_pdf(file: UploadFile = File(...), collection: str = Form(DEFAULT_COLLECTION),
+                     index_type: Optional[str] = Form(None)):
     if file.content_type != "application/pdf":
         raise HTTPException(status_code=400, detail="Invalid file type; only PDF allowed")
 
@@ -123,16 +297,36 @@ async def upload_pdf(file: UploadFile = File(...)):
 
     # ingest into RAG, then delete file
     try:
-        if pdf_rag is None:
+        if pdf_rag is None or not pdf_rag.ready:
             raise HTTPException(status_code=503, detail="RAG not ready")
-        await pdf_rag.ingest_pdf(dest)
+        status = await pdf_rag.ingest_pdf(dest, collection=collection, index_type=index_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     finally:
         try:
             dest.unlink(missing_ok=True)
         except Exception:
             pass
 
-    return {"status": "ingested", "file_id": file_id}
+    # "queued" when another worker owns the shared index; it shows up after the next snapshot
+    return {"status": status, "file_id": file_id, "collection": collection}
+
+
+@app.get("/collections")
+async def list_collections():
+    if pdf_rag is None or pdf_rag.collections is None:
+        return []
+    return [
+        {"name": c.name, "index_type": c.index_type, "chunks": len(c.store), "generation": c.generation,
+         "persisted": c.snapshots is not None}
+        for c in pdf_rag.collections
+    ]
+
+
+@app.get("/metrics")
+async def metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
 
 
 @app.get("/logs")
@@ -146,3 +340,12 @@ async def get_log(trace_id: str):
     if not entry:
         raise HTTPException(status_code=404, detail="Not found")
     return entry
+
+
+@app.get("/logs/{trace_id}/profile")
+async def get_profile(trace_id: str):
+    # folded stacks ("frame;frame;frame count"), ready for flamegraph.pl or speedscope
+    folded = profiler.read(trace_id)
+    if folded is None:
+        raise HTTPException(status_code=404, detail="No profile for this trace")
+    return PlainTextResponse(folded)
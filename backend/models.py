@@ -1,16 +1,34 @@
 from typing import List, Optional
 from pydantic import BaseModel, Field
+from typing_extensions import Annotated
 
 
-class AskRequest(BaseModel):
+class _CollectionScope(BaseModel):
+    collection: Optional[str] = Field(None, description="Search a single named collection")
+    collections: Optional[List[str]] = Field(None, description="Search several collections and merge results")
+
+    def target_collections(self) -> Optional[List[str]]:
+        names = list(self.collections or [])
+        if self.collection and self.collection not in names:
+            names.insert(0, self.collection)
+        return names or None
+
+
+class AskRequest(_CollectionScope):
     query: str = Field(..., min_length=1, description="User query text")
 
 
+class AskBatchRequest(_CollectionScope):
+    queries: List[Annotated[str, Field(min_length=1)]] = Field(..., min_length=1, description="Query texts")
+    concurrency: Optional[int] = Field(None, ge=1, le=64, description="Max syntheses in flight")
+
+
 class AskResponse(BaseModel):
     answer: str
     agents_used: List[str]
     rationale: str
     trace_id: Optional[str] = None
+    degraded: bool = False  # answered on the reduced path because the service was overloaded
 
 
 class UploadResponse(BaseModel):
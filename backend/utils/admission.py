@@ -0,0 +1,206 @@
+from __future__ import annotations
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, List, Optional, Tuple
+
+from backend.utils.logging import METRICS
+
+# lower value = served first
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__("rate limited")
+        self.retry_after = retry_after
+
+
+class Overloaded(Exception):
+    def __init__(self, reason: str, retry_after: float = 1.0):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now: float, cost: float = 1.0) -> float:
+        """Spend `cost` tokens; returns 0 on success, else seconds until enough have refilled."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Token bucket per client key; the least recently seen clients are forgotten past `max_clients`."""
+
+    def __init__(self, rate: float, burst: float, max_clients: int = 10000):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional["RateLimiter"]:
+        rate = float(os.environ.get("RATE_LIMIT_RPS", "0"))  # off unless set; 2 is a sensible start
+        if rate <= 0:
+            return None
+        return cls(rate, float(os.environ.get("RATE_LIMIT_BURST", "10")))
+
+    def check(self, client: str, cost: float = 1.0) -> None:
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.pop(client, None) or TokenBucket(self.rate, self.burst, now)
+            self._buckets[client] = bucket
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+            wait = bucket.take(now, min(cost, self.burst))
+        if wait:
+            raise RateLimited(wait)
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    seq: int
+    future: asyncio.Future = field(compare=False)
+
+
+@dataclass
+class Ticket:
+    priority: str
+    degraded: bool  # admitted under load: callers should take their cheap path
+    waited_ms: float
+
+
+class AdmissionController:
+    """Global cap on concurrent /ask work with a bounded, priority-ordered wait queue.
+
+    Requests over `max_concurrent` wait (high before normal before low, FIFO within a class)
+    for up to `queue_timeout` seconds. A full queue rejects the arrival, or sheds the
+    lowest-priority waiter if the arrival outranks it. Requests admitted while the service
+    is above `degrade_at` of its capacity get ``Ticket.degraded``.
+    """
+
+    def __init__(self, max_concurrent: int = 16, max_queue: int = 64, queue_timeout: float = 10.0,
+                 degrade_at: float = 0.75):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.degrade_at = degrade_at
+        self.inflight = 0
+        self._queue: List[_Waiter] = []
+        self._seq = itertools.count()
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        return cls(max_concurrent=int(os.environ.get("ADMISSION_MAX_CONCURRENT", "16")),
+                   max_queue=int(os.environ.get("ADMISSION_MAX_QUEUE", "64")),
+                   queue_timeout=float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", "10")),
+                   degrade_at=float(os.environ.get("ADMISSION_DEGRADE_AT", "0.75")))
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    @property
+    def headroom(self) -> int:
+        """Slots nobody holds or waits for."""
+        return max(0, self.max_concurrent - self.inflight - len(self._queue))
+
+    def _retry_after(self) -> float:
+        return max(1.0, min(self.queue_timeout, 1.0 + self.queued / max(1, self.max_concurrent)))
+
+    def _enqueue(self, priority: int) -> _Waiter:
+        if len(self._queue) >= self.max_queue:
+            worst = max(self._queue) if self._queue else None
+            if worst is None or worst.priority <= priority:
+                METRICS.inc("admission_total", outcome="queue_full")
+                raise Overloaded("queue_full", self._retry_after())
+            # make room by shedding the lowest-priority, most recent waiter
+            self._queue.remove(worst)
+            heapq.heapify(self._queue)
+            METRICS.inc("admission_total", outcome="shed")
+            worst.future.set_exception(Overloaded("shed", self._retry_after()))
+        waiter = _Waiter(priority, next(self._seq), asyncio.get_running_loop().create_future())
+        heapq.heappush(self._queue, waiter)
+        return waiter
+
+    def _release(self) -> None:
+        # hand the slot straight to the best waiter, so a new arrival can't jump the queue
+        while self._queue:
+            waiter = heapq.heappop(self._queue)
+            if not waiter.future.done():
+                waiter.future.set_result(None)
+                return
+        self.inflight -= 1
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        if waiter.future.done() and waiter.future.exception() is None:
+            # the slot was granted just as we gave up: pass it on
+            self._release()
+        elif waiter in self._queue:
+            self._queue.remove(waiter)
+            heapq.heapify(self._queue)
+
+    @asynccontextmanager
+    async def slot(self, priority: str = "normal") -> AsyncIterator[Ticket]:
+        rank = PRIORITIES.get(priority, PRIORITIES["normal"])
+        t0 = time.perf_counter()
+        queued = not (self.inflight < self.max_concurrent and not self._queue)
+        if not queued:
+            self.inflight += 1
+        else:
+            waiter = self._enqueue(rank)
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self._abandon(waiter)
+                METRICS.inc("admission_total", outcome="queue_timeout")
+                raise Overloaded("queue_timeout", self._retry_after())
+            except asyncio.CancelledError:
+                self._abandon(waiter)
+                raise
+        waited = (time.perf_counter() - t0) * 1000.0
+        # queued, or most other slots already busy
+        degraded = queued or self.inflight - 1 >= self.degrade_at * self.max_concurrent
+        METRICS.inc("admission_total", outcome="degraded" if degraded else "admitted")
+        try:
+            yield Ticket(priority=priority, degraded=degraded, waited_ms=waited)
+        finally:
+            self._release()
+
+
+def client_key(host: Optional[str], forwarded_for: Optional[str], trust_proxy: bool) -> str:
+    # behind a reverse proxy every request comes from the proxy; use the first hop it reports
+    if trust_proxy and forwarded_for:
+        return forwarded_for.split(",")[0].strip()
+    return host or "unknown"
+
+
+def request_priority(header: Optional[str], client: str, high_clients: Tuple[str, ...], default: str = "normal") -> str:
+    """Callers may lower their own priority; only clients listed as high-priority may raise it."""
+    wanted = (header or "").strip().lower()
+    if wanted == "low":
+        return "low"
+    if client in high_clients and (wanted == "high" or default == "normal"):
+        return "high"
+    return default
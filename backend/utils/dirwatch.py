@@ -0,0 +1,202 @@
+from __future__ import annotations
+import asyncio
+import ctypes
+import ctypes.util
+import hashlib
+import os
+import struct
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from backend.utils.logging import get_logger
+
+LOGGER = get_logger()
+
+# inotify(7) event bits
+_IN_MODIFY = 0x002
+_IN_CLOSE_WRITE = 0x008
+_IN_MOVED_FROM = 0x040
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_Q_OVERFLOW = 0x4000
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = 0o2000000
+_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len; then `len` bytes of name
+
+
+@dataclass(frozen=True)
+class FileState:
+    mtime_ns: int
+    size: int
+    sha256: Optional[str]
+
+
+@dataclass
+class Changes:
+    added: Dict[str, FileState] = field(default_factory=dict)
+    changed: Dict[str, FileState] = field(default_factory=dict)
+    removed: List[str] = field(default_factory=list)
+    touched: Dict[str, FileState] = field(default_factory=dict)  # new mtime, same content
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.changed or self.removed)
+
+
+def file_hash(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class _Inotify:
+    """Minimal non-blocking inotify handle for one directory (Linux only, via libc)."""
+
+    def __init__(self, directory: Path):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_MOVED_FROM | _IN_DELETE | _IN_CREATE | _IN_MODIFY
+        if libc.inotify_add_watch(self.fd, os.fsencode(str(directory)), mask) < 0:
+            err = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(err, f"inotify_add_watch failed for {directory}")
+
+    @staticmethod
+    def supported() -> bool:
+        return sys.platform.startswith("linux") and ctypes.util.find_library("c") is not None
+
+    def drain(self) -> List[str]:
+        """Names of entries with pending events; "" after a queue overflow (rescan everything)."""
+        names: List[str] = []
+        while True:
+            try:
+                buf = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return names
+            pos = 0
+            while pos + _EVENT.size <= len(buf):
+                _, mask, _, length = _EVENT.unpack_from(buf, pos)
+                raw = buf[pos + _EVENT.size:pos + _EVENT.size + length]
+                pos += _EVENT.size + length
+                names.append("" if mask & _IN_Q_OVERFLOW else os.fsdecode(raw.rstrip(b"\0")))
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class DirectoryWatcher:
+    """Detects added, changed and removed files in one directory (not recursive).
+
+    ``wait()`` returns when a scan is worth doing: after a burst of inotify events has been
+    quiet for `debounce` seconds (or has gone on for `max_delay`), or every `poll_interval`
+    seconds without inotify. ``scan()`` compares size and mtime against the known states and
+    hashes only the files whose stat changed, so touched-but-identical files cost no re-ingest.
+    Files modified within the last `debounce` seconds are left for the next scan, since they
+    may still be being written.
+    """
+
+    def __init__(self, directory: Path, pattern: str = "*.pdf", debounce: float = 2.0,
+                 poll_interval: float = 10.0, max_delay: float = 30.0, use_inotify: bool = True):
+        self.directory = Path(directory)
+        self.pattern = pattern
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.max_delay = max_delay
+        self._inotify: Optional[_Inotify] = None
+        self._event: Optional[asyncio.Event] = None
+        if use_inotify and _Inotify.supported():
+            try:
+                self._inotify = _Inotify(self.directory)
+            except OSError as e:
+                LOGGER.warn("dirwatch.inotify_unavailable", dir=str(self.directory), error=str(e))
+
+    @classmethod
+    def from_env(cls, directory: Path) -> Optional["DirectoryWatcher"]:
+        mode = os.environ.get("CORPUS_WATCH", "auto")
+        if mode == "off":
+            return None
+        return cls(directory,
+                   debounce=float(os.environ.get("CORPUS_DEBOUNCE_SECONDS", "2")),
+                   poll_interval=float(os.environ.get("CORPUS_POLL_SECONDS", "10")),
+                   use_inotify=mode != "poll")
+
+    @property
+    def mode(self) -> str:
+        return "inotify" if self._inotify is not None else "poll"
+
+    def scan(self, known: Dict[str, FileState]) -> Changes:
+        changes = Changes()
+        now_ns = time.time_ns()
+        seen = set()
+        for path in self.directory.glob(self.pattern):
+            name = path.name
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            seen.add(name)
+            old = known.get(name)
+            if old is not None and (old.mtime_ns, old.size) == (st.st_mtime_ns, st.st_size):
+                continue
+            if now_ns - st.st_mtime_ns < self.debounce * 1e9:
+                continue  # still being written; picked up by a later scan
+            try:
+                state = FileState(st.st_mtime_ns, st.st_size, file_hash(path))
+            except FileNotFoundError:
+                seen.discard(name)
+                continue
+            if old is None:
+                changes.added[name] = state
+            elif old.sha256 != state.sha256:
+                changes.changed[name] = state
+            else:
+                changes.touched[name] = state
+        changes.removed = sorted(n for n in known if n not in seen)
+        return changes
+
+    async def wait(self) -> None:
+        if self._inotify is None:
+            await asyncio.sleep(self.poll_interval)
+            return
+        loop = asyncio.get_running_loop()
+        if self._event is None:
+            self._event = asyncio.Event()
+            loop.add_reader(self._inotify.fd, self._on_readable)
+        try:
+            # events can still be lost (e.g. directory replaced), so rescan now and then anyway
+            await asyncio.wait_for(self._event.wait(), timeout=max(self.poll_interval, 60.0))
+        except asyncio.TimeoutError:
+            return
+        # coalesce the burst: wait until it has been quiet for `debounce` seconds
+        started = loop.time()
+        while True:
+            self._event.clear()
+            try:
+                await asyncio.wait_for(self._event.wait(), timeout=self.debounce)
+            except asyncio.TimeoutError:
+                break
+            if loop.time() - started >= self.max_delay:
+                break
+        self._event.clear()
+
+    def _on_readable(self) -> None:
+        names = self._inotify.drain()
+        if any(n == "" or Path(n).match(self.pattern) for n in names):
+            self._event.set()
+
+    def close(self) -> None:
+        if self._inotify is not None:
+            if self._event is not None:
+                try:
+                    asyncio.get_running_loop().remove_reader(self._inotify.fd)
+                except RuntimeError:
+                    pass
+            self._inotify.close()
+            self._inotify = None
@@ -1,9 +1,12 @@
+import bisect
 import json
 import os
 import threading
+import time
+from contextvars import ContextVar
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
 import structlog
 
@@ -51,8 +54,12 @@ class Tracer:
                 self._in_memory = []
 
     def add(self, entry: Dict[str, Any]) -> None:
+        self.add_many([entry])
+
+    def add_many(self, entries: List[Dict[str, Any]]) -> None:
+        # the whole file is rewritten per call, so batches should come through here in one go
         with self._lock:
-            self._in_memory.append(entry)
+            self._in_memory.extend(entries)
             try:
                 self.path.write_text(json.dumps(self._in_memory, ensure_ascii=False, indent=2), encoding="utf-8")
             except Exception:
@@ -69,3 +76,176 @@ class Tracer:
                 if item.get("id") == trace_id:
                     return item
         return None
+
+
+# --- metrics ---------------------------------------------------------------
+
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+CallbackValue = Union[float, Dict[LabelKey, float]]
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "n")
+
+    def __init__(self, n_buckets: int):
+        self.counts = [0] * (n_buckets + 1)  # last slot is +Inf
+        self.total = 0.0
+        self.n = 0
+
+
+class Metrics:
+    """In-process counters, gauges and histograms rendered in Prometheus text format."""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._hists: Dict[str, Dict[LabelKey, _Histogram]] = {}
+        self._help: Dict[str, str] = {}
+        self._callbacks: Dict[str, Tuple[str, Callable[[], CallbackValue]]] = {}
+
+    @staticmethod
+    def _key(labels: Dict[str, Any]) -> LabelKey:
+        return tuple(sorted((k, str(v)) for k, v in labels.items())) if labels else ()
+
+    def describe(self, name: str, help_text: str) -> None:
+        self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels: Any) -> None:
+        with self._lock:
+            self._gauges.setdefault(name, {})[self._key(labels)] = value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._hists.setdefault(name, {})
+            h = series.get(key)
+            if h is None:
+                h = series[key] = _Histogram(len(self.buckets))
+            h.counts[i] += 1
+            h.total += value
+            h.n += 1
+
+    def register(self, name: str, kind: str, fn: Callable[[], CallbackValue], help_text: str = "") -> None:
+        """Read a value at scrape time, e.g. an index size or cache hit counter owned elsewhere."""
+        self._callbacks[name] = (kind, fn)
+        if help_text:
+            self._help[name] = help_text
+
+    @staticmethod
+    def _fmt_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+        items = key + extra
+        if not items:
+            return ""
+        inner = ",".join(f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                         for k, v in items)
+        return "{" + inner + "}"
+
+    def _header(self, lines: List[str], name: str, kind: str) -> None:
+        if name in self._help:
+            lines.append(f"# HELP {name} {self._help[name]}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            counters = {n: dict(s) for n, s in self._counters.items()}
+            gauges = {n: dict(s) for n, s in self._gauges.items()}
+            hists = {n: {k: (list(h.counts), h.total, h.n) for k, h in s.items()} for n, s in self._hists.items()}
+        for name, (kind, fn) in sorted(self._callbacks.items()):
+            try:
+                value = fn()
+            except Exception:
+                continue
+            series = value if isinstance(value, dict) else {(): float(value)}
+            (counters if kind == "counter" else gauges).setdefault(name, {}).update(series)
+        for name in sorted(counters):
+            self._header(lines, name, "counter")
+            for key, v in counters[name].items():
+                lines.append(f"{name}{self._fmt_labels(key)} {v:g}")
+        for name in sorted(gauges):
+            self._header(lines, name, "gauge")
+            for key, v in gauges[name].items():
+                lines.append(f"{name}{self._fmt_labels(key)} {v:g}")
+        for name in sorted(hists):
+            self._header(lines, name, "histogram")
+            for key, (counts, total, n) in hists[name].items():
+                cumulative = 0
+                for bound, c in zip(self.buckets, counts):
+                    cumulative += c
+                    lines.append(f"{name}_bucket{self._fmt_labels(key, (('le', f'{bound:g}'),))} {cumulative}")
+                lines.append(f"{name}_bucket{self._fmt_labels(key, (('le', '+Inf'),))} {n}")
+                lines.append(f"{name}_sum{self._fmt_labels(key)} {total:g}")
+                lines.append(f"{name}_count{self._fmt_labels(key)} {n}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+METRICS.describe("stage_latency_ms", "Latency of request stages (spans) in milliseconds")
+
+
+# --- spans -----------------------------------------------------------------
+
+_CURRENT_SPAN: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Span:
+    """Timed stage of a request. Nested `with span(...)` blocks form a tree under the current span,
+    also across awaits and asyncio.to_thread (context variables are copied)."""
+
+    __slots__ = ("name", "attrs", "children", "start", "end", "_token")
+
+    def __init__(self, name: str, **attrs: Any):
+        self.name = name
+        self.attrs = attrs
+        self.children: List["Span"] = []
+        self.start = 0.0
+        self.end: Optional[float] = None
+        self._token = None
+
+    def __enter__(self) -> "Span":
+        parent = _CURRENT_SPAN.get()
+        if parent is not None:
+            parent.children.append(self)
+        self._token = _CURRENT_SPAN.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.end = time.perf_counter()
+        _CURRENT_SPAN.reset(self._token)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        METRICS.observe("stage_latency_ms", self.duration_ms, stage=self.name)
+        return False
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"name": self.name, "ms": round(self.duration_ms, 3)}
+        if self.attrs:
+            out.update(self.attrs)
+        if self.children:
+            out["children"] = [c.to_dict() for c in self.children]
+        return out
+
+
+def span(name: str, **attrs: Any) -> Span:
+    return Span(name, **attrs)
+
+
+def current_span() -> Optional[Span]:
+    return _CURRENT_SPAN.get()
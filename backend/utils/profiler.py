@@ -0,0 +1,160 @@
+from __future__ import annotations
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from backend.utils.logging import get_logger
+
+LOGGER = get_logger()
+
+# leaf frames of threads that are parked, not working
+_IDLE_LEAVES = {("selectors.py", "select"), ("threading.py", "wait"), ("thread.py", "_worker")}
+
+
+def _frame_label(code) -> str:
+    path = Path(code.co_filename)
+    return f"{code.co_name} ({path.parent.name}/{path.name}:{code.co_firstlineno})"
+
+
+def _collapse(frame, thread_name: str) -> Optional[str]:
+    if (Path(frame.f_code.co_filename).name, frame.f_code.co_name) in _IDLE_LEAVES:
+        return None
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    labels.append(thread_name)
+    return ";".join(reversed(labels))
+
+
+class ProfileSession:
+    """Stack samples collected while one request runs."""
+
+    def __init__(self, loop_thread: int, keep: bool = False):
+        self.loop_thread = loop_thread
+        self.keep = keep  # picked by the sample rate, saved regardless of latency
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started = time.perf_counter()
+
+    def collapsed(self) -> str:
+        # Brendan Gregg's folded format: flamegraph.pl, speedscope and inferno read it as-is
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+
+class SamplingProfiler:
+    """One background thread samples the Python stacks of the event loop and asyncio worker threads
+    every ``interval`` seconds while at least one session is active.
+
+    Concurrent requests share the loop, so each session sees the others' samples too; with
+    many requests in flight a profile shows where the process spent time during that request.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self._sessions: List[ProfileSession] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, keep: bool = False) -> ProfileSession:
+        session = ProfileSession(threading.get_ident(), keep=keep)
+        with self._lock:
+            self._sessions.append(session)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+        return session
+
+    def stop(self, session: ProfileSession) -> None:
+        with self._lock:
+            if session in self._sessions:
+                self._sessions.remove(session)
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while True:
+            with self._lock:
+                sessions = list(self._sessions)
+                if not sessions:
+                    self._thread = None
+                    return
+            names: Dict[int, str] = {t.ident: t.name for t in threading.enumerate()}
+            loops = {s.loop_thread for s in sessions}
+            stacks = []
+            for tid, frame in sys._current_frames().items():
+                name = names.get(tid, "")
+                if tid == me or not (tid in loops or name.startswith("asyncio_")):
+                    continue
+                stack = _collapse(frame, "event-loop" if tid in loops else name)
+                if stack is not None:
+                    stacks.append(stack)
+            for s in sessions:
+                s.samples += 1
+                s.stacks.update(stacks)
+            time.sleep(self.interval)
+
+
+class RequestProfiler:
+    """Opt-in per-request profiling: keeps profiles of slow requests and of a random fraction.
+
+    Every request is sampled while PROFILE_SLOW_MS is set, since slowness is only known at the end.
+    """
+
+    def __init__(self, directory: Path, slow_ms: float = 0.0, sample_rate: float = 0.0,
+                 interval_ms: float = 5.0, max_profiles: int = 200):
+        self.directory = Path(directory)
+        self.slow_ms = slow_ms
+        self.sample_rate = sample_rate
+        self.max_profiles = max_profiles
+        self._sampler = SamplingProfiler(interval=interval_ms / 1000.0)
+
+    @classmethod
+    def from_env(cls, directory: Path) -> "RequestProfiler":
+        return cls(directory,
+                   slow_ms=float(os.environ.get("PROFILE_SLOW_MS", "0")),
+                   sample_rate=float(os.environ.get("PROFILE_SAMPLE_RATE", "0")),
+                   interval_ms=float(os.environ.get("PROFILE_INTERVAL_MS", "5")))
+
+    @property
+    def enabled(self) -> bool:
+        return self.slow_ms > 0 or self.sample_rate > 0
+
+    def start(self) -> Optional[ProfileSession]:
+        keep = self.sample_rate > 0 and random.random() < self.sample_rate
+        if keep or self.slow_ms > 0:
+            return self._sampler.start(keep=keep)
+        return None
+
+    def stop(self, session: ProfileSession) -> None:
+        self._sampler.stop(session)
+
+    def finish(self, session: ProfileSession, trace_id: str, latency_ms: float) -> bool:
+        """Stop sampling; write the profile if the request was slow or picked by the sample rate."""
+        self.stop(session)
+        slow = self.slow_ms > 0 and latency_ms >= self.slow_ms
+        if not (slow or session.keep) or not session.stacks:
+            return False
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._path(trace_id).write_text(session.collapsed(), encoding="utf-8")
+        self._prune()
+        LOGGER.info("profile.saved", id=trace_id, latency_ms=int(latency_ms), samples=session.samples,
+                    reason="slow" if slow else "sampled")
+        return True
+
+    def _path(self, trace_id: str) -> Path:
+        return self.directory / (re.sub(r"[^A-Za-z0-9_-]", "_", trace_id) + ".folded")
+
+    def _prune(self) -> None:
+        files = sorted(self.directory.glob("*.folded"), key=lambda p: p.stat().st_mtime)
+        for path in files[:-self.max_profiles]:
+            path.unlink(missing_ok=True)
+
+    def read(self, trace_id: str) -> Optional[str]:
+        path = self._path(trace_id)
+        return path.read_text(encoding="utf-8") if path.exists() else None
@@ -0,0 +1,242 @@
+from __future__ import annotations
+import contextvars
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable, Deque, Iterator, Optional, Tuple, Type, TypeVar
+
+from backend.utils.logging import METRICS, get_logger
+
+LOGGER = get_logger()
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+METRICS.describe("outbound_calls_total", "Outbound calls by service and final outcome (ok, error, deadline)")
+METRICS.describe("outbound_retries_total", "Outbound attempts retried, by service and reason")
+METRICS.describe("outbound_hedges_total", "Hedged outbound requests, by service and which copy answered first")
+METRICS.describe("outbound_latency_ms", "Latency of single outbound attempts in milliseconds")
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+# --- deadlines ---------------------------------------------------------------
+
+# absolute time.monotonic() by which the current request must be answered; contextvars
+# follow asyncio tasks and asyncio.to_thread, so agents running in worker threads see it
+_DEADLINE: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+@contextmanager
+def deadline(seconds: Optional[float]) -> Iterator[None]:
+    """Bound everything inside to `seconds` from now; a nested scope can only shorten it."""
+    if not seconds or seconds <= 0:
+        yield
+        return
+    at = time.monotonic() + seconds
+    outer = _DEADLINE.get()
+    token = _DEADLINE.set(at if outer is None else min(at, outer))
+    try:
+        yield
+    finally:
+        _DEADLINE.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline, or None when there is none."""
+    at = _DEADLINE.get()
+    return None if at is None else at - time.monotonic()
+
+
+# --- error classification ----------------------------------------------------
+
+def status_of(exc: BaseException) -> Optional[int]:
+    # urllib HTTPError.code, google.api_core GoogleAPICallError.code, arxiv HTTPError.status
+    for attr in ("code", "status"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """Seconds from a Retry-After header on the error's response, if the server sent one."""
+    headers = getattr(exc, "headers", None) or getattr(getattr(exc, "response", None), "headers", None)
+    value = headers.get("Retry-After") if headers is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def is_retryable(exc: BaseException, extra: Tuple[Type[BaseException], ...] = ()) -> bool:
+    status = status_of(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    # timeouts and connection failures (socket, urllib and requests errors are all OSErrors)
+    return isinstance(exc, (OSError,) + extra)
+
+
+# --- retries and hedging -----------------------------------------------------
+
+class LatencyWindow:
+    """Latencies of recent successful attempts, for picking the hedge delay."""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+_HEDGE_POOL: Optional[ThreadPoolExecutor] = None
+_HEDGE_POOL_LOCK = threading.Lock()
+
+
+def _hedge_pool() -> ThreadPoolExecutor:
+    global _HEDGE_POOL
+    with _HEDGE_POOL_LOCK:
+        if _HEDGE_POOL is None:
+            _HEDGE_POOL = ThreadPoolExecutor(max_workers=int(os.environ.get("HEDGE_MAX_THREADS", "32")),
+                                             thread_name_prefix="hedge")
+        return _HEDGE_POOL
+
+
+class Resilience:
+    """Retry/deadline/hedging policy for one outbound service.
+
+    ``call(fn)`` runs ``fn(timeout)``, where ``timeout`` is the seconds left on the request
+    deadline (None without one). Retryable failures (429, 5xx, timeouts, connection errors) are
+    retried up to `attempts` times in total, with full-jitter exponential backoff. A Retry-After
+    header sets the minimum wait. Retries stop early when the wait would not fit in the deadline,
+    or when Retry-After asks for more than `max_delay`. With `hedge`, an attempt still running after
+    the service's recent p95 latency is duplicated, and whichever copy answers first wins.
+    Only idempotent calls should be hedged.
+    """
+
+    def __init__(self, name: str, attempts: int = 3, base_delay: float = 0.2, max_delay: float = 5.0,
+                 hedge: bool = False, hedge_quantile: float = 0.95, hedge_min_delay: float = 0.05,
+                 retry_on: Tuple[Type[BaseException], ...] = ()):
+        self.name = name
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self.retry_on = retry_on
+        self.latency = LatencyWindow()
+
+    @classmethod
+    def from_env(cls, name: str, hedge: Optional[bool] = None, **kwargs) -> "Resilience":
+        if hedge is None:
+            hedged = {s.strip() for s in os.environ.get("HEDGE_SERVICES", "").split(",") if s.strip()}
+            hedge = name in hedged
+        return cls(name,
+                   attempts=int(os.environ.get("RETRY_MAX_ATTEMPTS", "3")),
+                   base_delay=float(os.environ.get("RETRY_BASE_MS", "200")) / 1000.0,
+                   max_delay=float(os.environ.get("RETRY_MAX_MS", "5000")) / 1000.0,
+                   hedge=hedge,
+                   hedge_quantile=float(os.environ.get("HEDGE_QUANTILE", "0.95")),
+                   hedge_min_delay=float(os.environ.get("HEDGE_MIN_MS", "50")) / 1000.0,
+                   **kwargs)
+
+    def backoff(self, attempt: int, hint: Optional[float] = None) -> float:
+        # full jitter: retrying clients spread out instead of arriving in waves
+        delay = random.uniform(0.0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(delay, hint) if hint is not None else delay
+
+    def call(self, fn: Callable[[Optional[float]], T]) -> T:
+        attempt = 0
+        while True:
+            left = remaining()
+            if left is not None and left <= 0:
+                METRICS.inc("outbound_calls_total", service=self.name, outcome="deadline")
+                raise DeadlineExceeded(f"{self.name}: request deadline passed")
+            try:
+                result = self._attempt(fn, left)
+            except Exception as e:
+                if attempt + 1 >= self.attempts or not is_retryable(e, self.retry_on):
+                    METRICS.inc("outbound_calls_total", service=self.name, outcome="error")
+                    raise
+                hint = retry_after(e)
+                delay = self.backoff(attempt, hint)
+                left = remaining()
+                if (hint is not None and hint > self.max_delay) or (left is not None and delay >= left):
+                    # the server or the deadline says a retry can't land in time
+                    METRICS.inc("outbound_calls_total", service=self.name, outcome="deadline")
+                    raise
+                status = status_of(e)
+                reason = str(status) if status is not None else e.__class__.__name__
+                METRICS.inc("outbound_retries_total", service=self.name, reason=reason)
+                LOGGER.warn("outbound.retry", service=self.name, attempt=attempt + 1, reason=reason,
+                            delay_ms=int(delay * 1000), error=str(e)[:200])
+                time.sleep(delay)
+                attempt += 1
+                continue
+            METRICS.inc("outbound_calls_total", service=self.name, outcome="ok")
+            return result
+
+    def _timed(self, fn: Callable[[Optional[float]], T], timeout: Optional[float]) -> T:
+        t0 = time.perf_counter()
+        result = fn(timeout)
+        elapsed = time.perf_counter() - t0
+        self.latency.add(elapsed)
+        METRICS.observe("outbound_latency_ms", elapsed * 1000.0, service=self.name)
+        return result
+
+    def _attempt(self, fn: Callable[[Optional[float]], T], timeout: Optional[float]) -> T:
+        p = self.latency.quantile(self.hedge_quantile) if self.hedge else None
+        if p is None:
+            return self._timed(fn, timeout)
+        pool = _hedge_pool()
+        # each copy gets its own context so spans and the deadline carry over
+        primary = pool.submit(contextvars.copy_context().run, self._timed, fn, timeout)
+        done, _ = wait([primary], timeout=max(p, self.hedge_min_delay))
+        if done:
+            return primary.result()
+        left = remaining()
+        if left is not None and left <= 0:
+            return primary.result()
+        backup = pool.submit(contextvars.copy_context().run, self._timed, fn, left)
+        futures = [primary, backup]
+        first: Optional[Future] = None
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for f in done:
+                futures.remove(f)
+                if f.exception() is None:
+                    # the slower copy can't be interrupted mid-request; it finishes in the background
+                    METRICS.inc("outbound_hedges_total", service=self.name,
+                                outcome="won" if f is backup else "lost")
+                    return f.result()
+                first = first or f
+        METRICS.inc("outbound_hedges_total", service=self.name, outcome="failed")
+        return (first or primary).result()
@@ -0,0 +1,44 @@
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+APP_ROOT = Path(__file__).resolve().parents[2]
+
+# modules that must stay off the import path of backend.main (loaded lazily instead)
+HEAVY_MODULES = ("torch", "sentence_transformers", "transformers", "google.generativeai")
+
+
+def import_profile(module: str = "backend.main", top: int = 15) -> Dict[str, Any]:
+    """Import `module` in a fresh interpreter with -X importtime and summarize the cost."""
+    code = f"import sys; import {module}; print(','.join(sorted(sys.modules)))"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=str(APP_ROOT), capture_output=True, text=True, check=True,
+    )
+    rows: List[Tuple[int, int, str]] = []
+    for line in proc.stderr.splitlines():
+        # "import time:     self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        try:
+            _, rest = line.split(":", 1)
+            self_us, cum_us, name = (p.strip() for p in rest.split("|", 2))
+            rows.append((int(self_us), int(cum_us), name))
+        except ValueError:
+            continue
+    loaded = set(proc.stdout.strip().splitlines()[-1].split(",")) if proc.stdout.strip() else set()
+    target = next((cum for _, cum, name in rows if name == module), 0)
+    slowest = sorted(((cum, name) for _, cum, name in rows if "." not in name), reverse=True)[:top]
+    return {
+        "module": module,
+        "total_ms": target / 1000.0,
+        "slowest_ms": [(name, cum / 1000.0) for cum, name in slowest],
+        "heavy_loaded": sorted(m for m in HEAVY_MODULES if m in loaded),
+    }
+
+
+if __name__ == "__main__":
+    import json
+
+    print(json.dumps(import_profile(sys.argv[1] if len(sys.argv) > 1 else "backend.main"), indent=2))
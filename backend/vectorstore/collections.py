@@ -0,0 +1,259 @@
+from __future__ import annotations
+import asyncio
+import json
+import os
+import re
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from backend.vectorstore.faiss_store import FAISSStore, Document, INDEX_TYPES
+from backend.vectorstore.fingerprint import mismatch
+from backend.vectorstore.snapshot import SnapshotDir, fcntl
+from backend.utils.logging import get_logger
+
+LOGGER = get_logger()
+
+DEFAULT_COLLECTION = "default"
+# deleted rows stay in the index as tombstones until they are this share of it
+COMPACT_AT = float(os.environ.get("INDEX_COMPACT_AT", "0.2"))
+_NAME_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+
+
+def validate_name(name: str) -> str:
+    if not _NAME_RE.match(name or ""):
+        raise ValueError("Collection names must be 1-64 chars of letters, digits, '_' or '-'")
+    return name
+
+
+class Collection:
+    """One shard: its own FAISS index type and, when persisted, its own snapshot directory."""
+
+    def __init__(self, name: str, dim: int, index_type: str = "flat", snapshots: Optional[SnapshotDir] = None):
+        self.name = name
+        self.index_type = index_type
+        self.store = FAISSStore(dim=dim, index_type=index_type)
+        self.snapshots = snapshots
+        self.generation = 0
+        self.dirty = False
+
+    @property
+    def writable(self) -> bool:
+        return self.snapshots is None or self.snapshots.is_writer
+
+    def add(self, embeddings: np.ndarray, docs: List[Document]) -> None:
+        for d in docs:
+            d.metadata["collection"] = self.name
+        self.store.add(embeddings, docs)
+        self.dirty = True
+
+    def delete(self, rows: List[int]) -> None:
+        self.store.delete(rows)
+        self.dirty = True
+
+    @property
+    def needs_compaction(self) -> bool:
+        return self.store.deleted_fraction > COMPACT_AT
+
+    def compact(self) -> None:
+        """Rebuild the store without deleted rows (blocking, O(n)); callers hold the write lock."""
+        store = self.store.compacted()
+        # like swap_in: in-flight searches finish on the old store object
+        self.store = store
+        self.dirty = True
+
+    def search(self, q_emb: np.ndarray, k: int, with_vectors: bool = False) -> List[Tuple[float, Document]]:
+        return self.store.search(q_emb, k=k, with_vectors=with_vectors)
+
+    def search_batch(self, q_embs: np.ndarray, k: int,
+                     with_vectors: bool = False) -> List[List[Tuple[float, Document]]]:
+        return self.store.search_batch(q_embs, k=k, with_vectors=with_vectors)
+
+    def swap_in(self, gen: int, dim: int) -> bool:
+        store = self.snapshots.load(gen, mmap_read_only=not self.snapshots.is_writer)
+        if store is None:
+            return False
+        if store.dim != dim:
+            raise ValueError(f"Snapshot dim {store.dim} of '{self.name}' does not match embedding dim {dim}")
+        # in-flight searches keep the old store object; new ones see this generation
+        self.store = store
+        self.generation = gen
+        return True
+
+    def publish(self) -> int:
+        self.dirty = False
+        self.generation = self.snapshots.publish(self.store)
+        return self.generation
+
+
+class CollectionManager:
+    """Named collections (one FAISS shard each) with scatter-gather search across them.
+
+    Persisted collections live in ``root/<name>/`` as generation snapshots, so any worker
+    on the host can read them and exactly one ingests into each. Each records the
+    `fingerprint` of the embedder that built it; one built by another model is refused.
+    """
+
+    def __init__(self, dim: int, root: Optional[Path] = None, share_default: bool = False,
+                 fingerprint: Optional[Dict[str, Any]] = None):
+        self.dim = dim
+        self.root = Path(root) if root is not None else None
+        self.share_default = share_default
+        self.fingerprint = fingerprint
+        self._collections: Dict[str, Collection] = {}
+        self._rejected: Dict[str, str] = {}  # name -> why its vectors don't fit this embedder
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._collections
+
+    def __iter__(self):
+        return iter(list(self._collections.values()))
+
+    def names(self) -> List[str]:
+        return sorted(self._collections)
+
+    def _persisted(self, name: str) -> bool:
+        if self.root is None or not SnapshotDir.supported():
+            return False
+        # the default collection is rebuilt from sample_pdfs unless workers share it
+        return name != DEFAULT_COLLECTION or self.share_default
+
+    def _config_path(self, name: str) -> Path:
+        return self.root / name / "collection.json"
+
+    def get(self, name: str) -> Optional[Collection]:
+        coll = self._collections.get(name)
+        if coll is not None or not _NAME_RE.match(name or ""):
+            return coll  # invalid names never reach the filesystem
+        if name not in self._rejected and self._persisted(name) and self._config_path(name).exists():
+            # created by another worker; attach to its snapshots
+            try:
+                coll = self.create(name)
+            except ValueError:
+                return None  # built by another embedder (logged); treated as unknown
+        return coll
+
+    def create(self, name: str, index_type: Optional[str] = None) -> Collection:
+        validate_name(name)
+        if name in self._collections:
+            return self._collections[name]
+        if name in self._rejected:
+            raise ValueError(f"Collection '{name}' was built with another embedding model: {self._rejected[name]}")
+        persisted = self._persisted(name)
+        cfg_path = self._config_path(name) if persisted else None
+        cfg: Dict[str, Any] = {}
+        if cfg_path is not None and cfg_path.exists():
+            # the first creator decides the index type
+            cfg = json.loads(cfg_path.read_text(encoding="utf-8"))
+            if name == DEFAULT_COLLECTION and self._stale(cfg):
+                # rebuilt from sample_pdfs anyway, so an index from another model is set aside, not refused
+                self._set_aside(name)
+                cfg = json.loads(cfg_path.read_text(encoding="utf-8")) if cfg_path.exists() else {}
+        if cfg:
+            index_type = cfg.get("index_type", "flat")
+            self._check_embedder(name, cfg)
+        index_type = index_type or "flat"
+        # before anything is written: a rejected request must not leave a config behind
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"index_type must be one of {', '.join(INDEX_TYPES)}")
+        snapshots = None
+        if persisted:
+            snapshots = SnapshotDir(self.root / name)
+            # only the writer records the config; readers go by whatever it has published
+            if snapshots.try_acquire_writer() and (
+                    not cfg_path.exists() or (self.fingerprint is not None and not cfg.get("embedder"))):
+                # new collection, or one from before fingerprints were recorded: it adopts this embedder
+                cfg = {**cfg, "index_type": index_type}
+                if self.fingerprint is not None:
+                    cfg["embedder"] = self.fingerprint
+                self._write_config(cfg_path, cfg)
+        coll = Collection(name, self.dim, index_type=index_type, snapshots=snapshots)
+        if snapshots is not None:
+            gen = snapshots.current_generation()
+            if gen:
+                coll.swap_in(gen, self.dim)
+        self._collections[name] = coll
+        LOGGER.info("collection.opened", name=name, index_type=index_type, chunks=len(coll.store),
+                    persisted=snapshots is not None, writer=coll.writable)
+        return coll
+
+    @staticmethod
+    def _write_config(path: Path, cfg: Dict[str, Any]) -> None:
+        # readers in other processes never see a half-written file
+        tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+        tmp.write_text(json.dumps(cfg), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def _stale(self, cfg: Dict[str, Any]) -> Optional[str]:
+        recorded = cfg.get("embedder")
+        return mismatch(recorded, self.fingerprint) if recorded and self.fingerprint else None
+
+    def _set_aside(self, name: str) -> None:
+        """Move a collection built by another embedder to INDEX_DIR/.stale/, so it starts over empty."""
+        stale = self.root / ".stale"
+        stale.mkdir(parents=True, exist_ok=True)
+        # workers starting together all see the mismatch; only the first moves the directory
+        with open(stale / f"{name}.lock", "a") as lock:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            cfg_path = self._config_path(name)
+            if not cfg_path.exists():
+                return
+            reason = self._stale(json.loads(cfg_path.read_text(encoding="utf-8")))
+            if reason is None:
+                return  # already set aside and recreated by another worker
+            dest = stale / f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+            (self.root / name).rename(dest)
+        LOGGER.warn("collection.set_aside", name=name, moved_to=str(dest), reason=reason)
+
+    def _check_embedder(self, name: str, cfg: Dict[str, Any]) -> None:
+        reason = self._stale(cfg)
+        if reason is None:
+            return
+        self._rejected[name] = reason
+        LOGGER.error("collection.embedder_mismatch", name=name, reason=reason)
+        raise ValueError(f"Collection '{name}' was built with another embedding model: {reason}")
+
+    def discover(self) -> List[str]:
+        """Open persisted collections created by other workers since the last call."""
+        if self.root is None or not self.root.exists():
+            return []
+        found = []
+        for cfg in self.root.glob("*/collection.json"):
+            name = cfg.parent.name
+            if name not in self._collections and name not in self._rejected and self._persisted(name):
+                try:
+                    self.create(name)
+                except ValueError:
+                    continue  # logged once; stays unsearchable until re-indexed
+                found.append(name)
+        return found
+
+    async def search(self, q_emb: np.ndarray, names: Iterable[str], k: int,
+                     with_vectors: bool = False) -> List[Tuple[float, Document]]:
+        colls = [c for c in (self.get(n) for n in names) if c is not None and len(c.store)]
+        if not colls:
+            return []
+        if len(colls) == 1:
+            return colls[0].search(q_emb, k, with_vectors)
+        # scatter to all shards in parallel (faiss releases the GIL), gather and merge top-k
+        parts = await asyncio.gather(*(asyncio.to_thread(c.search, q_emb, k, with_vectors) for c in colls))
+        merged = [hit for part in parts for hit in part]
+        merged.sort(key=lambda x: x[0], reverse=True)
+        return merged[:k]
+
+    async def search_batch(self, q_embs: np.ndarray, names: Iterable[str], k: int,
+                           with_vectors: bool = False) -> List[List[Tuple[float, Document]]]:
+        """Like search() for many queries: one multi-query FAISS search per shard, merged per query."""
+        colls = [c for c in (self.get(n) for n in names) if c is not None and len(c.store)]
+        if not colls:
+            return [[] for _ in range(len(q_embs))]
+        parts = await asyncio.gather(*(asyncio.to_thread(c.search_batch, q_embs, k, with_vectors) for c in colls))
+        merged: List[List[Tuple[float, Document]]] = []
+        for per_coll in zip(*parts):
+            hits = [hit for part in per_coll for hit in part]
+            hits.sort(key=lambda x: x[0], reverse=True)
+            merged.append(hits[:k])
+        return merged
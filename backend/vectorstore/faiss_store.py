@@ -1,24 +1,81 @@
 from __future__ import annotations
-from dataclasses import dataclass
-from typing import List, Dict, Any, Tuple
+import json
+import mmap
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
 import faiss  # type: ignore
 import numpy as np
 
+# zero-copy mmap of flat codes where the faiss build supports it
+_MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
 
 @dataclass
 class Document:
     text: str
     metadata: Dict[str, Any]
+    # the stored (normalized) vector, attached by search_batch(with_vectors=True); never persisted
+    vector: Optional[np.ndarray] = field(default=None, repr=False, compare=False)
+
+
+class _MappedDocs:
+    """Read-only view over docs.jsonl; lines are decoded on access so workers share page cache."""
+
+    def __init__(self, path: Path):
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self._offsets = np.load(str(path.with_suffix(".offsets.npy")), mmap_mode="r")
+
+    def __len__(self) -> int:
+        return max(0, len(self._offsets) - 1)
+
+    def __getitem__(self, idx: int) -> Dict[str, Any]:
+        start, end = int(self._offsets[idx]), int(self._offsets[idx + 1])
+        return json.loads(self._mm[start:end])
+
+
+INDEX_TYPES = ("flat", "hnsw")
+
+
+def _make_index(dim: int, index_type: str):
+    if index_type == "flat":
+        return faiss.IndexFlatIP(dim)
+    if index_type == "hnsw":
+        # approximate, sub-linear search for larger collections; no training step needed
+        index = faiss.IndexHNSWFlat(dim, 32, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efSearch = 64
+        return index
+    raise ValueError(f"Unknown index type: {index_type}")
 
 
 class FAISSStore:
-    def __init__(self, dim: int):
+    def __init__(self, dim: int, index_type: str = "flat"):
         self.dim = dim
-        self.index = faiss.IndexFlatIP(dim)
+        self.index_type = index_type
+        self.index = _make_index(dim, index_type)
         self._texts: List[str] = []
         self._metas: List[Dict[str, Any]] = []
+        self._mapped: _MappedDocs | None = None
         self._norm = True  # cosine via normalized dot-product
+        # rows removed without touching the index (hnsw can't remove); searches skip them
+        self._deleted = np.empty(0, dtype=np.int64)
+        self._params = None
+
+    @property
+    def read_only(self) -> bool:
+        return self._mapped is not None
+
+    def __len__(self) -> int:
+        """Live chunks, not counting deleted rows."""
+        return int(self.index.ntotal) - len(self._deleted)
+
+    @property
+    def deleted_fraction(self) -> float:
+        return len(self._deleted) / self.index.ntotal if self.index.ntotal else 0.0
 
     @staticmethod
     def _normalize(x: np.ndarray) -> np.ndarray:
@@ -27,6 +84,8 @@ class FAISSStore:
         return x / norms
 
     def add(self, embeddings: np.ndarray, docs: List[Document]) -> None:
+        if self.read_only:
+            raise RuntimeError("Store is a read-only snapshot")
         if embeddings.ndim != 2 or embeddings.shape[1] != self.dim:
             raise ValueError("Embedding dimension mismatch")
         vecs = self._normalize(embeddings.astype(np.float32)) if self._norm else embeddings.astype(np.float32)
@@ -35,15 +94,137 @@ class FAISSStore:
             self._texts.append(d.text)
             self._metas.append(d.metadata)
 
-    def search(self, query_emb: np.ndarray, k: int = 5) -> List[Tuple[float, Document]]:
-        q = query_emb.astype(np.float32)
+    def _live_rows(self) -> Iterator[int]:
+        deleted = set(self._deleted.tolist())
+        return (i for i in range(int(self.index.ntotal)) if i not in deleted)
+
+    def documents(self) -> Iterator[Document]:
+        for i in self._live_rows():
+            yield self._doc(i)
+
+    def metadatas(self) -> Iterator[Dict[str, Any]]:
+        for d in self.documents():
+            yield d.metadata
+
+    def find(self, match: Callable[[Dict[str, Any]], bool]) -> List[int]:
+        """Live rows whose metadata `match` accepts (a scan of the metadata only)."""
+        return [i for i in self._live_rows() if match(self._doc(i).metadata)]
+
+    def delete(self, rows: List[int]) -> None:
+        """Tombstone `rows`: O(len(rows)), the index itself is left as is until compacted()."""
+        if self.read_only:
+            raise RuntimeError("Store is a read-only snapshot")
+        if len(rows):
+            # swapped in one assignment, so searches in other threads see the old or the new set
+            self._deleted = np.union1d(self._deleted, np.asarray(rows, dtype=np.int64))
+            self._params = None
+
+    def compacted(self) -> "FAISSStore":
+        """A copy without deleted rows; O(n), and an hnsw graph is rebuilt."""
+        return self.filtered(lambda meta: True)
+
+    def filtered(self, keep: Callable[[Dict[str, Any]], bool]) -> "FAISSStore":
+        """A new writable store holding only the live rows whose metadata passes `keep`.
+
+        Vectors are copied out of the index rather than re-embedded.
+        """
+        rows = self.find(keep)
+        out = FAISSStore(dim=self.dim, index_type=self.index_type)
+        if rows:
+            # stored vectors are already normalized
+            out.index.add(self.index.reconstruct_batch(np.asarray(rows, dtype=np.int64)))
+            for i in rows:
+                d = self._doc(i)
+                out._texts.append(d.text)
+                out._metas.append(d.metadata)
+        return out
+
+    def _doc(self, idx: int) -> Document:
+        if self._mapped is not None:
+            row = self._mapped[idx]
+            return Document(text=row["text"], metadata=row["metadata"])
+        return Document(text=self._texts[idx], metadata=self._metas[idx])
+
+    def search(self, query_emb: np.ndarray, k: int = 5, with_vectors: bool = False) -> List[Tuple[float, Document]]:
+        return self.search_batch(query_emb, k=k, with_vectors=with_vectors)[0]
+
+    def search_batch(self, query_embs: np.ndarray, k: int = 5,
+                     with_vectors: bool = False) -> List[List[Tuple[float, Document]]]:
+        """Top-k for each row of `query_embs` in one FAISS call (one matrix product for flat indexes).
+
+        with_vectors attaches each hit's stored vector (one reconstruct call for all hits), so
+        re-rankers can compare candidates without re-embedding them.
+        """
+        q = query_embs.astype(np.float32)
         if q.ndim == 1:
             q = q[None, :]
         qn = self._normalize(q) if self._norm else q
-        scores, idxs = self.index.search(qn, k)
-        results: List[Tuple[float, Document]] = []
-        for score, idx in zip(scores[0], idxs[0]):
-            if idx == -1:
-                continue
-            results.append((float(score), Document(text=self._texts[idx], metadata=self._metas[idx])))
+        params = self._search_params()
+        scores, idxs = self.index.search(qn, k, params=params) if params is not None else self.index.search(qn, k)
+        vectors: Dict[int, np.ndarray] = {}
+        if with_vectors:
+            hits = np.unique(idxs[idxs != -1]).astype(np.int64)
+            if hits.size:
+                vectors = dict(zip(hits.tolist(), self.index.reconstruct_batch(hits)))
+        results: List[List[Tuple[float, Document]]] = []
+        for row_scores, row_idxs in zip(scores, idxs):
+            row = []
+            for score, idx in zip(row_scores, row_idxs):
+                if idx == -1:
+                    continue
+                doc = self._doc(int(idx))
+                doc.vector = vectors.get(int(idx))
+                row.append((float(score), doc))
+            results.append(row)
         return results
+
+    def _search_params(self):
+        if not len(self._deleted):
+            return None
+        params = self._params
+        if params is None:
+            sel = faiss.IDSelectorNot(faiss.IDSelectorBatch(self._deleted))
+            if self.index_type == "hnsw":
+                params = faiss.SearchParametersHNSW(sel=sel, efSearch=self.index.hnsw.efSearch)
+            else:
+                params = faiss.SearchParameters(sel=sel)
+            self._params = params
+        return params
+
+    def save(self, directory: Path) -> None:
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        faiss.write_index(self.index, str(directory / "index.faiss"))
+        offsets = [0]
+        with open(directory / "docs.jsonl", "wb") as f:
+            for i in range(int(self.index.ntotal)):
+                d = self._doc(i)
+                line = json.dumps({"text": d.text, "metadata": d.metadata}, ensure_ascii=False).encode("utf-8") + b"\n"
+                f.write(line)
+                offsets.append(offsets[-1] + len(line))
+            f.flush()
+            os.fsync(f.fileno())
+        np.save(str(directory / "docs.offsets.npy"), np.asarray(offsets, dtype=np.int64))
+        np.save(str(directory / "deleted.npy"), self._deleted)
+        with open(directory / "meta.json", "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "ntotal": len(self), "index_type": self.index_type}, f)
+
+    @classmethod
+    def load(cls, directory: Path, mmap_read_only: bool = False) -> "FAISSStore":
+        """Load a saved store; with mmap_read_only the index and docs stay on disk, shared between processes."""
+        directory = Path(directory)
+        meta = json.loads((directory / "meta.json").read_text(encoding="utf-8"))
+        store = cls(dim=int(meta["dim"]), index_type=meta.get("index_type", "flat"))
+        if (directory / "deleted.npy").exists():
+            store._deleted = np.load(str(directory / "deleted.npy"))
+        if mmap_read_only:
+            store.index = faiss.read_index(str(directory / "index.faiss"), _MMAP_FLAGS)
+            store._mapped = _MappedDocs(directory / "docs.jsonl")
+            return store
+        store.index = faiss.read_index(str(directory / "index.faiss"))
+        with open(directory / "docs.jsonl", "r", encoding="utf-8") as f:
+            for line in f:
+                row = json.loads(line)
+                store._texts.append(row["text"])
+                store._metas.append(row["metadata"])
+        return store
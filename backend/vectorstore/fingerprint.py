@@ -0,0 +1,36 @@
+"""The fingerprint that ties a persisted index to the embedding model that built it."""
+import os
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+# embedded at load; vectors of the same model agree on it across backends and quantization
+PROBE_TEXT = "Retrieval-augmented generation grounds model answers in retrieved documents."
+PROBE_MIN_COSINE = float(os.environ.get("EMBED_PROBE_MIN_COSINE", "0.98"))
+
+
+def fingerprint(model: Any, name: str) -> Dict[str, Any]:
+    """Model name, dimension and the unit vector of PROBE_TEXT, recorded with persisted indexes.
+
+    `model` is anything with encode() and get_sentence_embedding_dimension(), see agents.embedders.Embedder.
+    """
+    probe = np.asarray(model.encode([PROBE_TEXT]), dtype=np.float32)[0]
+    probe /= np.linalg.norm(probe) or 1.0
+    return {"model": name, "dim": int(model.get_sentence_embedding_dimension()),
+            "probe": [round(float(x), 5) for x in probe]}
+
+
+def mismatch(recorded: Dict[str, Any], current: Dict[str, Any]) -> Optional[str]:
+    """Why vectors made under `recorded` can't be searched with `current`'s queries, or None."""
+    if int(recorded.get("dim", current["dim"])) != current["dim"]:
+        return f"dimension {recorded['dim']} != {current['dim']}"
+    if not recorded.get("probe"):
+        return None
+    # compared by direction rather than by name: an exported or quantized copy of the same
+    # model passes, a different model of the same size does not
+    a = np.asarray(recorded["probe"], dtype=np.float32)
+    b = np.asarray(current["probe"], dtype=np.float32)
+    cos = float(a @ b / ((np.linalg.norm(a) * np.linalg.norm(b)) or 1.0))
+    if cos < PROBE_MIN_COSINE:
+        return f"indexed with '{recorded.get('model')}', now '{current['model']}' (probe cosine {cos:.3f})"
+    return None
@@ -0,0 +1,146 @@
+from __future__ import annotations
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import faiss  # type: ignore
+import numpy as np
+
+
+def _env_ttl(name: str, default: float) -> Optional[float]:
+    # <= 0 means "never expires"
+    value = float(os.environ.get(name, default))
+    return value if value > 0 else None
+
+
+# how long an answer stays fresh, per agent that contributed to it (seconds)
+DEFAULT_TTLS: Dict[str, Optional[float]] = {
+    "PDF RAG": _env_ttl("CACHE_TTL_PDF", 0),
+    "Web Search": _env_ttl("CACHE_TTL_WEB", 15 * 60),
+    "ArXiv": _env_ttl("CACHE_TTL_ARXIV", 6 * 3600),
+}
+
+
+@dataclass
+class CacheEntry:
+    query: str
+    answer: str
+    agents: List[str]
+    rationale: str
+    trace_id: str
+    corpus_version: int
+    scope: Tuple[str, ...] = ()  # collections searched; answers never leak across tenants
+    created: float = field(default_factory=time.time)
+    expires: Optional[float] = None
+    hits: int = 0
+
+
+class SemanticCache:
+    """Answer cache keyed on query embeddings; paraphrases above a cosine threshold share an entry."""
+
+    def __init__(self, dim: int, threshold: float = 0.92, max_entries: int = 2000,
+                 ttls: Optional[Dict[str, Optional[float]]] = None):
+        self.dim = dim
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+        self._entries: Dict[int, CacheEntry] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(x: np.ndarray) -> np.ndarray:
+        x = x.astype(np.float32).reshape(1, -1)
+        norm = np.linalg.norm(x)
+        return x / norm if norm else x
+
+    def _ttl_for(self, agents: List[str]) -> Optional[float]:
+        # the answer is only as fresh as its most volatile source
+        ttls = [self.ttls.get(a) for a in agents]
+        ttls = [t for t in ttls if t is not None]
+        return min(ttls) if ttls else None
+
+    def _is_stale(self, entry: CacheEntry, corpus_version: int, now: float, allow_expired: bool = False) -> bool:
+        if not allow_expired and entry.expires is not None and now >= entry.expires:
+            return True
+        return "PDF RAG" in entry.agents and entry.corpus_version != corpus_version
+
+    def _remove(self, ids: List[int]) -> None:
+        if not ids:
+            return
+        self.index.remove_ids(np.asarray(ids, dtype=np.int64))
+        for i in ids:
+            self._entries.pop(i, None)
+
+    def lookup(self, q_emb: np.ndarray, corpus_version: int, scope: Tuple[str, ...] = (),
+               threshold: Optional[float] = None, allow_expired: bool = False) -> Optional[Tuple[float, CacheEntry]]:
+        """Closest fresh entry above the threshold. Under overload callers may lower the
+        threshold and accept answers past their TTL rather than recompute them."""
+        threshold = self.threshold if threshold is None else threshold
+        with self._lock:
+            if self.index.ntotal == 0:
+                self.misses += 1
+                return None
+            k = min(8, self.index.ntotal)
+            scores, ids = self.index.search(self._normalize(q_emb), k)
+            now = time.time()
+            stale: List[int] = []
+            found: Optional[Tuple[float, CacheEntry]] = None
+            for score, idx in zip(scores[0], ids[0]):
+                if idx == -1 or score < threshold:
+                    break
+                entry = self._entries.get(int(idx))
+                if entry is None or entry.scope != scope:
+                    continue
+                if self._is_stale(entry, corpus_version, now, allow_expired):
+                    stale.append(int(idx))
+                    continue
+                entry.hits += 1
+                found = (float(score), entry)
+                break
+            self._remove(stale)
+            if found is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return found
+
+    def put(self, q_emb: np.ndarray, entry: CacheEntry) -> None:
+        ttl = self._ttl_for(entry.agents)
+        entry.expires = entry.created + ttl if ttl is not None else None
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._evict()
+            eid = self._next_id
+            self._next_id += 1
+            self.index.add_with_ids(self._normalize(q_emb), np.asarray([eid], dtype=np.int64))
+            self._entries[eid] = entry
+
+    def _evict(self) -> None:
+        # drop expired entries first, then the oldest quarter
+        now = time.time()
+        expired = {i for i, e in self._entries.items() if e.expires is not None and now >= e.expires}
+        if len(self._entries) - len(expired) >= self.max_entries:
+            by_age = sorted((i for i in self._entries if i not in expired), key=lambda i: self._entries[i].created)
+            expired.update(by_age[: max(1, self.max_entries // 4)])
+        self._remove(list(expired))
+
+    def invalidate(self, agent: Optional[str] = None) -> int:
+        with self._lock:
+            ids = [i for i, e in self._entries.items() if agent is None or agent in e.agents]
+            self._remove(ids)
+            return len(ids)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+        }
@@ -0,0 +1,119 @@
+from __future__ import annotations
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import Optional
+
+try:
+    import fcntl  # type: ignore
+except ImportError:  # Windows: no flock, shared mode falls back to local
+    fcntl = None  # type: ignore
+
+from backend.vectorstore.faiss_store import FAISSStore
+from backend.utils.logging import get_logger
+
+LOGGER = get_logger()
+
+KEEP_GENERATIONS = 3  # readers may still be mapped to the previous ones while they swap
+
+
+class SnapshotDir:
+    """Generation-numbered index snapshots shared by all workers on one host.
+
+    Layout::
+
+        root/writer.lock     flock held by the single ingesting process
+        root/CURRENT         number of the latest complete generation
+        root/gen-00000007/   FAISSStore.save() output
+        root/inbox/          PDFs handed over by non-writer workers
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.inbox = self.root / "inbox"
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.inbox.mkdir(parents=True, exist_ok=True)
+        self._lock_file = None
+
+    @staticmethod
+    def supported() -> bool:
+        return fcntl is not None
+
+    # --- writer election -------------------------------------------------
+
+    def try_acquire_writer(self) -> bool:
+        if self._lock_file is not None:
+            return True
+        f = open(self.root / "writer.lock", "a+")
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        f.seek(0)
+        f.truncate()
+        f.write(str(os.getpid()))
+        f.flush()
+        # the lock lives as long as this handle (released by the OS if the process dies)
+        self._lock_file = f
+        return True
+
+    @property
+    def is_writer(self) -> bool:
+        return self._lock_file is not None
+
+    # --- generations -----------------------------------------------------
+
+    def _gen_dir(self, gen: int) -> Path:
+        return self.root / f"gen-{gen:08d}"
+
+    def current_generation(self) -> int:
+        try:
+            return int((self.root / "CURRENT").read_text().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def publish(self, store: FAISSStore) -> int:
+        if not self.is_writer:
+            raise RuntimeError("Only the writer process can publish snapshots")
+        gen = self.current_generation() + 1
+        tmp = self.root / f".gen-{gen:08d}.{uuid.uuid4().hex}.tmp"
+        store.save(tmp)
+        os.replace(tmp, self._gen_dir(gen))
+        # CURRENT flips atomically, so readers never see a half-written generation
+        cur_tmp = self.root / f".CURRENT.{uuid.uuid4().hex}"
+        cur_tmp.write_text(str(gen))
+        os.replace(cur_tmp, self.root / "CURRENT")
+        self._prune(gen)
+        LOGGER.info("snapshot.published", dir=self.root.name, generation=gen, chunks=len(store))
+        return gen
+
+    def _prune(self, latest: int) -> None:
+        for path in self.root.glob("gen-*"):
+            try:
+                gen = int(path.name.split("-", 1)[1])
+            except ValueError:
+                continue
+            if gen <= latest - KEEP_GENERATIONS:
+                # unlinking is safe for mapped readers on POSIX; pages stay valid until unmapped
+                shutil.rmtree(path, ignore_errors=True)
+
+    def load(self, gen: Optional[int] = None, mmap_read_only: bool = True) -> Optional[FAISSStore]:
+        gen = self.current_generation() if gen is None else gen
+        if gen <= 0:
+            return None
+        return FAISSStore.load(self._gen_dir(gen), mmap_read_only=mmap_read_only)
+
+    # --- ingestion hand-off ----------------------------------------------
+
+    def enqueue(self, pdf_path: Path, name: Optional[str] = None) -> Path:
+        name = name or Path(pdf_path).name
+        tmp = self.inbox / f".{uuid.uuid4().hex}.part"
+        shutil.copyfile(pdf_path, tmp)
+        dest = self.inbox / name
+        os.replace(tmp, dest)
+        return dest
+
+    def pending(self) -> list:
+        return sorted(self.inbox.glob("*.pdf"), key=lambda p: p.stat().st_mtime)
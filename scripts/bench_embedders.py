@@ -0,0 +1,143 @@
+"""Compare embedding backends: load time, encode throughput and retrieval agreement.
+
+The first backend is the reference; every other backend is scored against it by the mean
+cosine between their passage vectors and by recall@k of its top-k passages per query.
+Passages and queries come from the synthetic corpus of scripts/generate_pdfs.py. Examples:
+
+    python scripts/bench_embedders.py --backends torch,torch-int8
+    EMBED_MODEL=models/minilm-onnx python scripts/bench_embedders.py --backends torch,onnx,onnx-int8 --threads 4
+
+Results are written as JSON (default: bench_results/embedders-<commit>-<time>.json).
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+APP_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(APP_ROOT))
+sys.path.insert(0, str(APP_ROOT / "scripts"))
+
+from benchmark import git_commit, percentiles  # noqa: E402
+from generate_pdfs import generate_corpus  # noqa: E402
+
+
+def load_texts(corpus_dir: Path, n_passages: int, seed: int) -> Tuple[List[str], List[str]]:
+    from backend.agents.chunking import Chunker
+
+    pdfs, queries = generate_corpus(corpus_dir / f"chunks_{n_passages}", n_passages, seed=seed)
+    chunker = Chunker()
+    passages: List[str] = []
+    for pdf in pdfs:
+        passages.extend(c.text for c in chunker.chunk_pdf(pdf))
+        if len(passages) >= n_passages:
+            break
+    return passages[:n_passages], queries
+
+
+def _unit(x: np.ndarray) -> np.ndarray:
+    return x / np.maximum(np.linalg.norm(x, axis=1, keepdims=True), 1e-12)
+
+
+def bench_backend(backend: str, model_name: str, threads: int, model_file: Optional[str],
+                  passages: List[str], queries: List[str], batch_size: int) -> Dict[str, Any]:
+    from backend.agents.embedders import load_embedder
+
+    t0 = time.perf_counter()
+    model = load_embedder(backend, model_name, threads, model_file)
+    load_s = time.perf_counter() - t0
+    model.encode(passages[:batch_size], batch_size=batch_size)  # warm-up
+
+    t0 = time.perf_counter()
+    p_emb = model.encode(passages, batch_size=batch_size, convert_to_numpy=True)
+    encode_s = time.perf_counter() - t0
+    single_ms: List[float] = []
+    q_emb = []
+    for q in queries:
+        t0 = time.perf_counter()
+        q_emb.append(model.encode([q], convert_to_numpy=True)[0])
+        single_ms.append((time.perf_counter() - t0) * 1000)
+    return {
+        "backend": backend,
+        "load_s": round(load_s, 3),
+        "passages_per_s": round(len(passages) / encode_s, 1) if encode_s else 0.0,
+        "query_latency": percentiles(single_ms),
+        "_p": _unit(np.asarray(p_emb, dtype=np.float32)),
+        "_q": _unit(np.asarray(q_emb, dtype=np.float32)),
+    }
+
+
+def score(ref: Dict[str, Any], other: Dict[str, Any], k: int) -> Dict[str, float]:
+    k = min(k, len(ref["_p"]))
+    ref_top = np.argsort(-(ref["_q"] @ ref["_p"].T), axis=1)[:, :k]
+    top = np.argsort(-(other["_q"] @ other["_p"].T), axis=1)[:, :k]
+    recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(ref_top, top)])
+    return {
+        f"recall_at_{k}": round(float(recall), 4),
+        "mean_cosine_to_reference": round(float(np.mean(np.sum(ref["_p"] * other["_p"], axis=1))), 4),
+        "speedup": round(other["passages_per_s"] / ref["passages_per_s"], 2) if ref["passages_per_s"] else 0.0,
+    }
+
+
+def main_cli(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    from backend.agents.embedders import DEFAULT_EMBED_MODEL, EMBED_THREADS
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", default="torch,torch-int8", help="comma-separated; the first is the reference")
+    parser.add_argument("--model", default=os.environ.get("EMBED_MODEL", DEFAULT_EMBED_MODEL))
+    parser.add_argument("--model-file", default=os.environ.get("EMBED_MODEL_FILE"),
+                        help="file inside the model dir for onnx backends")
+    parser.add_argument("--threads", type=int, default=EMBED_THREADS, help="0: library default")
+    parser.add_argument("--passages", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--corpus-dir", type=Path, default=APP_ROOT / "bench_results" / "corpora")
+    parser.add_argument("--out", type=Path, default=None)
+    args = parser.parse_args(argv)
+
+    passages, queries = load_texts(args.corpus_dir, args.passages, args.seed)
+    print(f"{len(passages)} passages, {len(queries)} queries, model {args.model}", flush=True)
+    runs = []
+    for backend in [b for b in args.backends.split(",") if b]:
+        print(f"[{backend}] encoding ...", flush=True)
+        # int8 files only apply to the -int8 onnx backend; let it pick one for this CPU otherwise
+        model_file = args.model_file if backend.startswith("onnx") else None
+        runs.append(bench_backend(backend, args.model, args.threads, model_file, passages, queries, args.batch_size))
+
+    results = []
+    for run in runs:
+        entry = {k: v for k, v in run.items() if not k.startswith("_")}
+        entry.update(score(runs[0], run, args.k))
+        results.append(entry)
+        print(f"  {entry['backend']:<11} {entry['passages_per_s']:>8.1f} passages/s  x{entry['speedup']:<5} "
+              f"query p50 {entry['query_latency']['p50_ms']:>7.2f} ms  recall@{args.k} "
+              f"{entry[f'recall_at_{args.k}']:.3f}  cos {entry['mean_cosine_to_reference']:.4f}")
+
+    commit = git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()},
+        },
+        "results": results,
+    }
+    out = args.out or APP_ROOT / "bench_results" / f"embedders-{commit}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"Results written to {out}")
+    return report
+
+
+if __name__ == "__main__":
+    main_cli()
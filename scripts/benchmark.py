@@ -0,0 +1,330 @@
+"""End-to-end benchmark: ingest throughput, retrieval latency, /ask throughput, memory per chunk.
+
+All outbound services (Gemini, SerpAPI/DuckDuckGo, arXiv) are replaced by local stand-ins
+from scripts/fake_services.py, so results are reproducible offline. Examples:
+
+    python scripts/benchmark.py --scales 10k
+    python scripts/benchmark.py --scales 10k,100k --embedder hash --concurrency 1,8,32
+    python scripts/benchmark.py --scales 10k --compare bench_results/<older>.json
+
+Results are written as JSON (default: bench_results/bench-<commit>-<time>.json).
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+APP_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(APP_ROOT))
+sys.path.insert(0, str(APP_ROOT / "scripts"))
+
+from fake_services import FakeServices, Latency  # noqa: E402
+from generate_pdfs import generate_corpus  # noqa: E402
+
+_WORD_RE = re.compile(r"\w+")
+
+
+class HashEmbedder:
+    """Deterministic bag-of-words hashing embedder; no model download, ~MiniLM-sized vectors."""
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(self, texts: List[str], **kwargs: Any) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for w in _WORD_RE.findall(text.lower()):
+                h = int.from_bytes(hashlib.blake2b(w.encode("utf-8"), digest_size=8).digest(), "little")
+                out[i, h % self.dim] += 1.0 if (h >> 32) & 1 else -1.0
+        return out
+
+
+def parse_scale(s: str) -> int:
+    s = s.strip().lower()
+    mult = {"k": 1_000, "m": 1_000_000}.get(s[-1], 1)
+    return int(float(s[:-1] if s[-1] in "km" else s) * mult)
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # peak, not current
+
+
+def percentiles(samples_ms: List[float]) -> Dict[str, float]:
+    if not samples_ms:
+        return {"p50_ms": 0.0, "p90_ms": 0.0, "p99_ms": 0.0, "mean_ms": 0.0, "n": 0}
+    arr = np.asarray(samples_ms)
+    return {
+        "p50_ms": round(float(np.percentile(arr, 50)), 3),
+        "p90_ms": round(float(np.percentile(arr, 90)), 3),
+        "p99_ms": round(float(np.percentile(arr, 99)), 3),
+        "mean_ms": round(float(arr.mean()), 3),
+        "n": int(arr.size),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=str(APP_ROOT),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+async def bench_ingest(agent, pdfs: List[Path]) -> Dict[str, Any]:
+    rss0 = rss_bytes()
+    t0 = time.perf_counter()
+    pages = 0
+    for pdf in pdfs:
+        await agent.ingest_pdf(pdf)
+        pages += _page_count(pdf)
+    elapsed = time.perf_counter() - t0
+    chunks = len(agent.store)
+    rss1 = rss_bytes()
+    return {
+        "chunks": chunks,
+        "pdfs": len(pdfs),
+        "pages": pages,
+        "seconds": round(elapsed, 3),
+        "chunks_per_s": round(chunks / elapsed, 1) if elapsed else 0.0,
+        "pages_per_s": round(pages / elapsed, 1) if elapsed else 0.0,
+        "memory": {
+            "rss_delta_bytes": rss1 - rss0,
+            "bytes_per_chunk": round((rss1 - rss0) / chunks, 1) if chunks else 0.0,
+            "index_bytes_per_chunk": agent.dim * 4,
+        },
+    }
+
+
+def _page_count(pdf: Path) -> int:
+    import fitz
+    with fitz.open(str(pdf)) as doc:
+        return len(doc)
+
+
+async def bench_retrieval(agent, queries: List[str], n: int, seed: int) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    picks = [rng.choice(queries) for _ in range(n)]
+    embed_ms, search_ms, total_ms = [], [], []
+    for q in picks[:5]:  # warm-up
+        await agent.retrieve(q)
+    for q in picks:
+        t0 = time.perf_counter()
+        q_emb = agent.embed_query(q)
+        t1 = time.perf_counter()
+        agent.store.search(q_emb, k=15)
+        t2 = time.perf_counter()
+        await agent.retrieve(q, q_emb=q_emb)
+        t3 = time.perf_counter()
+        embed_ms.append((t1 - t0) * 1000)
+        search_ms.append((t2 - t1) * 1000)
+        total_ms.append((t1 - t0 + t3 - t2) * 1000)
+    return {"embed": percentiles(embed_ms), "faiss_search": percentiles(search_ms), "retrieve": percentiles(total_ms)}
+
+
+ASK_QUERIES = [
+    "Summarize the report about {t}",                # PDF RAG
+    "What are the latest news about {t}?",           # Web Search
+    "Show me recent papers on {t}",                  # ArXiv
+    "Summarize recent papers and latest news on {t}",  # all three
+]
+
+
+async def bench_ask(concurrency: int, n_requests: int, topics: List[str], seed: int) -> Dict[str, Any]:
+    import httpx
+    from backend.main import app
+
+    rng = random.Random(seed)
+    bodies = [{"query": rng.choice(ASK_QUERIES).format(t=rng.choice(topics)) + f" #{i}"} for i in range(n_requests)]
+    latencies: List[float] = []
+    errors = 0
+    rejected = 0  # 429/503 from admission control
+    degraded = 0
+    mock_answers = 0  # 200s whose LLM call failed after retries
+    sem = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=120) as client:
+        async def one(body):
+            nonlocal errors, rejected, degraded, mock_answers
+            async with sem:
+                t0 = time.perf_counter()
+                r = await client.post("/ask", json=body)
+                latencies.append((time.perf_counter() - t0) * 1000)
+                if r.status_code in (429, 503):
+                    rejected += 1
+                elif r.status_code != 200:
+                    errors += 1
+                else:
+                    data = r.json()
+                    degraded += bool(data.get("degraded"))
+                    mock_answers += data.get("answer", "").startswith(("[MOCK", "[LLM ERROR"))
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(b) for b in bodies))
+        elapsed = time.perf_counter() - t0
+    return {
+        "concurrency": concurrency,
+        "requests": n_requests,
+        "errors": errors,
+        "rejected": rejected,
+        "degraded": degraded,
+        "mock_answers": mock_answers,
+        "seconds": round(elapsed, 3),
+        "requests_per_s": round(n_requests / elapsed, 2) if elapsed else 0.0,
+        "latency": percentiles(latencies),
+    }
+
+
+async def run_scale(n_chunks: int, args, fakes: FakeServices, work_dir: Path) -> Dict[str, Any]:
+    from backend.agents.controller import ControllerAgent
+    from backend.agents.rag_pdf import PDFRAGAgent
+    from backend.utils.logging import Tracer
+    import backend.main as main
+
+    t0 = time.perf_counter()
+    pdfs, queries = generate_corpus(args.corpus_dir / f"chunks_{n_chunks}", n_chunks, seed=args.seed)
+    gen_s = time.perf_counter() - t0
+
+    empty_samples = work_dir / f"samples_{n_chunks}"
+    empty_samples.mkdir(parents=True, exist_ok=True)
+    agent = PDFRAGAgent(sample_dir=empty_samples)
+    agent.load_model(HashEmbedder() if args.embedder == "hash" else None)
+    await agent.build_or_load_index()
+
+    result: Dict[str, Any] = {"target_chunks": n_chunks, "corpus_generation_s": round(gen_s, 3)}
+    print(f"[{n_chunks}] ingesting {len(pdfs)} PDFs ...", flush=True)
+    result["ingest"] = await bench_ingest(agent, pdfs)
+    print(f"[{n_chunks}] retrieval x{args.queries} ...", flush=True)
+    result["retrieval"] = await bench_retrieval(agent, queries, args.queries, args.seed)
+
+    # drive /ask through the real FastAPI app with these agents plugged in
+    main.pdf_rag = agent
+    main.controller = ControllerAgent(pdf_agent=agent, tracer=Tracer(work_dir / f"traces_{n_chunks}.json"))
+    # every benchmark request comes from one client; admission control stays as configured
+    rate_limiter, main.rate_limiter = main.rate_limiter, None
+    topics = sorted({q.split("about ", 1)[1].rsplit(" ", 1)[0] for q in queries})
+    result["ask"] = []
+    for c in args.concurrency:
+        print(f"[{n_chunks}] /ask concurrency={c} x{args.requests} ...", flush=True)
+        result["ask"].append(await bench_ask(c, args.requests, topics, args.seed))
+    result["fake_calls"] = dict(fakes.calls)
+    main.controller = None
+    main.pdf_rag = None
+    main.rate_limiter = rate_limiter
+    return result
+
+
+def compare(current: Dict[str, Any], baseline_path: Path) -> None:
+    base = json.loads(baseline_path.read_text(encoding="utf-8"))
+    by_scale = {r["target_chunks"]: r for r in base.get("results", [])}
+    print(f"\nvs {baseline_path.name} ({base['meta'].get('commit')}):")
+    for r in current["results"]:
+        b = by_scale.get(r["target_chunks"])
+        if not b:
+            continue
+
+        def line(label, new, old, lower_is_better=True):
+            delta = (new - old) / old * 100 if old else 0.0
+            worse = delta > 0 if lower_is_better else delta < 0
+            flag = "  <-- regression" if worse and abs(delta) > 10 else ""
+            print(f"  [{r['target_chunks']}] {label:<28} {old:>10.2f} -> {new:>10.2f} ({delta:+.1f}%){flag}")
+
+        line("ingest chunks/s", r["ingest"]["chunks_per_s"], b["ingest"]["chunks_per_s"], lower_is_better=False)
+        line("retrieve p50 ms", r["retrieval"]["retrieve"]["p50_ms"], b["retrieval"]["retrieve"]["p50_ms"])
+        line("retrieve p99 ms", r["retrieval"]["retrieve"]["p99_ms"], b["retrieval"]["retrieve"]["p99_ms"])
+        line("bytes/chunk", r["ingest"]["memory"]["bytes_per_chunk"], b["ingest"]["memory"]["bytes_per_chunk"])
+        old_ask = {a["concurrency"]: a for a in b.get("ask", [])}
+        for a in r["ask"]:
+            if a["concurrency"] in old_ask:
+                line(f"/ask rps @c={a['concurrency']}", a["requests_per_s"], old_ask[a["concurrency"]]["requests_per_s"],
+                     lower_is_better=False)
+
+
+def main_cli(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default="10k", help="comma-separated chunk counts, e.g. 10k,100k,1m")
+    parser.add_argument("--embedder", choices=["model", "hash"], default="model",
+                        help="model: configured EMBED_MODEL; hash: offline hashing embedder")
+    parser.add_argument("--queries", type=int, default=500, help="retrieval samples per scale")
+    parser.add_argument("--concurrency", default="1,8,32")
+    parser.add_argument("--requests", type=int, default=100, help="/ask requests per concurrency level")
+    parser.add_argument("--gemini-ms", type=float, default=300)
+    parser.add_argument("--serpapi-ms", type=float, default=150)
+    parser.add_argument("--duckduckgo-ms", type=float, default=80)
+    parser.add_argument("--arxiv-ms", type=float, default=200)
+    parser.add_argument("--tail-rate", type=float, default=0.0, help="fraction of fake-service calls 10x slower")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of fake-service calls answered 503")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--corpus-dir", type=Path, default=APP_ROOT / "bench_results" / "corpora")
+    parser.add_argument("--out", type=Path, default=None)
+    parser.add_argument("--compare", type=Path, default=None, help="earlier results JSON to diff against")
+    args = parser.parse_args(argv)
+    args.concurrency = [int(c) for c in args.concurrency.split(",") if c]
+
+    latency = Latency(args.gemini_ms, args.serpapi_ms, args.duckduckgo_ms, args.arxiv_ms, tail=args.tail_rate)
+    fakes = FakeServices(latency, seed=args.seed, error_rate=args.error_rate).start()
+    bench_env = {**fakes.env(), "SEMANTIC_CACHE": "0"}  # every request should exercise the full pipeline
+    saved_env = {k: os.environ.get(k) for k in bench_env}
+    os.environ.update(bench_env)
+
+    commit = git_commit()
+    report: Dict[str, Any] = {
+        "meta": {
+            "commit": commit,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "embedder": args.embedder if args.embedder == "hash" else os.environ.get("EMBED_MODEL", "default"),
+            "fake_latency_ms": latency.__dict__,
+            "args": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()},
+        },
+        "results": [],
+    }
+    work_dir = Path(tempfile.mkdtemp(prefix="bench-"))
+    try:
+        for scale in args.scales.split(","):
+            report["results"].append(asyncio.run(run_scale(parse_scale(scale), args, fakes, work_dir)))
+    finally:
+        fakes.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+        for k, v in saved_env.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+
+    out = args.out or APP_ROOT / "bench_results" / f"bench-{commit}-{time.strftime('%Y%m%d%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"Results written to {out}")
+    if args.compare:
+        compare(report, args.compare)
+    return report
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,35 @@
+"""Pre-export the embedding model to ONNX (optionally int8-quantized) for faster CPU startup.
+
+Usage:
+    python scripts/export_onnx.py models/minilm-onnx --quantize avx512_vnni
+
+Then run the app with:
+    EMBED_MODEL=models/minilm-onnx EMBED_BACKEND=onnx
+    EMBED_MODEL_FILE=onnx/model_qint8_avx512_vnni.onnx   # only when quantized
+"""
+import argparse
+from pathlib import Path
+
+from sentence_transformers import SentenceTransformer
+from sentence_transformers.backend import export_dynamic_quantized_onnx_model
+
+DEFAULT_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def export(out_dir: Path, model_name: str = DEFAULT_MODEL, quantize: str = "") -> None:
+    # needs `pip install optimum[onnxruntime]`
+    model = SentenceTransformer(model_name, backend="onnx")
+    model.save(str(out_dir))
+    print(f"Exported: {out_dir}")
+    if quantize:
+        export_dynamic_quantized_onnx_model(model, quantize, str(out_dir))
+        print(f"Quantized ({quantize}): {out_dir / 'onnx' / f'model_qint8_{quantize}.onnx'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("out_dir", type=Path)
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--quantize", default="", help="arm64, avx2, avx512 or avx512_vnni")
+    args = parser.parse_args()
+    export(args.out_dir, args.model, args.quantize)
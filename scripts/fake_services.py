@@ -0,0 +1,211 @@
+"""Local stand-ins for Gemini, SerpAPI, DuckDuckGo and arXiv with configurable latency.
+
+Used by scripts/benchmark.py so runs are reproducible and offline. Can also be started on
+its own and the app pointed at it:
+
+    python scripts/fake_services.py --port 8999 --gemini-ms 300
+    GOOGLE_API_KEY=fake GEMINI_API_ENDPOINT=http://127.0.0.1:8999 \\
+    SERPAPI_API_KEY=fake SERPAPI_URL=http://127.0.0.1:8999/serpapi/search.json \\
+    DUCKDUCKGO_URL=http://127.0.0.1:8999/duckduckgo/ \\
+    ARXIV_API_URL=http://127.0.0.1:8999/arxiv/query ARXIV_DELAY_SECONDS=0 \\
+    uvicorn backend.main:app
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+
+@dataclass
+class Latency:
+    """Per-service latency in milliseconds: mean plus uniform jitter."""
+    gemini: float = 300.0
+    serpapi: float = 150.0
+    duckduckgo: float = 80.0
+    arxiv: float = 200.0
+    jitter: float = 0.2  # +/- fraction of the mean
+    tail: float = 0.0  # fraction of calls that take `tail_factor` times as long
+    tail_factor: float = 10.0
+
+    def sleep(self, service: str, rng: random.Random) -> None:
+        mean = getattr(self, service)
+        if mean > 0:
+            factor = self.tail_factor if rng.random() < self.tail else 1.0
+            time.sleep(factor * mean * (1 + rng.uniform(-self.jitter, self.jitter)) / 1000.0)
+
+
+@dataclass
+class FakeServices:
+    latency: Latency = field(default_factory=Latency)
+    host: str = "127.0.0.1"
+    port: int = 0
+    seed: int = 0
+    error_rate: float = 0.0  # fraction of calls answered 503 with Retry-After: 0
+    calls: Dict[str, int] = field(default_factory=dict)
+
+    def start(self) -> "FakeServices":
+        handler = _make_handler(self)
+        self._server = ThreadingHTTPServer((self.host, self.port), handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_port
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def env(self) -> Dict[str, str]:
+        """Environment that points every outbound agent at this server."""
+        return {
+            "GOOGLE_API_KEY": "fake-key",
+            "GEMINI_API_ENDPOINT": self.base_url,
+            "SERPAPI_API_KEY": "fake-key",
+            "SERPAPI_URL": f"{self.base_url}/serpapi/search.json",
+            "DUCKDUCKGO_URL": f"{self.base_url}/duckduckgo/",
+            "ARXIV_API_URL": f"{self.base_url}/arxiv/query",
+            "ARXIV_DELAY_SECONDS": "0",
+        }
+
+    def _count(self, service: str) -> None:
+        self.calls[service] = self.calls.get(service, 0) + 1
+
+
+def _gemini_body(prompt: str) -> dict:
+    words = prompt.split()
+    text = "Fake synthesized answer. " + " ".join(words[-40:])
+    return {
+        "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP", "index": 0}],
+        "usageMetadata": {"promptTokenCount": len(words), "candidatesTokenCount": 40},
+    }
+
+
+def _arxiv_feed(query: str, n: int) -> str:
+    entries = []
+    for i in range(n):
+        entries.append(f"""
+  <entry>
+    <id>http://arxiv.org/abs/2401.{i:05d}v1</id>
+    <updated>2024-01-0{i % 9 + 1}T00:00:00Z</updated>
+    <published>2024-01-0{i % 9 + 1}T00:00:00Z</published>
+    <title>Fake paper {i} on {escape(query)}</title>
+    <summary>We study {escape(query)} and report synthetic findings number {i}.</summary>
+    <author><name>A. Author</name></author>
+    <link href="http://arxiv.org/abs/2401.{i:05d}v1" rel="alternate" type="text/html"/>
+    <arxiv:primary_category xmlns:arxiv="http://arxiv.org/schemas/atom" term="cs.AI"/>
+    <category term="cs.AI"/>
+  </entry>""")
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom" xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">
+  <title>fake arXiv query</title>
+  <opensearch:totalResults>{n}</opensearch:totalResults>
+  <opensearch:startIndex>0</opensearch:startIndex>
+  <opensearch:itemsPerPage>{n}</opensearch:itemsPerPage>{"".join(entries)}
+</feed>"""
+
+
+def _make_handler(services: FakeServices):
+    rng = random.Random(services.seed)
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, body: bytes, content_type: str = "application/json") -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _delay(self, service: str) -> bool:
+            """Count and wait out the call; False when it was answered with an injected error."""
+            with lock:
+                services._count(service)
+                fail = rng.random() < services.error_rate
+            if fail:
+                with lock:
+                    services._count(f"{service}_errors")
+                body = b'{"error": {"code": 503, "message": "injected", "status": "UNAVAILABLE"}}'
+                self.send_response(503)
+                self.send_header("Retry-After", "0")
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return False
+            services.latency.sleep(service, rng)
+            return True
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            if ":generateContent" not in self.path:
+                self.send_error(404)
+                return
+            if not self._delay("gemini"):
+                return
+            prompt = " ".join(p.get("text", "") for c in payload.get("contents", []) for p in c.get("parts", []))
+            self._send(json.dumps(_gemini_body(prompt)).encode("utf-8"))
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            qs = {k: v[0] for k, v in parse_qs(url.query).items()}
+            if url.path.startswith("/serpapi"):
+                if not self._delay("serpapi"):
+                    return
+                q = qs.get("q", "")
+                results = [{"title": f"{q} result {i}", "link": f"https://example.com/{i}",
+                            "snippet": f"Synthetic web snippet {i} about {q}."} for i in range(5)]
+                self._send(json.dumps({"organic_results": results}).encode("utf-8"))
+            elif url.path.startswith("/duckduckgo"):
+                if not self._delay("duckduckgo"):
+                    return
+                q = qs.get("q", "")
+                body = {"AbstractText": f"Abstract about {q}", "AbstractURL": "https://example.com",
+                        "RelatedTopics": [{"Text": f"{q} topic {i}", "FirstURL": f"https://example.com/t{i}"} for i in range(4)]}
+                self._send(json.dumps(body).encode("utf-8"))
+            elif url.path.startswith("/arxiv"):
+                if not self._delay("arxiv"):
+                    return
+                n = min(int(qs.get("max_results", 3)), 10)
+                self._send(_arxiv_feed(qs.get("search_query", ""), n).encode("utf-8"), "application/atom+xml")
+            else:
+                self.send_error(404)
+
+        def log_message(self, *args):  # keep benchmark output clean
+            pass
+
+    return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8999)
+    parser.add_argument("--gemini-ms", type=float, default=300)
+    parser.add_argument("--serpapi-ms", type=float, default=150)
+    parser.add_argument("--duckduckgo-ms", type=float, default=80)
+    parser.add_argument("--arxiv-ms", type=float, default=200)
+    parser.add_argument("--tail-rate", type=float, default=0.0, help="fraction of calls 10x slower")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered 503")
+    args = parser.parse_args()
+    latency = Latency(args.gemini_ms, args.serpapi_ms, args.duckduckgo_ms, args.arxiv_ms, tail=args.tail_rate)
+    fake = FakeServices(latency, port=args.port, error_rate=args.error_rate).start()
+    print(f"Fake services on {fake.base_url}")
+    for k, v in fake.env().items():
+        print(f"{k}={v}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        fake.stop()
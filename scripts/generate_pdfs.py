@@ -1,4 +1,7 @@
+import json
+import random
 from pathlib import Path
+from typing import List, Tuple
 import fitz
 
 TOPICS = [
@@ -84,5 +87,67 @@ def generate(out_dir: Path) -> None:
         doc.close()
         print(f"Generated: {path}")
 
+# --- synthetic corpora for scripts/benchmark.py ---------------------------
+
+CORPUS_TOPICS = [
+    "retrieval augmentation", "vector indexes", "query routing", "explosives safety", "supply chains",
+    "predictive maintenance", "quality control", "propellant chemistry", "mining operations", "detonator assembly",
+    "transformer models", "agent controllers", "regulatory compliance", "sensor telemetry", "demand forecasting",
+    "route optimization", "materials science", "process automation", "anomaly detection", "document management",
+]
+_FILLER = (
+    "system data model process result method analysis design control performance quality team site plant "
+    "report review metric batch sample signal error latency throughput budget policy schedule inventory"
+).split()
+CHARS_PER_PAGE = 2400
+LINE_CHARS = 95
+
+
+def _sentence(rng: random.Random, topic: str) -> str:
+    words = [rng.choice(_FILLER) for _ in range(rng.randint(8, 14))]
+    words.insert(rng.randint(0, len(words)), topic)
+    return " ".join(words).capitalize() + "."
+
+
+def _page_lines(rng: random.Random, topic: str) -> List[str]:
+    text = ""
+    while len(text) < CHARS_PER_PAGE:
+        text += _sentence(rng, topic) + " "
+    return [text[i:i + LINE_CHARS] for i in range(0, len(text), LINE_CHARS)]
+
+
+def generate_corpus(out_dir: Path, n_chunks: int, pages_per_pdf: int = 50, seed: int = 0,
+                    chars_per_chunk: int = 1050) -> Tuple[List[Path], List[str]]:
+    """Write synthetic multi-page PDFs holding roughly `n_chunks` chunks of text.
+
+    `chars_per_chunk` is the chunker's stride (chunk size minus overlap, in characters of this
+    text with the default 240/24-token chunker). Returns the PDF
+    paths and a list of benchmark queries that hit the generated topics. Reuses an existing
+    corpus with the same parameters.
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    n_pages = max(1, -(-n_chunks * chars_per_chunk // CHARS_PER_PAGE))
+    params = {"n_chunks": n_chunks, "pages_per_pdf": pages_per_pdf, "seed": seed, "chars_per_chunk": chars_per_chunk}
+    manifest = out_dir / "manifest.json"
+    if manifest.exists():
+        saved = json.loads(manifest.read_text(encoding="utf-8"))
+        if saved.get("params") == params:
+            return [out_dir / f for f in saved["files"]], saved["queries"]
+    rng = random.Random(seed)
+    files: List[str] = []
+    for start in range(0, n_pages, pages_per_pdf):
+        name = f"corpus_{start // pages_per_pdf:06d}.pdf"
+        doc = fitz.open()
+        for _ in range(min(pages_per_pdf, n_pages - start)):
+            page = doc.new_page()
+            page.insert_text((36, 36), "\n".join(_page_lines(rng, rng.choice(CORPUS_TOPICS))), fontsize=7)
+        doc.save(str(out_dir / name))
+        doc.close()
+        files.append(name)
+    queries = [f"What does the report say about {t} {rng.choice(_FILLER)}?" for t in CORPUS_TOPICS for _ in range(5)]
+    manifest.write_text(json.dumps({"params": params, "files": files, "queries": queries}), encoding="utf-8")
+    return [out_dir / f for f in files], queries
+
+
 if __name__ == "__main__":
     generate(Path("sample_pdfs"))
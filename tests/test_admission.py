@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import backend.main as main
+from backend.utils.admission import AdmissionController, Overloaded, RateLimited, RateLimiter, request_priority
+
+
+def test_token_bucket_per_client():
+    limiter = RateLimiter(rate=1.0, burst=3)
+    for _ in range(3):
+        limiter.check("10.0.0.1")
+    with pytest.raises(RateLimited) as exc:
+        limiter.check("10.0.0.1")
+    assert 0 < exc.value.retry_after <= 1.0
+    limiter.check("10.0.0.2")  # other clients keep their own bucket
+
+
+def test_rate_limit_is_off_unless_configured(monkeypatch):
+    monkeypatch.delenv("RATE_LIMIT_RPS", raising=False)
+    assert RateLimiter.from_env() is None
+    monkeypatch.setenv("RATE_LIMIT_RPS", "2")
+    limiter = RateLimiter.from_env()
+    assert limiter.rate == 2.0 and limiter.burst == 10.0
+
+
+def test_priority_order_queue_bounds_and_shedding():
+    async def run():
+        adm = AdmissionController(max_concurrent=1, max_queue=2, queue_timeout=5)
+        order = []
+        release = asyncio.Event()
+
+        async def request(name, priority):
+            try:
+                async with adm.slot(priority) as ticket:
+                    order.append((name, ticket.degraded))
+                    await release.wait()
+            except Overloaded as e:
+                order.append((name, e.reason))
+
+        first = asyncio.create_task(request("first", "normal"))
+        await asyncio.sleep(0)
+        low = asyncio.create_task(request("low", "low"))
+        normal = asyncio.create_task(request("normal", "normal"))
+        await asyncio.sleep(0)
+        # queue is full: a low arrival is turned away, a higher one sheds the low waiter
+        await request("rejected", "low")
+        high = asyncio.create_task(request("high", "high"))
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(first, low, normal, high)
+        return order, adm
+
+    order, adm = asyncio.run(run())
+    assert order[0] == ("first", False)
+    assert ("rejected", "queue_full") in order and ("low", "shed") in order
+    admitted = [name for name, flag in order if flag is True]
+    assert admitted == ["high", "normal"]  # queued requests run degraded, best priority first
+    assert adm.inflight == 0 and adm.queued == 0
+
+
+def test_queue_timeout_frees_nothing_it_does_not_own():
+    async def run():
+        adm = AdmissionController(max_concurrent=1, max_queue=4, queue_timeout=0.05)
+        async with adm.slot():
+            with pytest.raises(Overloaded) as exc:
+                async with adm.slot():
+                    pass
+            assert exc.value.reason == "queue_timeout"
+        return adm
+
+    adm = asyncio.run(run())
+    assert adm.inflight == 0 and adm.queued == 0
+
+
+def test_priority_header_can_only_be_raised_by_listed_clients():
+    assert request_priority("high", "1.2.3.4", ()) == "normal"
+    assert request_priority("high", "1.2.3.4", ("1.2.3.4",)) == "high"
+    assert request_priority("low", "1.2.3.4", ("1.2.3.4",)) == "low"
+    assert request_priority(None, "5.6.7.8", (), default="low") == "low"
+
+
+class _Controller:
+    async def handle_query(self, query, client_ip="unknown", collections=None, degraded=False):
+        return "answer", ["PDF RAG"], "why", "trace-1"
+
+    async def handle_batch(self, queries, client_ip="unknown", collections=None, concurrency=None, degraded=False):
+        self.batch_concurrency = concurrency
+        self.batch_degraded = degraded
+        for i, _ in enumerate(queries):
+            yield {"index": i, "answer": "answer"}
+
+
+def test_ask_returns_429_with_retry_after(monkeypatch):
+    monkeypatch.setattr(main, "controller", _Controller())
+    monkeypatch.setattr(main, "rate_limiter", RateLimiter(rate=0.5, burst=2))
+    monkeypatch.setattr(main, "admission", AdmissionController(max_concurrent=4))
+    client = TestClient(main.app)
+    codes = [client.post("/ask", json={"query": "hi"}).status_code for _ in range(3)]
+    assert codes == [200, 200, 429]
+    r = client.post("/ask", json={"query": "hi"})
+    assert r.status_code == 429 and int(r.headers["retry-after"]) >= 1
+
+
+def test_batch_spends_a_token_per_query_and_fits_free_slots(monkeypatch):
+    controller = _Controller()
+    monkeypatch.setattr(main, "controller", controller)
+    monkeypatch.setattr(main, "rate_limiter", RateLimiter(rate=0.5, burst=10))
+    monkeypatch.setattr(main, "admission", AdmissionController(max_concurrent=4, degrade_at=1.0))
+    client = TestClient(main.app)
+    r = client.post("/ask_batch", json={"queries": ["q"] * 50, "concurrency": 64})
+    assert r.status_code == 200 and len(r.text.splitlines()) == 50
+    assert controller.batch_concurrency == 4  # its own slot plus the three free ones
+    # the batch used up the client's whole burst
+    assert client.post("/ask", json={"query": "hi"}).status_code == 429
+    assert client.post("/ask_batch", json={"queries": ["q"]}).status_code == 429
+    assert controller.batch_degraded is False
+
+
+def test_degraded_batch_is_passed_on(monkeypatch):
+    controller = _Controller()
+    monkeypatch.setattr(main, "controller", controller)
+    monkeypatch.setattr(main, "rate_limiter", None)
+    monkeypatch.setattr(main, "admission", AdmissionController(max_concurrent=4, degrade_at=0.0))
+    r = TestClient(main.app).post("/ask_batch", json={"queries": ["q", "r"], "concurrency": 4})
+    assert r.status_code == 200
+    assert controller.batch_degraded is True and controller.batch_concurrency == 1
@@ -4,6 +4,7 @@ from pathlib import Path
 import fitz
 from fastapi.testclient import TestClient
 
+import backend.main as main
 from backend.main import app, SAMPLE_PDFS_DIR
 
 client = TestClient(app)
@@ -14,6 +15,24 @@ def test_root_serves_frontend():
     assert r.status_code == 200
 
 
+def test_healthz_is_live_before_models_load(monkeypatch):
+    monkeypatch.setattr(main, "controller", None)
+    monkeypatch.setitem(main.warmup_state, "status", "loading_model")
+    r = client.get("/healthz")
+    assert r.status_code == 200
+    r = client.get("/readyz")
+    assert r.status_code == 503
+    assert r.json()["status"] == "loading_model"
+
+
+def test_readyz_once_the_controller_is_up(monkeypatch):
+    monkeypatch.setattr(main, "controller", object())
+    monkeypatch.setitem(main.warmup_state, "status", "ready")
+    r = client.get("/readyz")
+    assert r.status_code == 200
+    assert r.json()["status"] == "ready"
+
+
 def test_ask_basic_query():
     r = client.post("/ask", json={"query": "What are the recent developments in Groq?"})
     assert r.status_code == 200
@@ -40,6 +59,14 @@ def test_upload_pdf_and_ask_summary():
     assert r2.status_code == 200
 
 
+def test_invalid_collection_names_are_rejected_before_the_filesystem(monkeypatch):
+    monkeypatch.setattr(main, "controller", object())
+    for body in ({"query": "hi", "collection": "a" * 300}, {"query": "hi", "collections": ["../backend"]}):
+        r = client.post("/ask", json=body)
+        assert r.status_code == 400, body
+    assert client.post("/ask_batch", json={"queries": ["hi"], "collection": "../etc"}).status_code == 400
+
+
 def test_logs_endpoint():
     r = client.get("/logs")
     assert r.status_code == 200
@@ -0,0 +1,105 @@
+import asyncio
+
+import numpy as np
+
+from backend.agents.controller import ControllerAgent
+from backend.agents.rag_pdf import PDFRAGAgent
+from backend.utils.logging import current_span, Tracer
+from backend.vectorstore.collections import CollectionManager, DEFAULT_COLLECTION
+from backend.vectorstore.faiss_store import Document, FAISSStore
+
+
+class _Encoder:
+    dim = 16
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, texts, **kwargs):
+        self.calls = getattr(self, "calls", 0) + 1
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, t in enumerate(texts):
+            for w in t.lower().split():
+                out[i, hash(w) % self.dim] += 1.0
+        return out
+
+
+def test_search_batch_matches_single_queries():
+    rng = np.random.default_rng(0)
+    vecs = rng.normal(size=(50, 8)).astype(np.float32)
+    for index_type in ("flat", "hnsw"):
+        store = FAISSStore(dim=8, index_type=index_type)
+        store.add(vecs, [Document(text=str(i), metadata={}) for i in range(50)])
+        queries = rng.normal(size=(5, 8)).astype(np.float32)
+        batched = store.search_batch(queries, k=3)
+        assert [[d.text for _, d in hits] for hits in batched] == \
+            [[d.text for _, d in store.search(q, k=3)] for q in queries]
+
+    mgr = CollectionManager(dim=8)
+    for name, part in (("a", vecs[:25]), ("b", vecs[25:])):
+        mgr.create(name).add(part, [Document(text=f"{name}{i}", metadata={}) for i in range(len(part))])
+    merged = asyncio.run(mgr.search_batch(queries, ["a", "b"], k=4))
+    single = [asyncio.run(mgr.search(q, ["a", "b"], k=4)) for q in queries]
+    assert [[d.text for _, d in h] for h in merged] == [[d.text for _, d in h] for h in single]
+
+
+def test_handle_batch_streams_every_query(tmp_path, monkeypatch):
+    monkeypatch.delenv("GOOGLE_API_KEY", raising=False)
+    agent = PDFRAGAgent(sample_dir=tmp_path / "samples")
+    encoder = _Encoder()
+    agent.load_model(encoder)
+    agent.collections.create(DEFAULT_COLLECTION).add(agent.embed_queries(["solar company overview", "rag benefits grounding"]),
+                    [Document(text="Solar overview", metadata={"source": "s.pdf", "chunk": 0}),
+                     Document(text="RAG grounds answers", metadata={"source": "r.pdf", "chunk": 0})])
+    tracer = Tracer(tmp_path / "traces.json")
+    writes = []
+    monkeypatch.setattr(tracer, "add_many", lambda entries: writes.append(len(entries)))
+    controller = ControllerAgent(agent, tracer)
+    web_calls = []
+
+    async def fake_web(q):
+        web_calls.append(q)
+        return [{"title": "t", "snippet": "s", "link": "l"}]
+    monkeypatch.setattr(controller.web_agent, "search", fake_web)
+
+    queries = ["Summarize the company overview", "latest news on RAG", "latest news on RAG",
+               "Summarize the document on RAG"]
+    encoder.calls = 0
+
+    async def collect():
+        return [r async for r in controller.handle_batch(queries, concurrency=2)]
+
+    results = asyncio.run(collect())
+    assert sorted(r["index"] for r in results) == [0, 1, 2, 3]
+    by_index = {r["index"]: r for r in results}
+    assert by_index[1]["trace_id"] == by_index[2]["trace_id"]
+    assert by_index[0]["agents_used"] == ["PDF RAG"] and by_index[1]["agents_used"] == ["Web Search"]
+    assert all("error" not in r for r in results)
+    assert encoder.calls == 1  # all queries embedded together
+    assert web_calls == ["latest news on RAG"]  # duplicate fetched once
+    assert writes == [3]  # one trace write for the batch
+
+
+def test_abandoned_batch_stream_closes_cleanly_from_another_task(tmp_path, monkeypatch):
+    monkeypatch.delenv("GOOGLE_API_KEY", raising=False)
+    agent = PDFRAGAgent(sample_dir=tmp_path / "samples")
+    agent.load_model(_Encoder())
+    agent.collections.create(DEFAULT_COLLECTION).add(agent.embed_queries(["solar overview"]),
+                    [Document(text="Solar overview", metadata={"source": "s.pdf", "chunk": 0})])
+    controller = ControllerAgent(agent, Tracer(tmp_path / "traces.json"))
+    monkeypatch.setattr(controller.tracer, "add_many", lambda entries: None)
+    done = []
+    monkeypatch.setattr("backend.agents.controller.LOGGER.info",
+                        lambda event, **kw: done.append(event) if event == "controller.batch_done" else None)
+
+    async def run():
+        gen = controller.handle_batch(["Summarize the company overview", "Summarize the overview"])
+        first = await gen.__anext__()
+        assert current_span() is None  # the consumer does not run inside the batch's spans
+        # e.g. the response stream being finalized by the server after a disconnect
+        await asyncio.create_task(gen.aclose())
+        await asyncio.sleep(0)
+        return first
+
+    assert "index" in asyncio.run(run())
+    assert done == ["controller.batch_done"]
@@ -0,0 +1,23 @@
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+
+from benchmark import main_cli  # noqa: E402
+
+
+def test_benchmark_harness_writes_results(tmp_path):
+    out = tmp_path / "bench.json"
+    main_cli([
+        "--scales", "200", "--embedder", "hash", "--queries", "20", "--concurrency", "1,4",
+        "--requests", "8", "--gemini-ms", "0", "--serpapi-ms", "0", "--duckduckgo-ms", "0", "--arxiv-ms", "0",
+        "--corpus-dir", str(tmp_path / "corpora"), "--out", str(out),
+    ])
+    report = json.loads(out.read_text(encoding="utf-8"))
+    result = report["results"][0]
+    assert result["ingest"]["chunks"] > 0
+    assert result["retrieval"]["retrieve"]["n"] == 20
+    assert [a["concurrency"] for a in result["ask"]] == [1, 4]
+    assert all(a["errors"] == 0 for a in result["ask"])
+    assert result["fake_calls"].get("gemini", 0) > 0
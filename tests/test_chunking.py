@@ -0,0 +1,65 @@
+import fitz
+
+from backend.agents.chunking import Block, Chunker, extract_blocks
+
+
+def _sentence(i: int) -> str:
+    return f"Sentence number {i} talks about retrieval augmented generation and vector search."
+
+
+def _write_pdf(path):
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((50, 60), "Solar Overview", fontsize=20)
+    y = 100
+    for para in range(3):
+        for line in range(4):
+            page.insert_text((50, y), _sentence(para * 4 + line), fontsize=10)
+            y += 14
+        y += 20
+    page2 = doc.new_page()
+    page2.insert_text((50, 60), "Products", fontsize=20)
+    page2.insert_text((50, 100), _sentence(99), fontsize=10)
+    doc.save(str(path))
+    doc.close()
+
+
+def test_pdf_chunks_carry_pages_and_offsets(tmp_path):
+    pdf = tmp_path / "doc.pdf"
+    _write_pdf(pdf)
+    with fitz.open(str(pdf)) as doc:
+        blocks, page_texts = extract_blocks(doc)
+    assert [b.text for b in blocks if b.heading] == ["Solar Overview", "Products"]
+
+    chunks = Chunker(max_tokens=60, overlap=20).chunk_blocks(blocks)
+    assert len(chunks) > 2
+    assert all(c.tokens <= 60 for c in chunks)
+    assert chunks[0].text.startswith("Solar Overview\n")
+    for c in chunks:
+        page_text = page_texts[c.page_start - 1]
+        first = c.text.split("\n")[0]
+        assert page_text[c.char_start:].startswith(first)
+        assert page_texts[c.page_end - 1][:c.char_end].endswith(c.text[-20:])
+    # the heading on page 2 starts a new chunk instead of trailing the previous one
+    last = chunks[-1]
+    assert (last.page_start, last.page_end) == (2, 2)
+    assert last.text.startswith("Products\n")
+
+
+def test_overlap_carries_whole_sentences():
+    text = " ".join(_sentence(i) for i in range(10))
+    chunks = Chunker(max_tokens=50, overlap=20).chunk_blocks([Block(text=text, page=1, start=0)])
+    for prev, nxt in zip(chunks, chunks[1:]):
+        last_sentence = prev.text.split(". ")[-1]
+        assert nxt.text.startswith(last_sentence)
+    no_overlap = Chunker(max_tokens=50, overlap=0).chunk_blocks([Block(text=text, page=1, start=0)])
+    assert len(no_overlap) < len(chunks)
+
+
+def test_overlong_sentence_is_split_by_words():
+    text = " ".join(f"word{i}" for i in range(300))
+    chunks = Chunker(max_tokens=40, overlap=0).chunk_blocks([Block(text=text, page=3, start=10)])
+    assert len(chunks) > 1
+    assert all(c.tokens <= 40 for c in chunks)
+    assert " ".join(c.text for c in chunks) == text
+    assert chunks[0].char_start == 10 and chunks[-1].char_end == 10 + len(text)
@@ -0,0 +1,68 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from backend.vectorstore.collections import CollectionManager, DEFAULT_COLLECTION
+from backend.vectorstore.faiss_store import Document
+from backend.vectorstore.snapshot import SnapshotDir
+
+
+def _add(coll, vecs, prefix):
+    coll.add(np.asarray(vecs, dtype=np.float32),
+             [Document(text=f"{prefix}-{i}", metadata={"source": f"{prefix}.pdf", "chunk": i}) for i in range(len(vecs))])
+
+
+def test_scatter_gather_merges_top_k_across_shards():
+    mgr = CollectionManager(dim=3)
+    _add(mgr.create("team-a"), [[1, 0, 0], [0, 1, 0]], "a")
+    _add(mgr.create("team-b", index_type="hnsw"), [[0.9, 0.1, 0], [0, 0, 1]], "b")
+    q = np.array([1, 0, 0], dtype=np.float32)
+
+    hits = asyncio.run(mgr.search(q, ["team-a", "team-b"], k=2))
+    assert [d.text for _, d in hits] == ["a-0", "b-0"]
+    assert {d.metadata["collection"] for _, d in hits} == {"team-a", "team-b"}
+
+    only_b = asyncio.run(mgr.search(q, ["team-b"], k=5))
+    assert all(d.metadata["collection"] == "team-b" for _, d in only_b)
+
+
+def test_invalid_names_and_index_types_rejected():
+    mgr = CollectionManager(dim=3)
+    with pytest.raises(ValueError):
+        mgr.create("../etc")
+    with pytest.raises(ValueError):
+        mgr.create("team-c", index_type="ivf-pq")
+
+
+@pytest.mark.skipif(not SnapshotDir.supported(), reason="needs fcntl")
+def test_named_collections_persist_and_default_stays_local(tmp_path):
+    writer = CollectionManager(dim=3, root=tmp_path)
+    assert writer.create(DEFAULT_COLLECTION).snapshots is None
+    coll = writer.create("team-a", index_type="hnsw")
+    _add(coll, [[1, 0, 0]], "a")
+    coll.publish()
+
+    other = CollectionManager(dim=3, root=tmp_path)
+    assert other.discover() == ["team-a"]
+    attached = other.get("team-a")
+    assert attached.index_type == "hnsw" and not attached.writable
+    assert len(attached.store) == 1
+
+
+def test_get_ignores_invalid_names(tmp_path):
+    (tmp_path / "outside").mkdir()
+    (tmp_path / "outside" / "collection.json").write_text("{}", encoding="utf-8")
+    mgr = CollectionManager(dim=3, root=tmp_path / "index")
+    assert mgr.get("a" * 300) is None
+    assert mgr.get("../outside") is None
+
+
+@pytest.mark.skipif(not SnapshotDir.supported(), reason="needs fcntl")
+def test_rejected_index_type_leaves_nothing_on_disk(tmp_path):
+    mgr = CollectionManager(dim=3, root=tmp_path)
+    with pytest.raises(ValueError):
+        mgr.create("team-x", index_type="bogus")
+    assert not (tmp_path / "team-x").exists()
+    assert mgr.discover() == []
+    assert mgr.create("team-x", index_type="flat").index_type == "flat"
@@ -0,0 +1,149 @@
+import asyncio
+import os
+
+import fitz
+import numpy as np
+import pytest
+
+from backend.agents.rag_pdf import PDFRAGAgent
+from backend.utils.dirwatch import DirectoryWatcher
+from backend.vectorstore import collections
+from backend.vectorstore.collections import DEFAULT_COLLECTION
+from backend.vectorstore.faiss_store import Document, FAISSStore
+
+
+class _Encoder:
+    dim = 16
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, texts, **kwargs):
+        self.calls = getattr(self, "calls", 0) + 1
+        out = np.ones((len(texts), self.dim), dtype=np.float32)
+        for i, t in enumerate(texts):
+            for w in t.lower().split():
+                out[i, hash(w) % self.dim] += 1.0
+        return out
+
+
+def _pdf(path, text):
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), text)
+    doc.save(str(path))
+    doc.close()
+    # scans skip files modified within the debounce window
+    os.utime(path, ns=(path.stat().st_mtime_ns - 10**10,) * 2)
+
+
+def test_scan_hashes_only_files_whose_stat_changed(tmp_path):
+    _pdf(tmp_path / "a.pdf", "alpha")
+    _pdf(tmp_path / "b.pdf", "bravo")
+    watcher = DirectoryWatcher(tmp_path, debounce=1.0, use_inotify=False)
+    first = watcher.scan({})
+    assert sorted(first.added) == ["a.pdf", "b.pdf"] and not first.removed
+    known = dict(first.added)
+
+    os.utime(tmp_path / "a.pdf", ns=(known["a.pdf"].mtime_ns + 10**9,) * 2)  # touched, same bytes
+    _pdf(tmp_path / "b.pdf", "bravo two")
+    _pdf(tmp_path / "c.pdf", "charlie")
+    (tmp_path / "fresh.pdf").write_bytes(b"%PDF being written")
+    changes = watcher.scan(known)
+    assert list(changes.touched) == ["a.pdf"]
+    assert list(changes.changed) == ["b.pdf"] and list(changes.added) == ["c.pdf"]
+
+    (tmp_path / "a.pdf").unlink()
+    assert watcher.scan(known).removed == ["a.pdf"]
+    watcher.close()
+
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw"])
+def test_sync_updates_only_the_watched_files(tmp_path, monkeypatch, index_type):
+    monkeypatch.setattr(collections, "COMPACT_AT", 1.0)
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    agent = PDFRAGAgent(sample_dir=tmp_path / "samples")
+    encoder = _Encoder()
+    agent.load_model(encoder)
+    coll = agent.collections.create(DEFAULT_COLLECTION, index_type)
+    # an upload with the same file name is not the watcher's to replace
+    coll.add(agent.embed_queries(["uploaded"]), [Document(text="uploaded text", metadata={"source": "a.pdf", "chunk": 0})])
+    _pdf(corpus / "a.pdf", "solar panels overview")
+    _pdf(corpus / "b.pdf", "retrieval augmented generation")
+    watcher = DirectoryWatcher(corpus, debounce=1.0, use_inotify=False)
+
+    def texts():
+        return sorted(d.text for d in coll.store.documents())
+
+    def search(text):
+        return [d.text for _, d in coll.search(agent.embed_query(text), k=10)]
+
+    async def run():
+        known = agent.corpus_states(coll, corpus)
+        assert known == {}
+        encoder.calls = 0
+        await agent.sync_corpus(watcher, known)
+        assert encoder.calls == 1  # one embedding batch for all new files
+        assert any("solar" in t for t in texts()) and any("retrieval" in t for t in texts())
+
+        _pdf(corpus / "a.pdf", "wind turbines overview")
+        (corpus / "b.pdf").unlink()
+        version = agent.corpus_version
+        store = coll.store
+        changes = await agent.sync_corpus(watcher, known)
+        assert coll.store is store  # old chunks tombstoned in place, not a rebuilt index
+        assert list(changes.changed) == ["a.pdf"] and changes.removed == ["b.pdf"]
+        assert agent.corpus_version == version + 1
+        after = texts()
+        assert "uploaded text" in after
+        assert any("wind" in t for t in after)
+        assert not any("solar" in t or "retrieval" in t for t in after)
+        assert sorted(search("solar panels overview")) == after
+        # tombstones survive a snapshot
+        coll.store.save(tmp_path / "snap")
+        mapped = FAISSStore.load(tmp_path / "snap", mmap_read_only=True)
+        assert len(mapped) == len(after)
+        assert sorted(d.text for _, d in mapped.search(agent.embed_query("solar"), k=10)) == after
+        assert not await agent.sync_corpus(watcher, known)
+
+        # a restart re-derives the baseline from the index and finds nothing to re-embed
+        encoder.calls = 0
+        restarted = agent.corpus_states(coll, corpus)
+        assert sorted(restarted) == ["a.pdf"]
+        assert not await agent.sync_corpus(watcher, restarted)
+        assert encoder.calls == 0
+
+        # past INDEX_COMPACT_AT a sync rebuilds the store without its tombstones
+        monkeypatch.setattr(collections, "COMPACT_AT", 0.0)
+        _pdf(corpus / "a.pdf", "tidal power overview")
+        await agent.sync_corpus(watcher, restarted)
+        assert coll.store is not store and coll.store.deleted_fraction == 0.0
+        assert any("tidal" in t for t in texts()) and sorted(search("tidal power overview")) == texts()
+
+    asyncio.run(run())
+
+
+def test_directories_with_the_same_name_keep_their_own_chunks(tmp_path):
+    first, second = tmp_path / "a" / "corpus", tmp_path / "b" / "corpus"
+    agent = PDFRAGAgent(sample_dir=tmp_path / "samples")
+    agent.load_model(_Encoder())
+    coll = agent.collections.create(DEFAULT_COLLECTION)
+    watchers = []
+    for directory, text in ((first, "solar panels overview"), (second, "wind turbines overview")):
+        directory.mkdir(parents=True)
+        _pdf(directory / "a.pdf", text)
+        watchers.append(DirectoryWatcher(directory, debounce=1.0, use_inotify=False))
+
+    async def run():
+        known = [agent.corpus_states(coll, w.directory) for w in watchers]
+        for watcher, states in zip(watchers, known):
+            await agent.sync_corpus(watcher, states)
+        assert {m["corpus"] for m in coll.store.metadatas()} == {str(first.resolve()), str(second.resolve())}
+
+        (first / "a.pdf").unlink()
+        await agent.sync_corpus(watchers[0], known[0])
+        assert [d.text for d in coll.store.documents()] == ["wind turbines overview"]
+        assert agent.corpus_states(coll, first) == {}
+        assert sorted(agent.corpus_states(coll, second)) == ["a.pdf"]
+
+    asyncio.run(run())
@@ -0,0 +1,138 @@
+import json
+import string
+
+import numpy as np
+import pytest
+
+from backend.agents.embedders import load_embedder
+from backend.vectorstore.collections import CollectionManager, DEFAULT_COLLECTION
+from backend.vectorstore.faiss_store import Document
+from backend.vectorstore.fingerprint import fingerprint, mismatch
+from backend.vectorstore.snapshot import SnapshotDir
+
+
+class ProjectionEmbedder:
+    """Character-count features through a fixed random projection; the seed stands in for the model."""
+
+    def __init__(self, seed: int, dim: int = 16, noise: float = 0.0):
+        self.proj = np.random.default_rng(seed).normal(size=(128, dim)).astype(np.float32)
+        self.noise = noise
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.proj.shape[1]
+
+    def encode(self, texts, **kwargs):
+        feats = np.zeros((len(texts), 128), dtype=np.float32)
+        for i, t in enumerate(texts):
+            for ch in t:
+                feats[i, ord(ch) % 128] += 1
+        out = feats @ self.proj
+        return out + self.noise * np.abs(out).mean() * np.random.default_rng(1).normal(size=out.shape)
+
+
+def test_registry_rejects_unknown_backends_and_missing_int8_exports(tmp_path):
+    with pytest.raises(ValueError, match="EMBED_BACKEND"):
+        load_embedder("tensorflow", "some-model")
+    with pytest.raises(FileNotFoundError, match="export_onnx.py"):
+        load_embedder("onnx-int8", str(tmp_path))
+
+
+def test_fingerprint_tolerates_quantization_noise_but_not_another_model():
+    base = fingerprint(ProjectionEmbedder(seed=0), "proj-0")
+    assert base["dim"] == 16 and len(base["probe"]) == 16
+    assert mismatch(base, fingerprint(ProjectionEmbedder(seed=0, noise=0.01), "proj-0-int8")) is None
+    assert "probe cosine" in mismatch(base, fingerprint(ProjectionEmbedder(seed=1), "proj-1"))
+    assert "dimension" in mismatch(base, fingerprint(ProjectionEmbedder(seed=0, dim=8), "proj-0"))
+    # collections from before fingerprints carried a probe are only checked by dimension
+    assert mismatch({"dim": 16}, base) is None
+
+
+@pytest.mark.skipif(not SnapshotDir.supported(), reason="needs fcntl")
+def test_collections_built_by_another_model_are_refused(tmp_path):
+    fp_a = fingerprint(ProjectionEmbedder(seed=0), "proj-0")
+    fp_b = fingerprint(ProjectionEmbedder(seed=1), "proj-1")
+    writer = CollectionManager(dim=16, root=tmp_path, fingerprint=fp_a)
+    coll = writer.create("team-a")
+    coll.add(np.ones((1, 16), dtype=np.float32), [Document(text="a", metadata={})])
+    coll.publish()
+
+    other = CollectionManager(dim=16, root=tmp_path, fingerprint=fp_b)
+    assert other.discover() == []
+    assert other.get("team-a") is None
+    with pytest.raises(ValueError, match="another embedding model"):
+        other.create("team-a")
+
+    same = CollectionManager(dim=16, root=tmp_path, fingerprint=fp_a)
+    assert same.discover() == ["team-a"]
+
+
+@pytest.mark.skipif(not SnapshotDir.supported(), reason="needs fcntl")
+def test_only_the_writer_records_the_fingerprint(tmp_path):
+    fp = fingerprint(ProjectionEmbedder(seed=0), "proj-0")
+    legacy = json.dumps({"index_type": "hnsw"})
+    (tmp_path / "team-a").mkdir()
+    (tmp_path / "team-a" / "collection.json").write_text(legacy, encoding="utf-8")
+    writer = CollectionManager(dim=16, root=tmp_path)  # from before fingerprints, holds the lock
+    assert writer.create("team-a").writable
+
+    reader = CollectionManager(dim=16, root=tmp_path, fingerprint=fp)
+    assert not reader.get("team-a").writable
+    assert (tmp_path / "team-a" / "collection.json").read_text(encoding="utf-8") == legacy
+
+    upgraded = CollectionManager(dim=16, root=tmp_path, fingerprint=fp)
+    assert upgraded.create("team-b").writable
+    cfg = json.loads((tmp_path / "team-b" / "collection.json").read_text(encoding="utf-8"))
+    assert cfg["embedder"] == fp and cfg["index_type"] == "flat"
+    assert [p.name for p in (tmp_path / "team-b").glob(".collection.json*")] == []
+
+
+@pytest.mark.skipif(not SnapshotDir.supported(), reason="needs fcntl")
+def test_shared_default_collection_from_another_model_is_set_aside(tmp_path):
+    fp_a = fingerprint(ProjectionEmbedder(seed=0), "proj-0")
+    fp_b = fingerprint(ProjectionEmbedder(seed=1), "proj-1")
+    old = CollectionManager(dim=16, root=tmp_path, share_default=True, fingerprint=fp_a)
+    default = old.create(DEFAULT_COLLECTION)
+    default.add(np.ones((1, 16), dtype=np.float32), [Document(text="old sample", metadata={})])
+    default.publish()
+
+    new = CollectionManager(dim=16, root=tmp_path, share_default=True, fingerprint=fp_b)
+    fresh = new.create(DEFAULT_COLLECTION)
+    # starts over empty, so build_or_load_index rebuilds it from sample_pdfs
+    assert fresh.writable and fresh.generation == 0 and len(fresh.store) == 0
+    assert [p.name.split("-")[0] for p in (tmp_path / ".stale").iterdir() if p.is_dir()] == ["default"]
+    assert new.discover() == []
+    # a second worker of the new model attaches to the fresh collection instead of moving it again
+    again = CollectionManager(dim=16, root=tmp_path, share_default=True, fingerprint=fp_b)
+    assert again.create(DEFAULT_COLLECTION).snapshots.root == tmp_path / DEFAULT_COLLECTION
+    assert len([p for p in (tmp_path / ".stale").iterdir() if p.is_dir()]) == 1
+
+
+def _tiny_sentence_transformer(path):
+    from sentence_transformers import SentenceTransformer, models
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+
+    raw = path / "raw"
+    raw.mkdir()
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + list(string.ascii_lowercase) \
+        + ["##" + c for c in string.ascii_lowercase] + list(".,?!-")
+    (raw / "vocab.txt").write_text("\n".join(vocab) + "\n", encoding="utf-8")
+    BertTokenizerFast(vocab_file=str(raw / "vocab.txt")).save_pretrained(raw)
+    config = BertConfig(vocab_size=len(vocab), hidden_size=64, num_hidden_layers=2, num_attention_heads=4,
+                        intermediate_size=128)
+    BertModel(config).save_pretrained(raw)
+    transformer = models.Transformer(str(raw), max_seq_length=64)
+    st = SentenceTransformer(modules=[transformer, models.Pooling(transformer.get_word_embedding_dimension())])
+    st.save(str(path / "st"))
+    return str(path / "st")
+
+
+def test_torch_int8_backend_stays_close_to_fp32(tmp_path):
+    pytest.importorskip("sentence_transformers")
+    name = _tiny_sentence_transformer(tmp_path)
+    fp32 = load_embedder("torch", name, threads=1)
+    int8 = load_embedder("torch-int8", name, threads=1)
+    texts = ["retrieval grounds answers", "faiss indexes vectors", "quantized models are smaller"]
+    a, b = fp32.encode(texts), int8.encode(texts)
+    cos = np.sum(a * b, axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+    assert cos.min() > 0.95
+    assert mismatch(fingerprint(fp32, name), fingerprint(int8, name)) is None
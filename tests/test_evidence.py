@@ -0,0 +1,31 @@
+from backend.agents.evidence import Evidence, estimate_tokens, pack_evidence
+
+
+def test_overlapping_chunks_are_trimmed():
+    shared = "grounding the model with retrieved passages improves factuality a lot. "
+    a = Evidence(agent="PDF RAG", text="RAG intro. " + shared, rank=0, score=0.9, source="a.pdf", chunk=0)
+    b = Evidence(agent="PDF RAG", text=shared + "It is also cheap to run.", rank=1, score=0.8, source="a.pdf", chunk=1)
+    packed, stats = pack_evidence([a, b], budget=1000)
+    assert len(packed) == 2
+    assert packed[1].text == "It is also cheap to run."
+    assert stats["deduped"] == 0
+
+
+def test_near_duplicates_dropped_and_order_fused():
+    text = "FAISS with MiniLM embeddings is fast and lightweight for small corpora of PDFs"
+    items = [
+        Evidence(agent="PDF RAG", text=text, rank=1, score=0.5, source="a.pdf", chunk=3),
+        Evidence(agent="PDF RAG", text=text + ".", rank=2, score=0.4, source="b.pdf", chunk=0),
+        Evidence(agent="Web Search", text="Groq news: new LPU announced", rank=0),
+    ]
+    packed, stats = pack_evidence(items, budget=1000)
+    assert [e.agent for e in packed] == ["Web Search", "PDF RAG"]
+    assert stats["deduped"] == 1
+
+
+def test_budget_is_respected():
+    items = [Evidence(agent="PDF RAG", text=" ".join(f"w{i}_{j}" for j in range(400)), rank=i, source="a.pdf", chunk=i * 10) for i in range(5)]
+    packed, stats = pack_evidence(items, budget=600)
+    assert stats["tokens"] <= 600
+    assert sum(estimate_tokens(e.text) for e in packed) <= 600
+    assert stats["truncated"] == 1
@@ -0,0 +1,49 @@
+import asyncio
+
+from backend.utils.logging import Metrics, current_span, span
+
+
+def test_spans_nest_across_awaits_and_threads():
+    async def run():
+        with span("ask") as root:
+            with span("embed"):
+                pass
+            async def agent():
+                with span("pdf_rag"):
+                    await asyncio.to_thread(lambda: span("faiss_search").__enter__().__exit__(None, None, None))
+            await asyncio.gather(agent())
+        return root
+
+    root = asyncio.run(run())
+    assert current_span() is None
+    tree = root.to_dict()
+    assert [c["name"] for c in tree["children"]] == ["embed", "pdf_rag"]
+    assert tree["children"][1]["children"][0]["name"] == "faiss_search"
+    assert tree["ms"] >= tree["children"][1]["ms"]
+
+
+def test_span_records_error():
+    try:
+        with span("synthesis") as s:
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+    assert s.to_dict()["error"] == "RuntimeError"
+
+
+def test_prometheus_render():
+    m = Metrics(buckets=(10, 100))
+    m.inc("ask_requests_total", outcome="answered")
+    m.inc("ask_requests_total", outcome="answered")
+    m.observe("stage_latency_ms", 5, stage="embed")
+    m.observe("stage_latency_ms", 50, stage="embed")
+    m.register("index_chunks", "gauge", lambda: {(("collection", "default"),): 42.0}, "Chunks indexed")
+    m.register("broken", "gauge", lambda: 1 / 0)
+    text = m.render()
+    assert 'ask_requests_total{outcome="answered"} 2' in text
+    assert "# TYPE index_chunks gauge" in text
+    assert 'index_chunks{collection="default"} 42' in text
+    assert 'stage_latency_ms_bucket{stage="embed",le="10"} 1' in text
+    assert 'stage_latency_ms_bucket{stage="embed",le="+Inf"} 2' in text
+    assert 'stage_latency_ms_count{stage="embed"} 2' in text
+    assert "broken" not in text
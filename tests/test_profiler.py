@@ -0,0 +1,46 @@
+import asyncio
+import time
+
+from backend.utils.profiler import RequestProfiler
+
+
+def _busy_tokenize(seconds: float) -> int:
+    end = time.perf_counter() + seconds
+    n = 0
+    while time.perf_counter() < end:
+        n += len("some text to split".split())
+    return n
+
+
+def test_slow_request_profile_saved(tmp_path):
+    prof = RequestProfiler(tmp_path, slow_ms=50, interval_ms=2)
+
+    async def request():
+        session = prof.start()
+        _busy_tokenize(0.05)                                  # on the event loop
+        await asyncio.to_thread(_busy_tokenize, 0.05)         # in a worker thread
+        return session
+
+    session = asyncio.run(request())
+    assert prof.finish(session, "20260101000000:123", latency_ms=120)
+    folded = prof.read("20260101000000:123")
+    lines = folded.splitlines()
+    assert lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert any(line.startswith("event-loop;") and "_busy_tokenize" in line for line in lines)
+    assert any(line.startswith("asyncio_") and "_busy_tokenize" in line for line in lines)
+
+
+def test_fast_request_not_kept(tmp_path):
+    prof = RequestProfiler(tmp_path, slow_ms=1000, interval_ms=2)
+    session = prof.start()
+    _busy_tokenize(0.02)
+    assert not prof.finish(session, "fast", latency_ms=20)
+    assert prof.read("fast") is None
+
+
+def test_disabled_by_default(tmp_path, monkeypatch):
+    monkeypatch.delenv("PROFILE_SLOW_MS", raising=False)
+    monkeypatch.delenv("PROFILE_SAMPLE_RATE", raising=False)
+    prof = RequestProfiler.from_env(tmp_path)
+    assert not prof.enabled
+    assert prof.start() is None
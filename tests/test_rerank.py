@@ -0,0 +1,113 @@
+import asyncio
+
+import numpy as np
+
+from backend.agents.controller import ControllerAgent
+from backend.agents.rag_pdf import PDFRAGAgent
+from backend.agents.rerank import CrossEncoderStage, mmr
+from backend.utils.logging import Tracer
+from backend.utils.resilience import deadline
+from backend.vectorstore.collections import DEFAULT_COLLECTION
+from backend.vectorstore.faiss_store import Document, FAISSStore
+
+
+class _Encoder:
+    dim = 16
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, texts, **kwargs):
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, t in enumerate(texts):
+            for w in t.lower().split():
+                out[i, hash(w) % self.dim] += 1.0
+        return out
+
+
+class _CrossEncoder:
+    """Scores a pair by whether the passage contains the query's last word."""
+
+    def __init__(self):
+        self.batches = []
+
+    def predict(self, pairs, **kwargs):
+        self.batches.append(len(pairs))
+        return np.asarray([4.0 if q.split()[-1] in p else -4.0 for q, p in pairs])
+
+
+def test_mmr_skips_near_duplicates():
+    base = np.eye(4, dtype=np.float32)
+    dup = base[0] + 0.01 * base[1]
+    vectors = np.stack([base[0], dup / np.linalg.norm(dup), base[1], base[2]])
+    relevance = np.asarray([0.9, 0.89, 0.6, 0.5], dtype=np.float32)
+    assert mmr(relevance, None, 3) == [0, 1, 2]
+    assert mmr(relevance, vectors, 3, lam=1.0, duplicate=0.95) == [0, 2, 3]
+    # the cut-off alone may leave fewer than k
+    assert mmr(relevance[:2], vectors[:2], 2, lam=1.0, duplicate=0.95) == [0]
+    assert mmr(relevance, vectors, 3, lam=1.0, duplicate=1.0) == [0, 1, 2]
+
+
+def test_search_attaches_stored_vectors():
+    for index_type in ("flat", "hnsw"):
+        store = FAISSStore(dim=4, index_type=index_type)
+        store.add(np.eye(4, dtype=np.float32) * 3, [Document(text=str(i), metadata={}) for i in range(4)])
+        hits = store.search(np.asarray([1, 0, 0, 0], dtype=np.float32), k=2, with_vectors=True)
+        assert np.allclose(hits[0][1].vector, [1, 0, 0, 0])
+        assert store.search(np.ones(4, dtype=np.float32), k=1)[0][1].vector is None
+
+
+def _agent(tmp_path):
+    agent = PDFRAGAgent(sample_dir=tmp_path / "samples")
+    agent.load_model(_Encoder())
+    # the same boilerplate repeated in three chunks
+    texts = ["solar panel output report"] * 3 + [
+        "solar inverter maintenance", "battery storage for solar"]
+    agent.collections.create(DEFAULT_COLLECTION).add(
+        agent.embed_queries(texts),
+        [Document(text=t, metadata={"source": "s.pdf", "chunk": i, "is_sample": True}) for i, t in enumerate(texts)])
+    return agent
+
+
+def test_retrieve_returns_diverse_chunks(tmp_path):
+    agent = _agent(tmp_path)
+    hits = asyncio.run(agent.retrieve("solar panel output report", k=3))
+    texts = [d.text for _, d in hits]
+    assert texts[0] == "solar panel output report"
+    assert texts.count("solar panel output report") == 1 and len(texts) == 3
+
+    agent.mmr_lambda, agent.duplicate_cosine = 1.0, 1.0
+    hits = asyncio.run(agent.retrieve("solar panel output report", k=3))
+    assert [d.text for _, d in hits] == ["solar panel output report"] * 3
+
+
+def test_cross_encoder_scores_one_batch_within_budget(tmp_path):
+    agent = _agent(tmp_path)
+    model = _CrossEncoder()
+    agent.cross_encoder = CrossEncoderStage(model, budget_ms=1000)
+    results = asyncio.run(agent.retrieve_batch(["about solar battery", "about solar inverter"], k=1))
+    assert [r[0][1].text for r in results] == ["battery storage for solar", "solar inverter maintenance"]
+    assert model.batches == [10]  # both queries' candidates in one call
+
+    asyncio.run(agent.retrieve("about solar inverter", degraded=True))
+    agent.cross_encoder.ms_per_pair = 1.0
+    with deadline(0.004):  # 5 pairs at ~1 ms won't fit in half of 4 ms
+        asyncio.run(agent.retrieve("about solar inverter"))
+    assert model.batches == [10]
+    assert agent.cross_encoder.ms_per_pair < 1.0  # skipped calls decay the estimate
+
+
+def test_degraded_batch_skips_cross_encoder(tmp_path, monkeypatch):
+    monkeypatch.delenv("GOOGLE_API_KEY", raising=False)
+    agent = _agent(tmp_path)
+    model = _CrossEncoder()
+    agent.cross_encoder = CrossEncoderStage(model, budget_ms=1000)
+    controller = ControllerAgent(agent, Tracer(tmp_path / "traces.json"))
+
+    async def collect(degraded):
+        return [r async for r in controller.handle_batch(["summarize the solar report"], degraded=degraded)]
+
+    asyncio.run(collect(degraded=True))
+    assert model.batches == []
+    asyncio.run(collect(degraded=False))
+    assert model.batches == [5]
@@ -0,0 +1,110 @@
+import itertools
+import sys
+import time
+from email.utils import formatdate
+from pathlib import Path
+
+import pytest
+
+from backend.utils.logging import METRICS
+from backend.utils.resilience import DeadlineExceeded, Resilience, deadline, remaining, retry_after
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+
+from fake_services import FakeServices, Latency  # noqa: E402
+
+
+class FakeHTTPError(Exception):
+    def __init__(self, code, headers=None):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+        self.headers = headers or {}
+
+
+def test_retries_transient_errors_and_honours_retry_after():
+    policy = Resilience("t-retry", attempts=3, base_delay=0.001, max_delay=1.0)
+    calls = itertools.count()
+
+    def flaky(timeout):
+        if next(calls) == 0:
+            raise FakeHTTPError(503, {"Retry-After": "0.05"})
+        return "ok"
+
+    t0 = time.perf_counter()
+    assert policy.call(flaky) == "ok"
+    assert time.perf_counter() - t0 >= 0.05
+    assert 'outbound_retries_total{reason="503",service="t-retry"} 1' in METRICS.render()
+
+    def bad_request(timeout):
+        next(calls)
+        raise FakeHTTPError(400)
+
+    before = next(calls)
+    with pytest.raises(FakeHTTPError):
+        policy.call(bad_request)
+    assert next(calls) == before + 2  # not retried
+
+
+def test_retry_after_http_date():
+    err = FakeHTTPError(429, {"Retry-After": formatdate(time.time() + 30, usegmt=True)})
+    assert 25 < retry_after(err) <= 30
+    assert retry_after(FakeHTTPError(429, {"Retry-After": "garbage"})) is None
+
+
+def test_deadline_bounds_timeouts_and_retries():
+    assert remaining() is None
+    seen = []
+
+    def always_503(timeout):
+        seen.append(timeout)
+        raise FakeHTTPError(503)
+
+    policy = Resilience("t-deadline", attempts=10, base_delay=0.5, max_delay=0.5)
+    with deadline(0.2):
+        with deadline(5):  # nested scopes can't extend the outer budget
+            assert remaining() <= 0.2
+        with pytest.raises(FakeHTTPError):
+            policy.call(always_503)
+        # gave up instead of sleeping past the deadline
+        assert remaining() > 0
+    assert 0 < seen[0] <= 0.2
+    assert len(seen) < 10
+
+    with deadline(0.01):
+        time.sleep(0.02)
+        with pytest.raises(DeadlineExceeded):
+            policy.call(always_503)
+
+
+def test_hedge_answers_from_the_faster_copy():
+    policy = Resilience("t-hedge", hedge=True, hedge_min_delay=0.01)
+    for _ in range(policy.latency.min_samples):
+        policy.latency.add(0.01)
+    calls = itertools.count()
+
+    def sometimes_slow(timeout):
+        if next(calls) == 0:
+            time.sleep(1.0)
+            return "slow"
+        return "fast"
+
+    t0 = time.perf_counter()
+    assert policy.call(sometimes_slow) == "fast"
+    assert time.perf_counter() - t0 < 0.5
+    assert 'outbound_hedges_total{outcome="won",service="t-hedge"} 1' in METRICS.render()
+
+
+def test_gemini_chat_retries_then_reports_error(monkeypatch):
+    from backend.agents import gemini_llm
+
+    fakes = FakeServices(Latency(gemini=0), error_rate=1.0).start()
+    try:
+        monkeypatch.setenv("GOOGLE_API_KEY", "fake-key")
+        monkeypatch.setenv("GEMINI_API_ENDPOINT", fakes.base_url)
+        monkeypatch.setattr(gemini_llm, "_RESILIENCE", Resilience("gemini", attempts=3, base_delay=0.001))
+        answer = gemini_llm.gemini_chat([{"role": "user", "content": "hello"}])
+    finally:
+        fakes.stop()
+    assert answer.startswith("[MOCK LLM RESPONSE - ServiceUnavailable]")
+    assert gemini_llm.gemini_last_error()["type"] == "ServiceUnavailable"
+    assert fakes.calls["gemini"] == 3
@@ -0,0 +1,37 @@
+import numpy as np
+
+from backend.vectorstore.semantic_cache import CacheEntry, SemanticCache
+
+
+def _entry(agents, version=1):
+    return CacheEntry(query="q", answer="a", agents=agents, rationale="r", trace_id="t1", corpus_version=version)
+
+
+def test_paraphrase_hits_above_threshold():
+    cache = SemanticCache(dim=4, threshold=0.9)
+    cache.put(np.array([1.0, 0.0, 0.0, 0.0]), _entry(["PDF RAG"]))
+    hit = cache.lookup(np.array([0.98, 0.1, 0.0, 0.0]), corpus_version=1)
+    assert hit is not None and hit[1].trace_id == "t1"
+    assert cache.lookup(np.array([0.0, 1.0, 0.0, 0.0]), corpus_version=1) is None
+
+
+def test_pdf_entries_invalidated_by_corpus_change():
+    cache = SemanticCache(dim=4, threshold=0.9)
+    cache.put(np.array([1.0, 0.0, 0.0, 0.0]), _entry(["PDF RAG"], version=1))
+    assert cache.lookup(np.array([1.0, 0.0, 0.0, 0.0]), corpus_version=2) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_ttl_follows_most_volatile_agent():
+    cache = SemanticCache(dim=4, ttls={"PDF RAG": None, "Web Search": -1.0})
+    cache.put(np.array([1.0, 0.0, 0.0, 0.0]), _entry(["PDF RAG", "Web Search"]))
+    assert cache.lookup(np.array([1.0, 0.0, 0.0, 0.0]), corpus_version=1) is None
+
+
+def test_overload_lookup_accepts_expired_and_looser_matches():
+    cache = SemanticCache(dim=4, threshold=0.95, ttls={"Web Search": -1.0})
+    cache.put(np.array([1.0, 0.0, 0.0, 0.0]), _entry(["Web Search"]))
+    near = np.array([0.9, 0.4, 0.0, 0.0])  # cosine ~0.91
+    hit = cache.lookup(near, corpus_version=1, threshold=0.85, allow_expired=True)
+    assert hit is not None and hit[1].trace_id == "t1"
+    assert cache.lookup(near, corpus_version=1) is None
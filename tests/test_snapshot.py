@@ -0,0 +1,82 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from backend.agents.rag_pdf import PDFRAGAgent
+from backend.vectorstore.collections import CollectionManager, DEFAULT_COLLECTION
+from backend.vectorstore.faiss_store import Document, FAISSStore
+from backend.vectorstore.snapshot import SnapshotDir
+
+pytestmark = pytest.mark.skipif(not SnapshotDir.supported(), reason="needs fcntl")
+
+
+def _store(n, dim=8, seed=0):
+    rng = np.random.default_rng(seed)
+    store = FAISSStore(dim=dim)
+    store.add(rng.random((n, dim), dtype=np.float32),
+              [Document(text=f"chunk {i}", metadata={"source": "a.pdf", "chunk": i}) for i in range(n)])
+    return store
+
+
+def test_single_writer_and_readers_see_same_results(tmp_path):
+    writer = SnapshotDir(tmp_path)
+    reader = SnapshotDir(tmp_path)
+    assert writer.try_acquire_writer()
+    assert not reader.try_acquire_writer()
+
+    store = _store(50)
+    assert writer.publish(store) == 1
+    mapped = reader.load()
+    assert mapped.read_only and len(mapped) == 50
+
+    q = np.ones(8, dtype=np.float32)
+    assert [(round(s, 5), d.text) for s, d in mapped.search(q, k=5)] == \
+        [(round(s, 5), d.text) for s, d in store.search(q, k=5)]
+    with pytest.raises(RuntimeError):
+        mapped.add(np.ones((1, 8), dtype=np.float32), [Document(text="x", metadata={})])
+
+
+def test_generations_advance_and_old_ones_are_pruned(tmp_path):
+    writer = SnapshotDir(tmp_path)
+    assert writer.try_acquire_writer()
+    for i in range(5):
+        writer.publish(_store(10 + i))
+    assert writer.current_generation() == 5
+    assert len(writer.load()) == 14
+    assert sorted(p.name for p in tmp_path.glob("gen-*")) == ["gen-00000003", "gen-00000004", "gen-00000005"]
+
+
+def test_enqueue_hands_pdf_to_inbox(tmp_path):
+    src = tmp_path / "upload.pdf"
+    src.write_bytes(b"%PDF-1.4")
+    snaps = SnapshotDir(tmp_path / "index")
+    snaps.enqueue(src)
+    assert [p.name for p in snaps.pending()] == ["upload.pdf"]
+
+
+@pytest.mark.skipif(not SnapshotDir.supported(), reason="needs fcntl")
+def test_reader_takes_over_when_writer_dies_before_first_publish(tmp_path):
+    class Encoder:
+        def get_sentence_embedding_dimension(self):
+            return 8
+
+        def encode(self, texts, **kwargs):
+            return np.ones((len(texts), 8), dtype=np.float32)
+
+    writer = CollectionManager(dim=8, root=tmp_path / "index", share_default=True).create(DEFAULT_COLLECTION)
+    assert writer.writable
+    reader = PDFRAGAgent(sample_dir=tmp_path / "samples", index_dir=tmp_path / "index", share_default=True)
+    reader.load_model(Encoder())
+
+    async def run():
+        await reader.ensure_sample_pdfs()
+        building = asyncio.create_task(reader.build_or_load_index())
+        await asyncio.sleep(0.6)
+        assert not building.done()  # waiting for the writer's first snapshot
+        writer.snapshots._lock_file.close()  # the writer exits without publishing
+        await asyncio.wait_for(building, timeout=5)
+
+    asyncio.run(run())
+    default = reader.collections.get(DEFAULT_COLLECTION)
+    assert default.writable and default.generation == 1 and len(default.store) > 0
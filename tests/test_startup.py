@@ -0,0 +1,12 @@
+import os
+
+from backend.utils.startup import import_profile
+
+# generous default so slow CI machines pass; tighten locally with STARTUP_IMPORT_BUDGET_MS
+IMPORT_BUDGET_MS = float(os.environ.get("STARTUP_IMPORT_BUDGET_MS", "3000"))
+
+
+def test_backend_main_import_is_light():
+    profile = import_profile("backend.main")
+    assert profile["heavy_loaded"] == [], profile["slowest_ms"]
+    assert profile["total_ms"] < IMPORT_BUDGET_MS, profile["slowest_ms"]